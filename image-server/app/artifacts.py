@@ -0,0 +1,172 @@
+"""
+On-disk storage for generated images.
+
+- ArtifactStore: content-addressed files ({sha256}.{ext}) served over HTTP
+  with immutable caching headers, so responses carry a short URL instead of
+  megabytes of base64. Least recently used files are evicted past
+  IMAGE_ARTIFACT_MB.
+- ResultCache: maps a deterministic request (model, prompt, seed, size,
+  steps, format, input image) to the artifacts it produced, so repeating a
+  seeded request skips the GPU entirely.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+ARTIFACT_DIR = Path(os.getenv("IMAGE_ARTIFACT_DIR", "/app/outputs"))
+ARTIFACT_MB = int(os.getenv("IMAGE_ARTIFACT_MB", "4096"))
+DEFAULT_COMPRESSION = int(os.getenv("IMAGE_DEFAULT_COMPRESSION", "90"))
+
+# output_format -> (PIL format, file extension, media type)
+FORMATS = {
+    "png": ("PNG", "png", "image/png"),
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+}
+MEDIA_TYPES = {ext: media_type for _, ext, media_type in FORMATS.values()}
+
+
+def encode_image(img: Image.Image, output_format: str = "png", compression: Optional[int] = None) -> bytes:
+    """
+    Encode an image as png, webp or jpeg.
+
+    compression follows the OpenAI images API: 0-100, where 100 is the best
+    quality. PNG is lossless and ignores it.
+    """
+    pil_format, _, _ = FORMATS[output_format]
+    quality = DEFAULT_COMPRESSION if compression is None else compression
+    buffered = BytesIO()
+    if pil_format == "PNG":
+        img.save(buffered, format="PNG")
+    elif pil_format == "WEBP":
+        img.save(buffered, format="WEBP", quality=quality, method=4)
+    else:
+        img.convert("RGB").save(buffered, format="JPEG", quality=quality, optimize=True)
+    return buffered.getvalue()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_name, path)
+    finally:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+
+
+class ArtifactStore:
+    """Content-addressed image files with size-bounded LRU eviction."""
+
+    def __init__(self, root: Path = ARTIFACT_DIR, max_bytes: int = ARTIFACT_MB * 1024 * 1024):
+        self.root = Path(root) / "images"
+        self.max_bytes = max_bytes
+        self._total: Optional[int] = None
+
+    def path(self, name: str) -> Path:
+        return self.root / name[:2] / name
+
+    def save(self, data: bytes, ext: str) -> str:
+        """Store bytes and return the artifact name (blocking)."""
+        name = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+        path = self.path(name)
+        if path.exists():
+            os.utime(path)
+            return name
+        _write_atomic(path, data)
+
+        if self._total is None:
+            self._total = sum(size for _, size, _ in self._entries())
+        else:
+            self._total += len(data)
+        if self.max_bytes > 0 and self._total > self.max_bytes:
+            self._evict()
+        return name
+
+    def read(self, name: str) -> Optional[bytes]:
+        """Artifact bytes, or None if it has been evicted (blocking)."""
+        try:
+            return self.path(name).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in self.root.glob("*/*"):
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self) -> None:
+        """Remove least recently used files down to 90% of the budget."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        self._total = total
+        print(f"Evicted {evicted} image artifacts ({total // (1024 * 1024)} MB kept)")
+
+    def stats(self) -> dict:
+        return {
+            "size_mb": round((self._total or 0) / (1024 * 1024), 1),
+            "max_mb": self.max_bytes // (1024 * 1024),
+        }
+
+
+class ResultCache:
+    """Deterministic request -> artifact names, kept next to the artifact store."""
+
+    def __init__(self, store: ArtifactStore):
+        self.store = store
+        self.root = store.root.parent / "results"
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(**fields) -> str:
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+    def lookup(self, key: str) -> Optional[list[dict]]:
+        """Cached results for a key, if every artifact is still on disk (blocking)."""
+        try:
+            entries = json.loads((self.root / f"{key}.json").read_text())
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        # Touching each file marks it recently used and checks it still exists
+        for entry in entries:
+            try:
+                os.utime(self.store.path(entry["name"]))
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+        self.hits += 1
+        return entries
+
+    def store_results(self, key: str, entries: list[dict]) -> None:
+        _write_atomic(self.root / f"{key}.json", json.dumps(entries).encode())
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
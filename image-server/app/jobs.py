@@ -0,0 +1,263 @@
+"""
+Image generation queue: one GPU worker that batches compatible requests.
+
+Requests are queued instead of calling the pipeline on the event loop.
+Text-to-image jobs with the same size and step count are combined into a
+single pipeline call (one prompt entry per image), so several people
+generating at once share denoising passes. Editing jobs carry their own
+input image and always run alone.
+
+Progress is updated per denoising step and queue metrics are exported for
+Prometheus.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+MAX_QUEUED_JOBS = int(os.getenv("IMAGE_MAX_QUEUED_JOBS", "16"))
+MAX_BATCH_IMAGES = int(os.getenv("IMAGE_MAX_BATCH_IMAGES", "4"))
+BATCH_WINDOW_MS = float(os.getenv("IMAGE_BATCH_WINDOW_MS", "50"))
+JOB_RETENTION_S = float(os.getenv("IMAGE_JOB_RETENTION_S", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = {SUCCEEDED, FAILED, CANCELLED}
+
+QUEUE_DEPTH = Gauge("image_queue_depth", "Image jobs waiting for the GPU")
+QUEUE_WAIT = Histogram(
+    "image_queue_wait_seconds",
+    "Time jobs spent queued before generation",
+    buckets=[0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0],
+)
+GENERATION_TIME = Histogram(
+    "image_generation_seconds",
+    "Pipeline time per batch",
+    buckets=[1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0],
+)
+BATCH_IMAGES = Histogram("image_batch_images", "Images per pipeline call", buckets=[1, 2, 3, 4, 6, 8, 16])
+BATCH_JOBS = Histogram("image_batch_jobs", "Requests per pipeline call", buckets=[1, 2, 3, 4, 6, 8, 16])
+JOBS = Counter("image_jobs_total", "Image jobs by outcome", ["outcome"])
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the job queue is at capacity."""
+
+
+@dataclass(eq=False)
+class ImageJob:
+    prompt: str
+    n: int = 1
+    width: Optional[int] = None
+    height: Optional[int] = None
+    num_inference_steps: Optional[int] = None
+    image: Any = None  # PIL input image for editing
+    seed: Optional[int] = None
+    output_format: str = "png"
+    output_compression: Optional[int] = None
+    id: str = field(default_factory=lambda: f"img_{uuid.uuid4().hex[:16]}")
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    step: int = 0
+    total_steps: int = 0
+    batch_size: int = 0
+    error: Optional[str] = None
+    results: list = field(default_factory=list, repr=False)  # stored artifacts
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def batch_key(self) -> Optional[tuple]:
+        """Jobs with equal keys can share a pipeline call; None means run alone."""
+        if self.image is not None:
+            return None
+        return (self.width, self.height, self.num_inference_steps)
+
+    @property
+    def progress(self) -> float:
+        if self.status == SUCCEEDED:
+            return 1.0
+        return round(self.step / self.total_steps, 3) if self.total_steps else 0.0
+
+    def to_dict(self, queue_position: Optional[int] = None) -> dict:
+        data = {
+            "id": self.id,
+            "object": "image.job",
+            "status": self.status,
+            "prompt": self.prompt,
+            "n": self.n,
+            "progress": self.progress,
+            "step": self.step,
+            "total_steps": self.total_steps,
+            "batch_size": self.batch_size,
+            "created_at": int(self.created_at),
+            "started_at": int(self.started_at) if self.started_at else None,
+            "finished_at": int(self.finished_at) if self.finished_at else None,
+            "error": self.error,
+        }
+        if queue_position is not None:
+            data["queue_position"] = queue_position
+        return data
+
+
+class ImageJobQueue:
+    """FIFO of image jobs, batched and run one pipeline call at a time."""
+
+    def __init__(
+        self,
+        run_batch: Callable[[list[ImageJob]], list[list]],
+        max_queued: int = MAX_QUEUED_JOBS,
+        max_batch_images: int = MAX_BATCH_IMAGES,
+        batch_window_ms: float = BATCH_WINDOW_MS,
+        retention_s: float = JOB_RETENTION_S,
+    ):
+        self.run_batch = run_batch
+        self.max_queued = max_queued
+        self.max_batch_images = max_batch_images
+        self.batch_window = batch_window_ms / 1000
+        self.retention_s = retention_s
+
+        self._jobs: dict[str, ImageJob] = {}
+        self._pending: list[ImageJob] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpu-worker")
+        self.current: list[ImageJob] = []
+        self.completed = 0
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    # -------------------------------------------------------------------------
+    # Client API
+    # -------------------------------------------------------------------------
+
+    def submit(self, job: ImageJob) -> ImageJob:
+        """
+        Queue a job.
+
+        Raises:
+            QueueFullError: If max_queued jobs are already waiting
+        """
+        self.start()
+        if len(self._pending) >= self.max_queued:
+            JOBS.labels(outcome="rejected").inc()
+            raise QueueFullError(f"Image queue is full ({self.max_queued} jobs waiting)")
+        self._prune()
+        self._jobs[job.id] = job
+        self._pending.append(job)
+        QUEUE_DEPTH.set(len(self._pending))
+        self._wakeup.set()
+        return job
+
+    def get(self, job_id: str) -> Optional[ImageJob]:
+        return self._jobs.get(job_id)
+
+    def position(self, job: ImageJob) -> Optional[int]:
+        """1-based position among waiting jobs, None if not waiting."""
+        return self._pending.index(job) + 1 if job in self._pending else None
+
+    def cancel(self, job: ImageJob) -> None:
+        """Drop a job that has not started yet; running batches finish."""
+        if job in self._pending:
+            self._pending.remove(job)
+            QUEUE_DEPTH.set(len(self._pending))
+            JOBS.labels(outcome="cancelled").inc()
+            self._finish(job, CANCELLED)
+
+    # -------------------------------------------------------------------------
+    # Worker
+    # -------------------------------------------------------------------------
+
+    def _finish(self, job: ImageJob, status: str, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job.image = None
+        job.done.set()
+
+    def _take_batch(self) -> list[ImageJob]:
+        """Pop the oldest job plus any later jobs it can share a pipeline call with."""
+        first = self._pending.pop(0)
+        batch = [first]
+        key = first.batch_key
+        if key is None:
+            return batch
+        images = first.n
+        for job in list(self._pending):
+            if job.batch_key == key and images + job.n <= self.max_batch_images:
+                self._pending.remove(job)
+                batch.append(job)
+                images += job.n
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                # Give requests arriving together a moment to join the batch
+                if self.batch_window > 0:
+                    await asyncio.sleep(self.batch_window)
+                continue
+
+            batch = self._take_batch()
+            QUEUE_DEPTH.set(len(self._pending))
+
+            now = time.time()
+            for job in batch:
+                QUEUE_WAIT.observe(now - job.created_at)
+                job.status = RUNNING
+                job.started_at = now
+                job.batch_size = len(batch)
+            BATCH_JOBS.observe(len(batch))
+            BATCH_IMAGES.observe(sum(job.n for job in batch))
+            if len(batch) > 1:
+                print(f"Batching {len(batch)} requests ({sum(job.n for job in batch)} images)")
+
+            self.current = batch
+            start = time.monotonic()
+            try:
+                results = await loop.run_in_executor(self._executor, self.run_batch, batch)
+                for job, job_results in zip(batch, results):
+                    job.results = job_results
+                    self._finish(job, SUCCEEDED)
+                JOBS.labels(outcome="completed").inc(len(batch))
+                self.completed += len(batch)
+            except Exception as e:
+                print(f"Error generating image batch: {e}")
+                for job in batch:
+                    self._finish(job, FAILED, str(e))
+                JOBS.labels(outcome="failed").inc(len(batch))
+            finally:
+                GENERATION_TIME.observe(time.monotonic() - start)
+                self.current = []
+
+    def _prune(self) -> None:
+        """Forget finished jobs after the retention period."""
+        cutoff = time.time() - self.retention_s
+        for job in list(self._jobs.values()):
+            if job.status in FINISHED and job.finished_at < cutoff:
+                del self._jobs[job.id]
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._pending),
+            "max_queued": self.max_queued,
+            "running": [job.id for job in self.current],
+            "max_batch_images": self.max_batch_images,
+            "completed": self.completed,
+        }
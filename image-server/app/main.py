@@ -1,19 +1,33 @@
 """
 FastAPI server for image model inference using HuggingFace Diffusers.
 Provides OpenAI-compatible API endpoints for image generation.
+
+Requests go through a single GPU worker queue (app/jobs.py) that batches
+compatible prompts; /v1/images/jobs exposes the same queue asynchronously
+with per-step progress. Results are stored as content-addressed files
+(app/artifacts.py) and returned as URLs or base64.
 """
 
 import os
+import re
 import time
 import base64
+import random
+import asyncio
+import hashlib
+import inspect
 from io import BytesIO
 from typing import Optional, List
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
 from PIL import Image
 import torch
 
+from app.artifacts import FORMATS, MEDIA_TYPES, ArtifactStore, ResultCache, encode_image
+from app.jobs import SUCCEEDED, ImageJob, ImageJobQueue, QueueFullError
+
 # Try to import diffusers, but handle gracefully if not available
 try:
     from diffusers import DiffusionPipeline
@@ -36,12 +50,22 @@ model_pipeline = None
 model_name = os.getenv("MODEL_ID", "Qwen/Qwen-Image-Edit-2509")
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
+# Base for artifact URLs in responses; defaults to the URL the request came in on
+public_url = os.getenv("IMAGE_PUBLIC_URL", "").rstrip("/")
+
+artifacts = ArtifactStore()
+result_cache = ResultCache(artifacts)
+
 class ImageGenerationRequest(BaseModel):
     """OpenAI-compatible image generation request"""
     prompt: str
     model: Optional[str] = None
     n: Optional[int] = 1  # Number of images to generate
-    size: Optional[str] = "1024x1024"  # Image size
+    size: Optional[str] = "1024x1024"  # Image size, "WIDTHxHEIGHT" or "auto"
+    num_inference_steps: Optional[int] = None  # Pipeline default when unset
+    seed: Optional[int] = None  # Makes the request deterministic (and cacheable)
+    output_format: Optional[str] = "png"  # "png", "webp" or "jpeg"
+    output_compression: Optional[int] = None  # webp/jpeg quality 0-100 (100 = best)
     response_format: Optional[str] = "url"  # "url" or "b64_json"
     user: Optional[str] = None
     image: Optional[str] = None  # Base64 image data for editing
@@ -118,6 +142,7 @@ async def startup_event():
     
     # Start loading model in background, don't wait for it
     asyncio.create_task(load_model_async())
+    image_jobs.start()
 
 @app.get("/health")
 async def health():
@@ -126,9 +151,17 @@ async def health():
         "status": "healthy",
         "model_loaded": model_pipeline is not None,
         "device": device,
-        "cuda_available": torch.cuda.is_available()
+        "cuda_available": torch.cuda.is_available(),
+        "queue": image_jobs.stats(),
+        "artifacts": artifacts.stats(),
+        "result_cache": result_cache.stats(),
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics (queue depth, queue wait, batch sizes, generation time)."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/v1/models")
 async def list_models():
     """List available models (OpenAI-compatible)"""
@@ -144,104 +177,273 @@ async def list_models():
         ]
     }
 
-@app.post("/v1/images/generations")
-async def generate_image(request: ImageGenerationRequest):
-    """
-    Generate images (OpenAI-compatible endpoint)
-    
-    Note: This is a simplified implementation. Full OpenAI compatibility
-    would require more features like image editing, variations, etc.
-    """
-    # Ensure model is loaded
+def parse_size(size: Optional[str]) -> tuple:
+    """Parse "WIDTHxHEIGHT" into (width, height); (None, None) for the pipeline default."""
+    if not size or size == "auto":
+        return None, None
+    match = re.fullmatch(r"(\d+)x(\d+)", size.strip().lower())
+    if not match:
+        raise HTTPException(status_code=400, detail=f"Invalid size '{size}', expected WIDTHxHEIGHT")
+    width, height = int(match[1]), int(match[2])
+    if not (64 <= width <= 4096 and 64 <= height <= 4096):
+        raise HTTPException(status_code=400, detail=f"Size out of range: {size}")
+    return width, height
+
+def decode_image(data: str) -> Image.Image:
+    """Decode a base64 (or data: URL) input image for editing."""
     try:
-        pipeline = load_model()
+        if data.startswith('data:'):
+            # Remove data URL prefix
+            data = data.split(',')[1]
+        image = Image.open(BytesIO(base64.b64decode(data)))
+        image.load()
+        return image
     except Exception as e:
         raise HTTPException(
-            status_code=503,
-            detail=f"Model not available: {str(e)}"
+            status_code=400,
+            detail=f"Invalid image data: {str(e)}"
         )
-    
-    # Generate or edit image
-    try:
-        if request.image:
-            print(f"Editing image with prompt: {request.prompt[:50]}...")
-            # Decode base64 image
-            try:
-                if request.image.startswith('data:'):
-                    # Remove data URL prefix
-                    image_data = request.image.split(',')[1]
-                else:
-                    image_data = request.image
-                
-                image_bytes = base64.b64decode(image_data)
-                input_image = Image.open(BytesIO(image_bytes))
-                
-                # Run image editing
-                with torch.no_grad():
-                    result = pipeline(
-                        prompt=request.prompt,
-                        image=input_image,  # Pass input image for editing
-                        num_images_per_prompt=request.n or 1,
-                    )
-            except Exception as e:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid image data: {str(e)}"
-                )
-        else:
-            print(f"Generating image with prompt: {request.prompt[:50]}...")
-            # Run inference for generation
-            with torch.no_grad():
-                result = pipeline(
-                    prompt=request.prompt,
-                    num_images_per_prompt=request.n or 1,
-                    # Note: size parameter would need to be parsed and passed appropriately
-                )
-        
-        # Handle result (Diffusers returns different formats depending on pipeline)
-        images = []
-        if isinstance(result, list):
-            images = result
-        elif hasattr(result, 'images'):
-            images = result.images
-        else:
-            # Fallback: try to get first image
-            images = [result[0]] if result else []
-        
-        # Convert to response format
-        response_data = []
-        for img in images:
-            if request.response_format == "b64_json":
-                # Convert PIL Image to base64
-                buffered = BytesIO()
-                img.save(buffered, format="PNG")
-                img_str = base64.b64encode(buffered.getvalue()).decode()
-                response_data.append({
-                    "b64_json": img_str,
-                    "revised_prompt": request.prompt  # Simplified
-                })
-            else:
-                # Return as URL (in real implementation, would save and return URL)
-                # For now, return base64 in URL format
-                buffered = BytesIO()
-                img.save(buffered, format="PNG")
-                img_str = base64.b64encode(buffered.getvalue()).decode()
-                response_data.append({
-                    "url": f"data:image/png;base64,{img_str}",
-                    "revised_prompt": request.prompt
-                })
-        
-        return ImageResponse(
-            created=int(time.time()),
-            data=response_data
+
+def run_batch(jobs: List[ImageJob]) -> List[list]:
+    """
+    Run one pipeline call for a batch of compatible jobs (GPU worker thread).
+
+    Images are encoded and stored here, so each job's result is a list of
+    {"name", "seed"} artifact entries.
+    """
+    pipeline = load_model()
+    first = jobs[0]
+    call_params = inspect.signature(pipeline.__call__).parameters
+
+    if first.image is not None:
+        print(f"Editing image with prompt: {first.prompt[:50]}...")
+        kwargs = dict(
+            prompt=first.prompt,
+            image=first.image,  # Pass input image for editing
+            num_images_per_prompt=first.n,
         )
-        
-    except Exception as e:
-        print(f"Error generating image: {e}")
+    else:
+        print(f"Generating {sum(job.n for job in jobs)} image(s) for {len(jobs)} request(s): {first.prompt[:50]}...")
+        # One prompt entry per image keeps each request's n intact in a shared batch
+        kwargs = dict(
+            prompt=[job.prompt for job in jobs for _ in range(job.n)],
+            num_images_per_prompt=1,
+        )
+
+    if first.width and first.height and "width" in call_params:
+        kwargs["width"] = first.width
+        kwargs["height"] = first.height
+
+    total_steps = first.num_inference_steps
+    if total_steps:
+        kwargs["num_inference_steps"] = total_steps
+    elif "num_inference_steps" in call_params:
+        default = call_params["num_inference_steps"].default
+        total_steps = default if isinstance(default, int) else 0
+    for job in jobs:
+        job.total_steps = total_steps or 0
+
+    # One generator per image: seeded requests are reproducible, and the seed
+    # used for every image is reported back
+    seeds = []
+    for job in jobs:
+        base = job.seed if job.seed is not None else random.randrange(2**32)
+        seeds.append([(base + i) % 2**32 for i in range(job.n)])
+    if "generator" in call_params:
+        kwargs["generator"] = [torch.Generator("cpu").manual_seed(seed) for job_seeds in seeds for seed in job_seeds]
+
+    if "callback_on_step_end" in call_params:
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            total = getattr(pipe, "num_timesteps", None) or total_steps
+            for job in jobs:
+                job.step = step + 1
+                job.total_steps = total or job.total_steps
+            return callback_kwargs
+
+        kwargs["callback_on_step_end"] = on_step_end
+
+    with torch.no_grad():
+        result = pipeline(**kwargs)
+
+    # Handle result (Diffusers returns different formats depending on pipeline)
+    if isinstance(result, list):
+        images = result
+    elif hasattr(result, 'images'):
+        images = result.images
+    else:
+        # Fallback: try to get first image
+        images = [result[0]] if result else []
+
+    per_job = []
+    offset = 0
+    for job, job_seeds in zip(jobs, seeds):
+        _, ext, _ = FORMATS[job.output_format]
+        entries = []
+        for img, seed in zip(images[offset:offset + job.n], job_seeds):
+            data = encode_image(img, job.output_format, job.output_compression)
+            entries.append({"name": artifacts.save(data, ext), "seed": seed})
+        per_job.append(entries)
+        offset += job.n
+        job.step = job.total_steps
+    return per_job
+
+image_jobs = ImageJobQueue(run_batch)
+
+def response_entries(entries: List[dict], prompt: str, response_format: Optional[str], base_url: str) -> Optional[List[dict]]:
+    """
+    Convert stored artifacts to OpenAI-style response entries (blocking).
+
+    Returns None when an artifact needed for b64_json has been evicted since
+    it was stored, so the caller can treat it as a cache miss.
+    """
+    response_data = []
+    for entry in entries:
+        item = {"revised_prompt": prompt, "seed": entry["seed"]}  # Simplified
+        if response_format == "b64_json":
+            data = artifacts.read(entry["name"])
+            if data is None:
+                return None
+            item["b64_json"] = base64.b64encode(data).decode()
+        else:
+            item["url"] = f"{base_url}/v1/images/files/{entry['name']}"
+        response_data.append(item)
+    return response_data
+
+def validate_output(request: ImageGenerationRequest) -> None:
+    if request.output_format not in FORMATS:
         raise HTTPException(
-            status_code=500,
-            detail=f"Image generation failed: {str(e)}"
+            status_code=400,
+            detail=f"Unsupported output_format '{request.output_format}', expected one of {sorted(FORMATS)}"
         )
+    if request.output_compression is not None and not 0 <= request.output_compression <= 100:
+        raise HTTPException(status_code=400, detail="output_compression must be between 0 and 100")
+
+def cache_key(request: ImageGenerationRequest) -> Optional[str]:
+    """Result cache key for seeded requests; unseeded ones are never cached."""
+    if request.seed is None:
+        return None
+    return ResultCache.key(
+        model=model_name,
+        prompt=request.prompt,
+        seed=request.seed,
+        n=max(request.n or 1, 1),
+        size=parse_size(request.size),
+        steps=request.num_inference_steps,
+        format=request.output_format,
+        compression=request.output_compression,
+        image=hashlib.sha256(request.image.encode()).hexdigest() if request.image else None,
+    )
+
+def submit_job(request: ImageGenerationRequest) -> ImageJob:
+    if not DIFFUSERS_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Model not available: diffusers library not available")
+    validate_output(request)
+    width, height = parse_size(request.size)
+    job = ImageJob(
+        prompt=request.prompt,
+        n=max(request.n or 1, 1),
+        width=width,
+        height=height,
+        num_inference_steps=request.num_inference_steps,
+        image=decode_image(request.image) if request.image else None,
+        seed=request.seed,
+        output_format=request.output_format,
+        output_compression=request.output_compression,
+    )
+    try:
+        return image_jobs.submit(job)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+
+def base_url(http_request: Request) -> str:
+    return public_url or str(http_request.base_url).rstrip("/")
+
+@app.post("/v1/images/generations")
+async def generate_image(request: ImageGenerationRequest, http_request: Request):
+    """
+    Generate images (OpenAI-compatible endpoint)
+
+    Queues the request and waits for it; compatible concurrent requests
+    share a pipeline call. Seeded requests are answered from the result
+    cache when they have been generated before.
+    """
+    validate_output(request)
+    key = cache_key(request)
+    cached = await asyncio.to_thread(result_cache.lookup, key) if key else None
+    if cached is not None:
+        response_data = await asyncio.to_thread(
+            response_entries, cached, request.prompt, request.response_format, base_url(http_request)
+        )
+        if response_data is not None:
+            return ImageResponse(created=int(time.time()), data=response_data)
+
+    # Another batch finishing can evict our artifacts before they are read
+    # back; generate once more rather than failing the request
+    for _ in range(2):
+        job = submit_job(request)
+        try:
+            await job.done.wait()
+        except asyncio.CancelledError:
+            # Client went away before its turn
+            image_jobs.cancel(job)
+            raise
+
+        if job.status != SUCCEEDED:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Image generation failed: {job.error or job.status}"
+            )
+
+        if key:
+            await asyncio.to_thread(result_cache.store_results, key, job.results)
+        response_data = await asyncio.to_thread(
+            response_entries, job.results, request.prompt, request.response_format, base_url(http_request)
+        )
+        if response_data is not None:
+            return ImageResponse(
+                created=int(time.time()),
+                data=response_data
+            )
+        print(f"Artifacts for {job.id} were evicted before the response; generating again")
+
+    raise HTTPException(
+        status_code=503,
+        detail="Generated images were evicted before they could be returned; increase IMAGE_ARTIFACT_MB",
+        headers={"Retry-After": "10"},
+    )
+
+@app.post("/v1/images/jobs", status_code=202)
+async def create_image_job(request: ImageGenerationRequest):
+    """Queue a generation; poll GET /v1/images/jobs/{id} for progress and the result."""
+    job = submit_job(request)
+    return job.to_dict(queue_position=image_jobs.position(job))
+
+@app.get("/v1/images/jobs/{job_id}")
+async def get_image_job(job_id: str, http_request: Request):
+    """Job status with per-step progress; includes image URLs once finished."""
+    job = image_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    data = job.to_dict(queue_position=image_jobs.position(job))
+    if job.status == SUCCEEDED:
+        data["data"] = response_entries(job.results, job.prompt, "url", base_url(http_request))
+    return data
+
+_ARTIFACT_NAME = re.compile(r"^[0-9a-f]{64}\.(png|webp|jpg)$")
+
+@app.get("/v1/images/files/{name}")
+async def get_image_file(name: str, request: Request):
+    """Serve a stored image. Names are content hashes, so files never change."""
+    match = _ARTIFACT_NAME.match(name)
+    path = artifacts.path(name) if match else None
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail=f"Image not found: {name}")
+
+    etag = f'"{name.split(".")[0]}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=MEDIA_TYPES[match[1]], headers=headers)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,156 @@
+"""
+Non-blocking Docker access for the manager.
+
+The docker SDK is synchronous and a pull, create or stop can take seconds, so
+every call goes through a small thread pool (docker_call) instead of running
+on the event loop. ContainerStates keeps a name -> (status, health) view of
+all containers, filled by one listing at startup, kept current from the
+Docker events stream (start/die/destroy/health_status) and re-listed
+periodically to catch anything missed. Listeners are told about every change,
+which is what drives the manager's per-model state machine.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional
+
+DOCKER_API_WORKERS = int(os.getenv("DOCKER_API_WORKERS", "4"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=DOCKER_API_WORKERS, thread_name_prefix="docker-api"
+)
+
+# Docker event action -> container status it implies (None = container gone)
+_EVENT_STATUS = {
+    "create": "created",
+    "start": "running",
+    "restart": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "die": "exited",
+    "destroy": None,
+}
+
+# listener(container_name, status or None if removed, health or None)
+Listener = Callable[[str, Optional[str], Optional[str]], None]
+
+
+async def docker_call(fn: Callable, *args, **kwargs):
+    """Run a blocking docker SDK call on the Docker thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+class ContainerStates:
+    """Container name -> Docker status and health, kept current from the events stream."""
+
+    def __init__(self, client):
+        self.client = client
+        self._status: dict[str, str] = {}
+        self._health: dict[str, str] = {}
+        self._listeners: list[Listener] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self.events_seen = 0
+        self.last_refresh = 0.0
+
+    def add_listener(self, listener: Listener):
+        self._listeners.append(listener)
+
+    async def start(self):
+        """Take an initial snapshot and follow Docker events from then on."""
+        self._loop = asyncio.get_running_loop()
+        await self.refresh()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._follow_events, name="docker-events", daemon=True
+            )
+            self._thread.start()
+
+    async def refresh(self):
+        """Reconcile the view with a fresh listing of all containers."""
+        # Non-sparse listings carry inspect attrs; skip containers removed mid-listing
+        containers = await docker_call(self.client.containers.list, all=True, ignore_removed=True)
+        listed = {}
+        for c in containers:
+            health = (c.attrs.get("State") or {}).get("Health") or {}
+            listed[c.name] = (c.status, health.get("Status"))
+        for name in list(self._status):
+            if name not in listed:
+                self.set(name, None)
+        for name, (status, health) in listed.items():
+            self.set(name, status, health)
+        self.last_refresh = time.time()
+
+    def status(self, name: str) -> Optional[str]:
+        return self._status.get(name)
+
+    def health(self, name: str) -> Optional[str]:
+        return self._health.get(name)
+
+    def is_running(self, name: str) -> bool:
+        return self._status.get(name) == "running"
+
+    def set(self, name: str, status: Optional[str], health: Optional[str] = None):
+        """Record a container's status (and health, if known) and notify listeners on change."""
+        old = (self._status.get(name), self._health.get(name))
+        if status is None:
+            self._status.pop(name, None)
+            self._health.pop(name, None)
+        else:
+            self._status[name] = status
+            if health is not None:
+                self._health[name] = health
+            elif status != "running":
+                self._health.pop(name, None)
+        new = (self._status.get(name), self._health.get(name))
+        if new != old:
+            for listener in self._listeners:
+                try:
+                    listener(name, *new)
+                except Exception as e:
+                    print(f"Container state listener failed for {name}: {e}")
+
+    def _set_health(self, name: str, health: str):
+        self.set(name, self._status.get(name, "running"), health)
+
+    def _follow_events(self):
+        """Blocking loop on the events stream (runs on its own thread)."""
+        while True:
+            try:
+                for event in self.client.events(
+                    decode=True, filters={"type": "container"}
+                ):
+                    action = event.get("Action") or event.get("status") or ""
+                    name = event.get("Actor", {}).get("Attributes", {}).get("name")
+                    if not name:
+                        continue
+                    if action.startswith("health_status:"):
+                        health = action.split(":", 1)[1].strip()
+                        self._loop.call_soon_threadsafe(self._set_health, name, health)
+                    elif action in _EVENT_STATUS:
+                        self._loop.call_soon_threadsafe(
+                            self.set, name, _EVENT_STATUS[action]
+                        )
+                    else:
+                        continue
+                    self.events_seen += 1
+            except Exception as e:
+                print(f"Docker events stream interrupted: {e}")
+            # Events may have been missed while disconnected
+            time.sleep(2)
+            try:
+                asyncio.run_coroutine_threadsafe(self.refresh(), self._loop).result()
+            except Exception as e:
+                print(f"Container state refresh failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "containers": len(self._status),
+            "events_seen": self.events_seen,
+            "last_refresh": self.last_refresh,
+        }
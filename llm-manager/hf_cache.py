@@ -0,0 +1,269 @@
+"""
+Background index of the HuggingFace cache for model cards and /v1/models/cache.
+
+Walking every file of every cached model takes seconds once the cache holds
+hundreds of GB, so a daemon thread keeps a per-model summary instead:
+
+- size and file count come from the repo's blobs/ directory. Snapshot
+  entries are symlinks into blobs/, so each file is counted once.
+- A model is rescanned only when the mtime of its blobs/, snapshots/ or
+  refs/ directory changes, which happens whenever a download adds,
+  finishes or removes a file.
+- Completeness compares the snapshot against the repo's file list from the
+  Hub, fetched once per revision. When the Hub can't be reached it falls
+  back to "no unfinished .incomplete blobs".
+
+The index is persisted next to the cache, so a restart answers immediately
+and only rescans models that changed in the meantime. Endpoints read it
+from memory and never touch the filesystem.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+HF_CACHE_RESCAN_INTERVAL = int(os.getenv("HF_CACHE_RESCAN_INTERVAL", "60"))
+HF_CACHE_CHECK_COMPLETE = os.getenv("HF_CACHE_CHECK_COMPLETE", "true").lower() == "true"
+
+_INDEX_VERSION = 1
+
+# How often to retry the Hub for a model whose file list couldn't be fetched
+_EXPECTED_RETRY_SECONDS = 3600
+
+
+def _mtime_ns(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _signature(model_dir: str) -> list[int]:
+    """Cheap change detector: mtimes of the directories a download touches."""
+    return [
+        _mtime_ns(os.path.join(model_dir, sub)) for sub in ("blobs", "snapshots", "refs")
+    ]
+
+
+def _hf_model_name(entry: str) -> str:
+    return entry.replace("models--", "", 1).replace("--", "/", 1)
+
+
+class HFCacheIndex:
+    """Per-model size, file count and completeness for a HuggingFace hub cache."""
+
+    def __init__(
+        self,
+        cache_path: str,
+        index_path: Optional[str] = None,
+        interval: int = HF_CACHE_RESCAN_INTERVAL,
+        check_complete: bool = HF_CACHE_CHECK_COMPLETE,
+    ):
+        self.hub_path = os.path.join(cache_path, "hub")
+        self.index_path = index_path or os.path.join(
+            cache_path, ".llm-manager-cache-index.json"
+        )
+        self.interval = interval
+        self.check_complete = check_complete
+        self._models: dict[str, dict] = {}
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_scan = 0.0
+        self.scan_seconds = 0.0
+
+    def start(self):
+        """Load the persisted index and start the rescan thread."""
+        self._load()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="hf-cache-index", daemon=True
+            )
+            self._thread.start()
+
+    def request_rescan(self):
+        """Rescan soon (e.g. after a prefetch finished) instead of at the next interval."""
+        self._wakeup.set()
+
+    # --- Reads (event loop) ---
+
+    def lookup(self, hf_model: str) -> Optional[dict]:
+        return self._models.get(hf_model)
+
+    def models(self) -> list[dict]:
+        return sorted(self._models.values(), key=lambda m: m["hf_model"])
+
+    def stats(self) -> dict:
+        return {
+            "models": len(self._models),
+            "last_scan": self.last_scan,
+            "scan_seconds": round(self.scan_seconds, 3),
+        }
+
+    # --- Scanning (background thread) ---
+
+    def _run(self):
+        while True:
+            try:
+                self.rescan()
+            except Exception as e:
+                print(f"HF cache index rescan failed: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def rescan(self):
+        """Rescan models whose directories changed; drop ones that were deleted."""
+        start = time.time()
+        models = dict(self._models)
+        changed = False
+        try:
+            entries = [e for e in os.listdir(self.hub_path) if e.startswith("models--")]
+        except FileNotFoundError:
+            entries = []
+
+        seen = set()
+        for entry in entries:
+            model_dir = os.path.join(self.hub_path, entry)
+            if not os.path.isdir(model_dir):
+                continue
+            hf_model = _hf_model_name(entry)
+            seen.add(hf_model)
+            signature = _signature(model_dir)
+            current = models.get(hf_model)
+            if current and current["signature"] == signature and (
+                current["expected_revision"]
+                or not self.check_complete
+                or time.time() - current["scanned_at"] < _EXPECTED_RETRY_SECONDS
+            ):
+                continue
+            models[hf_model] = self._scan_model(hf_model, model_dir, signature, current)
+            changed = True
+
+        for hf_model in list(models):
+            if hf_model not in seen:
+                del models[hf_model]
+                changed = True
+
+        self._models = models
+        self.last_scan = time.time()
+        self.scan_seconds = self.last_scan - start
+        if changed:
+            self._save()
+
+    def _scan_model(
+        self, hf_model: str, model_dir: str, signature: list[int], previous: Optional[dict]
+    ) -> dict:
+        size = 0
+        files = 0
+        incomplete = 0
+        blobs_dir = os.path.join(model_dir, "blobs")
+        try:
+            with os.scandir(blobs_dir) as it:
+                for blob in it:
+                    if not blob.is_file(follow_symlinks=False):
+                        continue
+                    if blob.name.endswith(".incomplete"):
+                        incomplete += 1
+                    else:
+                        files += 1
+                    size += blob.stat(follow_symlinks=False).st_size
+        except FileNotFoundError:
+            pass
+
+        revision, snapshot_files = self._snapshot(model_dir)
+        expected = None
+        expected_revision = None
+        if previous and previous.get("expected_revision") == revision:
+            expected = previous.get("expected_files")
+            expected_revision = revision
+        elif self.check_complete and revision:
+            expected = self._expected_files(hf_model, revision)
+            expected_revision = revision if expected is not None else None
+
+        if expected is not None:
+            complete = incomplete == 0 and set(expected) <= snapshot_files
+            missing = len(set(expected) - snapshot_files)
+        else:
+            # Without the repo's file list: nothing mid-download and something present
+            complete = incomplete == 0 and bool(snapshot_files)
+            missing = None
+
+        return {
+            "hf_model": hf_model,
+            "size_bytes": size,
+            "size_gb": round(size / (1024**3), 2),
+            "files": files,
+            "incomplete_files": incomplete,
+            "revision": revision,
+            "complete": complete,
+            "complete_checked_against": "hub" if expected is not None else "local",
+            "missing_files": missing,
+            "expected_files": expected,
+            "expected_revision": expected_revision,
+            "signature": signature,
+            "scanned_at": time.time(),
+        }
+
+    @staticmethod
+    def _snapshot(model_dir: str) -> tuple[Optional[str], set[str]]:
+        """Revision from refs/main and the relative paths present in its snapshot."""
+        revision = None
+        try:
+            with open(os.path.join(model_dir, "refs", "main")) as f:
+                revision = f.read().strip() or None
+        except FileNotFoundError:
+            pass
+        snapshots = os.path.join(model_dir, "snapshots")
+        if revision is None:
+            try:
+                revisions = os.listdir(snapshots)
+            except FileNotFoundError:
+                revisions = []
+            revision = revisions[0] if len(revisions) == 1 else None
+        if revision is None:
+            return None, set()
+
+        root = os.path.join(snapshots, revision)
+        present = set()
+        for dirpath, _, filenames in os.walk(root):
+            rel = os.path.relpath(dirpath, root)
+            for name in filenames:
+                # Broken symlinks mean the blob is gone
+                if os.path.exists(os.path.join(dirpath, name)):
+                    present.add(name if rel == "." else f"{rel}/{name}")
+        return revision, present
+
+    @staticmethod
+    def _expected_files(hf_model: str, revision: str) -> Optional[list[str]]:
+        """File list of a repo revision from the Hub; None when unavailable."""
+        try:
+            from huggingface_hub import HfApi
+
+            info = HfApi(token=os.getenv("HF_TOKEN") or None).model_info(
+                hf_model, revision=revision
+            )
+            return sorted(s.rfilename for s in info.siblings or [])
+        except Exception as e:
+            print(f"HF cache index: could not list files for {hf_model}: {e}")
+            return None
+
+    # --- Persistence ---
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+            if data.get("version") == _INDEX_VERSION:
+                self._models = data.get("models", {})
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def _save(self):
+        tmp_path = f"{self.index_path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"version": _INDEX_VERSION, "models": self._models}, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"HF cache index: could not save {self.index_path}: {e}")
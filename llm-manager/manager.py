@@ -19,6 +19,10 @@ from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import StreamingResponse, JSONResponse
 from typing import Optional
 
+from containers import ContainerStates, docker_call
+from hf_cache import HFCacheIndex
+from streaming import ChatStreamAggregator, SSELineSplitter
+
 # --- Configuration ---
 MODE = os.getenv("MODE", "on-demand")  # "always-on" or "on-demand"
 DEFAULT_MODEL = os.getenv(
@@ -42,6 +46,12 @@ GPU_MEMORY_UTILIZATION = float(
 CPU_OFFLOAD_GB = float(
     os.getenv("CPU_OFFLOAD_GB", "0")
 )  # vLLM cpu-offload-gb (0 = disabled)
+BACKEND_MAX_CONNECTIONS = int(
+    os.getenv("BACKEND_MAX_CONNECTIONS", "64")
+)  # Pooled connections per model container
+CONTAINER_RECONCILE_INTERVAL = int(
+    os.getenv("CONTAINER_RECONCILE_INTERVAL", "30")
+)  # Seconds between full container re-listings
 
 # Model aliases: redirect requests for a model name to another.
 # Used during rollbacks when the router still references the old model name.
@@ -61,8 +71,11 @@ def resolve_model_alias(model_id: str) -> str:
 
 # --- Global State ---
 docker_client = docker.from_env()
+container_states = ContainerStates(docker_client)  # Event-fed container status view
+hf_cache_index = HFCacheIndex(HF_CACHE_PATH)  # Background-maintained cache sizes
 model_cards = {}  # Model definitions from models.json
 model_states = {}  # Runtime state for each model
+container_models = {}  # Container name -> model id
 available_models = []  # Models that fit in GPU VRAM
 gpu_vram_gb = 0  # Detected GPU VRAM (primary)
 total_vram_gb = 0  # Sum of all GPU VRAM
@@ -105,7 +118,7 @@ def detect_gpu_vram() -> list[int]:
 
 def load_models():
     """Load model definitions and filter by GPU capability."""
-    global model_cards, model_states, available_models, gpu_vram_gb, total_vram_gb
+    global model_cards, model_states, container_models, available_models, gpu_vram_gb, total_vram_gb
 
     per_gpu = detect_gpu_vram()
     gpu_vram_gb = per_gpu[0]
@@ -151,9 +164,13 @@ def load_models():
             "last_used": 0,
             "lock": asyncio.Lock(),
             "status": "stopped",
+            "status_since": time.time(),
         }
         for model_id in available_models
     }
+    container_models = {
+        state["container_name"]: model_id for model_id, state in model_states.items()
+    }
 
     print(
         f"GPU VRAM: {gpu_vram_gb}GB primary, {total_vram_gb}GB total (usable per GPU: {usable_vram}GB)"
@@ -167,6 +184,102 @@ def load_models():
         print(f"Excluded (insufficient VRAM): {excluded}")
 
 
+# --- Model State Machine ---
+# stopped -> starting -> running <-> unhealthy -> stopping -> stopped
+# start_model/stop_model own the starting and stopping transitions; Docker
+# events for the model's container (die, destroy, health_status) drive the
+# rest. Endpoints read the state from here instead of asking Docker.
+ACTIVE_STATUSES = ("starting", "running", "unhealthy", "stopping")
+
+
+def set_model_status(model_id: str, status: str, reason: str = ""):
+    """Move a model to a new lifecycle state."""
+    state = model_states[model_id]
+    if state["status"] == status:
+        return
+    print(
+        f"[{model_id}] {state['status']} -> {status}" + (f" ({reason})" if reason else "")
+    )
+    state["status"] = status
+    state["status_since"] = time.time()
+
+
+def on_container_change(name: str, status: Optional[str], health: Optional[str]):
+    """ContainerStates listener: apply a container change to its model's state."""
+    model_id = container_models.get(name)
+    if model_id is None:
+        return
+    current = model_states[model_id]["status"]
+
+    if status != "running":
+        if current in ("running", "unhealthy"):
+            set_model_status(model_id, "stopped", f"container {status or 'removed'}")
+        return
+
+    if health == "unhealthy" and current == "running":
+        set_model_status(model_id, "unhealthy", "health check failing")
+    elif health != "unhealthy" and current == "unhealthy":
+        set_model_status(model_id, "running", "health check passing")
+    elif current == "stopped":
+        # Started outside the manager, or still up from before a manager restart
+        set_model_status(model_id, "starting", "found running container")
+        asyncio.create_task(adopt_container(model_id))
+
+
+async def adopt_container(model_id: str):
+    """Mark an already-running container as running once it answers."""
+    ready = await wait_for_ready(model_id)
+    state = model_states[model_id]
+    if state["status"] != "starting" or state["lock"].locked():
+        return  # start_model/stop_model took over
+    if ready:
+        set_model_status(model_id, "running", "adopted")
+        state["last_used"] = time.time()
+    else:
+        set_model_status(model_id, "stopped", "adopted container never became ready")
+        # Left running it would hold the GPU and be re-adopted on every
+        # reconcile, so stop it like a failed start
+        await stop_model(model_id)
+
+
+def reconcile_models():
+    """Re-apply the container view to every model (catches anything events missed)."""
+    for name in container_models:
+        on_container_change(
+            name, container_states.status(name), container_states.health(name)
+        )
+
+
+# --- Backend Connection Pools ---
+# One long-lived client per model container, so proxied requests reuse
+# keep-alive connections instead of opening a new client per request.
+_backend_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def backend_client(container_name: str) -> httpx.AsyncClient:
+    """Pooled HTTP client for a model container (created on first use)."""
+    client = _backend_clients.get(container_name)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=f"http://{container_name}:8000",
+            timeout=httpx.Timeout(300, connect=10),
+            limits=httpx.Limits(
+                max_connections=BACKEND_MAX_CONNECTIONS,
+                max_keepalive_connections=BACKEND_MAX_CONNECTIONS,
+                keepalive_expiry=60,
+            ),
+        )
+        _backend_clients[container_name] = client
+    return client
+
+
+async def close_backend_client(container_name: str):
+    """Drop a container's pool (its connections die with the container)."""
+    client = _backend_clients.pop(container_name, None)
+    if client is not None:
+        await client.aclose()
+
+
 def get_container(name: str):
     """Get a Docker container by name, returns None if not found."""
     try:
@@ -391,14 +504,14 @@ async def wait_for_ready(model_id: str, timeout: int = None) -> bool:
     start_time = time.time()
 
     while time.time() - start_time < timeout:
+        if not container_states.is_running(container_name):
+            print(f"[{model_id}] Container exited while waiting for it to be ready.")
+            return False
         try:
-            async with httpx.AsyncClient() as client:
-                res = await client.get(
-                    f"http://{container_name}:8000/v1/models", timeout=2
-                )
-                if res.status_code == 200:
-                    print(f"[{model_id}] Container is ready!")
-                    return True
+            res = await backend_client(container_name).get("/v1/models", timeout=2)
+            if res.status_code == 200:
+                print(f"[{model_id}] Container is ready!")
+                return True
         except httpx.RequestError:
             pass
         await asyncio.sleep(2)
@@ -415,72 +528,92 @@ async def start_model(model_id: str) -> bool:
             detail=f"Model '{model_id}' is not available on this GPU ({gpu_vram_gb}GB VRAM)",
         )
 
+    state = model_states[model_id]
+    container_name = state["container_name"]
+
+    # Hot path: the state machine says it's up — a dict lookup, no Docker API call
+    if state["status"] == "running":
+        state["last_used"] = time.time()
+        return True
+
     # Check gaming mode
     if gaming_mode_lock is not None:
         async with gaming_mode_lock:
-            if gaming_mode:
-                container = get_container(model_states[model_id]["container_name"])
-                if not (container and container.status == "running"):
-                    raise HTTPException(
-                        status_code=503,
-                        detail=f"Gaming mode active. Cannot start '{model_id}'. Disable gaming mode first.",
-                    )
+            if gaming_mode and state["status"] not in ACTIVE_STATUSES:
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Gaming mode active. Cannot start '{model_id}'. Disable gaming mode first.",
+                )
 
     # --- Single-model enforcement: stop any OTHER running model first ---
     for other_id, other_state in model_states.items():
         if other_id == model_id:
             continue
-        other_container = get_container(other_state["container_name"])
-        if other_container and other_container.status == "running":
+        # Also catch a container that is up while its model is not tracked as active
+        if other_state["status"] in ACTIVE_STATUSES or container_states.is_running(
+            other_state["container_name"]
+        ):
             print(
                 f"[{model_id}] Single-model enforcement: stopping {other_id} before starting {model_id}"
             )
             await stop_model(other_id)
 
-    state = model_states[model_id]
-
     async with state["lock"]:
-        container = get_container(state["container_name"])
-
-        # Remove dead containers and recreate fresh (new image, clean state)
-        if container and container.status != "running":
-            print(f"[{model_id}] Removing stale container ({container.status})")
-            container.remove(force=True)
-            container = None
-
-        # Create container if it doesn't exist
-        if not container:
-            runtime = model_cards[model_id].get("runtime", "vllm")
-            if runtime == "llamacpp":
-                container = create_llamacpp_container(model_id)
-            else:
-                container = create_vllm_container(model_id)
-
-        # Start if not running
-        already_running = container.status == "running"
-        if not already_running:
-            print(f"[{model_id}] Starting container...")
-            container.start()
-
-        # Skip readiness poll if container was already up and state is known good
-        if already_running and state.get("status") == "running":
+        # Another request may have started it while we waited for the lock
+        if state["status"] == "running":
             state["last_used"] = time.time()
             return True
+        set_model_status(model_id, "starting")
+        try:
+            return await _bring_up(model_id)
+        except BaseException:
+            if state["status"] == "starting":
+                set_model_status(model_id, "stopped", "start failed")
+            raise
 
-        # Wait for ready
-        if await wait_for_ready(model_id):
-            state["status"] = "running"
-            state["last_used"] = time.time()
-            return True
 
-        # Failed to become ready
-        try:
-            container.stop(timeout=5)
-        except:
-            pass
-        raise HTTPException(
-            status_code=503, detail=f"Model '{model_id}' failed to become ready"
-        )
+async def _bring_up(model_id: str) -> bool:
+    """Create/start a model's container and wait for it (caller holds the model lock)."""
+    state = model_states[model_id]
+    container_name = state["container_name"]
+    container = await docker_call(get_container, container_name)
+
+    # Remove dead containers and recreate fresh (new image, clean state)
+    if container and container.status != "running":
+        print(f"[{model_id}] Removing stale container ({container.status})")
+        await docker_call(container.remove, force=True)
+        container = None
+
+    # Create container if it doesn't exist (may pull the image)
+    if not container:
+        runtime = model_cards[model_id].get("runtime", "vllm")
+        if runtime == "llamacpp":
+            container = await docker_call(create_llamacpp_container, model_id)
+        else:
+            container = await docker_call(create_vllm_container, model_id)
+
+    # Start if not running
+    already_running = container.status == "running"
+    if not already_running:
+        print(f"[{model_id}] Starting container...")
+        await docker_call(container.start)
+    container_states.set(container_name, "running")
+
+    # Wait for ready
+    if await wait_for_ready(model_id):
+        set_model_status(model_id, "running")
+        state["last_used"] = time.time()
+        return True
+
+    # Failed to become ready
+    try:
+        await docker_call(container.stop, timeout=5)
+    except:
+        pass
+    set_model_status(model_id, "stopped", "never became ready")
+    raise HTTPException(
+        status_code=503, detail=f"Model '{model_id}' failed to become ready"
+    )
 
 
 async def stop_model(model_id: str) -> bool:
@@ -489,19 +622,31 @@ async def stop_model(model_id: str) -> bool:
         return False
 
     state = model_states[model_id]
+    container_name = state["container_name"]
+    if state["status"] not in ACTIVE_STATUSES and not container_states.is_running(
+        container_name
+    ):
+        return False
 
     async with state["lock"]:
-        container = get_container(state["container_name"])
+        container = await docker_call(get_container, container_name)
         if container and container.status == "running":
             print(f"[{model_id}] Stopping container...")
+            # Stop routing requests to it while it shuts down
+            previous = state["status"]
+            set_model_status(model_id, "stopping")
             try:
-                container.stop(timeout=10)
-                state["status"] = "stopped"
+                await docker_call(container.stop, timeout=10)
+                container_states.set(container_name, "exited")
+                await close_backend_client(container_name)
+                set_model_status(model_id, "stopped")
                 state["last_used"] = 0
                 return True
             except Exception as e:
                 print(f"[{model_id}] Failed to stop: {e}")
+                set_model_status(model_id, previous, "stop failed")
                 return False
+        set_model_status(model_id, "stopped", "container not running")
     return False
 
 
@@ -535,6 +680,18 @@ async def start_default_model():
 
 
 # --- Background Tasks ---
+async def container_reconciler():
+    """Periodically re-list containers to correct anything the event stream missed."""
+    while True:
+        await asyncio.sleep(CONTAINER_RECONCILE_INTERVAL)
+        try:
+            await container_states.refresh()
+        except Exception as e:
+            print(f"Container reconcile failed: {e}")
+            continue
+        reconcile_models()
+
+
 async def idle_reaper():
     """Stop idle models (only in on-demand mode)."""
     while True:
@@ -561,6 +718,10 @@ async def lifespan(app: FastAPI):
     gaming_mode_lock = asyncio.Lock()
 
     load_models()
+    hf_cache_index.start()
+    container_states.add_listener(on_container_change)
+    await container_states.start()
+    asyncio.create_task(container_reconciler())
     asyncio.create_task(idle_reaper())
 
     # Start default model for always-on mode
@@ -568,6 +729,9 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    for container_name in list(_backend_clients):
+        await close_backend_client(container_name)
+
 
 app = FastAPI(
     title="vLLM Manager",
@@ -582,17 +746,15 @@ async def health():
     if MODE == "always-on" and DEFAULT_MODEL:
         for model_id in [m.strip() for m in DEFAULT_MODEL.split(",") if m.strip()]:
             state = model_states.get(model_id)
-            if state:
-                container = get_container(state["container_name"])
-                if not (container and container.status == "running"):
-                    return JSONResponse(
-                        status_code=503,
-                        content={
-                            "status": "degraded",
-                            "mode": MODE,
-                            "reason": f"Model '{model_id}' is not running",
-                        },
-                    )
+            if state and state["status"] not in ("starting", "running"):
+                return JSONResponse(
+                    status_code=503,
+                    content={
+                        "status": "degraded",
+                        "mode": MODE,
+                        "reason": f"Model '{model_id}' is {state['status']}",
+                    },
+                )
     return {"status": "healthy", "mode": MODE}
 
 
@@ -618,12 +780,11 @@ async def list_models():
 
 @app.get("/status")
 async def status():
-    """Get detailed status of all models and system state."""
+    """Get detailed status of all models and system state (from the state machine, no Docker calls)."""
     running = []
     stopped = []
 
     for model_id, state in model_states.items():
-        container = get_container(state["container_name"])
         card = model_cards.get(model_id, {})
 
         info = {
@@ -634,8 +795,11 @@ async def status():
             "runtime": card.get("runtime", "vllm"),
             "container": state["container_name"],
             "status": "running"
-            if container and container.status == "running"
+            if state["status"] in ACTIVE_STATUSES
             else "stopped",
+            "state": state["status"],
+            "state_since": state["status_since"],
+            "health": container_states.health(state["container_name"]),
             "last_used": state["last_used"],
             "idle_seconds": int(time.time() - state["last_used"])
             if state["last_used"] > 0
@@ -657,6 +821,7 @@ async def status():
         "running": running,
         "stopped": stopped,
         "active_requests": _active_requests,
+        "docker": container_states.stats(),
         "summary": {
             "total": len(model_states),
             "available": len(available_models),
@@ -736,49 +901,36 @@ async def stop_model_endpoint(model_id: str):
 
 
 def _check_model_cached(hf_model: str) -> tuple[bool, float | None]:
-    """Check if a HuggingFace model is cached locally."""
-    cache_dir_name = f"models--{hf_model.replace('/', '--')}"
-    cache_path = os.path.join(HF_CACHE_PATH, "hub", cache_dir_name)
-
-    if not os.path.isdir(cache_path):
+    """Check if a HuggingFace model is cached locally (from the cache index)."""
+    entry = hf_cache_index.lookup(hf_model)
+    if entry is None:
         return False, None
-
-    total_size = 0
-    for dirpath, _, filenames in os.walk(cache_path):
-        for f in filenames:
-            total_size += os.path.getsize(os.path.join(dirpath, f))
-
-    return True, round(total_size / (1024**3), 2)
+    return True, entry["size_gb"]
 
 
 @app.get("/v1/models/cache")
 async def cache_summary():
-    """List cached models in the HuggingFace cache volume."""
-    hub_path = os.path.join(HF_CACHE_PATH, "hub")
+    """List cached models in the HuggingFace cache volume (from the cache index)."""
     cached_models = []
     total_size = 0
 
-    if os.path.isdir(hub_path):
-        for entry in os.listdir(hub_path):
-            if not entry.startswith("models--"):
-                continue
-            dir_path = os.path.join(hub_path, entry)
-            if not os.path.isdir(dir_path):
-                continue
-            size = sum(
-                os.path.getsize(os.path.join(dp, f))
-                for dp, _, fnames in os.walk(dir_path)
-                for f in fnames
-            )
-            hf_name = entry.replace("models--", "").replace("--", "/", 1)
-            cached_models.append(
-                {"hf_model": hf_name, "size_gb": round(size / (1024**3), 2)}
-            )
-            total_size += size
+    for entry in hf_cache_index.models():
+        cached_models.append(
+            {
+                "hf_model": entry["hf_model"],
+                "size_gb": entry["size_gb"],
+                "files": entry["files"],
+                "complete": entry["complete"],
+                "missing_files": entry["missing_files"],
+                "incomplete_files": entry["incomplete_files"],
+            }
+        )
+        total_size += entry["size_bytes"]
 
     return {
         "total_cached_gb": round(total_size / (1024**3), 2),
         "cached_models": cached_models,
+        "index": hf_cache_index.stats(),
     }
 
 
@@ -794,10 +946,7 @@ async def model_cards_endpoint():
 
         state = model_states.get(model_id)
         if state:
-            container = get_container(state["container_name"])
-            status = (
-                "running" if container and container.status == "running" else "stopped"
-            )
+            status = "running" if state["status"] in ACTIVE_STATUSES else "stopped"
             idle_seconds = (
                 int(time.time() - state["last_used"])
                 if state["last_used"] > 0
@@ -823,8 +972,12 @@ async def model_cards_endpoint():
                 "license": card.get("license", ""),
                 "tags": card.get("tags", []),
                 "status": status,
+                "state": state["status"] if state else "unavailable",
                 "cached": cached,
                 "cache_size_gb": cache_size,
+                "cache_complete": (hf_cache_index.lookup(hf_model) or {}).get(
+                    "complete"
+                ),
                 "idle_seconds": idle_seconds,
             }
         )
@@ -882,6 +1035,7 @@ async def prefetch_model(model_id: str):
                 }
         except Exception as e:
             _prefetch_tasks[model_id] = {"status": "failed", "progress": str(e)}
+        hf_cache_index.request_rescan()
 
     thread = threading.Thread(target=do_prefetch, daemon=True)
     thread.start()
@@ -965,10 +1119,13 @@ async def get_recent_metrics(limit: int = 50):
 @app.api_route("/v1/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
 async def proxy(request: Request, path: str):
     """Proxy requests to the appropriate model container."""
-    # Parse request body to get model
+    # Read the body once; the raw bytes are forwarded as-is
+    request_body = await request.body() if request.method != "GET" else None
     try:
-        body = await request.json() if request.method != "GET" else {}
-    except:
+        body = json.loads(request_body) if request_body else {}
+    except ValueError:
+        body = {}
+    if not isinstance(body, dict):
         body = {}
 
     model_id = body.get("model")
@@ -994,9 +1151,10 @@ async def proxy(request: Request, path: str):
     state = model_states[model_id]
     state["last_used"] = time.time()
 
-    # Proxy to backend
+    # Proxy to backend over the container's pooled client
     container_name = state["container_name"]
-    backend_url = f"http://{container_name}:8000/v1/{path}"
+    client = backend_client(container_name)
+    backend_url = f"/v1/{path}"
 
     print(f"[{model_id}] Proxying {request.method} /v1/{path}")
 
@@ -1010,7 +1168,6 @@ async def proxy(request: Request, path: str):
         if isinstance(content, str):
             prompt_tokens += len(content) // 4  # ~4 chars per token
 
-    request_body = await request.body() if request.method != "GET" else None
     request_headers = {
         k: v
         for k, v in request.headers.items()
@@ -1044,68 +1201,66 @@ async def proxy(request: Request, path: str):
 
         async def stream_response():
             nonlocal completion_chunks
-            async with httpx.AsyncClient(timeout=None) as client:
-                try:
-                    async with client.stream(
-                        request.method,
-                        backend_url,
-                        headers=request_headers,
-                        content=request_body,
-                    ) as resp:
-                        if card.get("stream_aggregate"):
-                            # For reasoning models (qwen3 reasoning parser): parse each SSE
-                            # chunk and promote delta.reasoning → delta.content so clients
-                            # that don't handle the reasoning field always see content.
-                            buf = b""
-                            async for raw_chunk in resp.aiter_raw():
-                                buf += raw_chunk
-                                while b"\n" in buf:
-                                    line, buf = buf.split(b"\n", 1)
-                                    line = line.rstrip(b"\r")
-                                    if line.startswith(b"data: ") and line != b"data: [DONE]":
-                                        try:
-                                            chunk = json.loads(line[6:])
-                                            modified = False
-                                            for choice in chunk.get("choices", []):
-                                                delta = choice.get("delta", {})
-                                                reasoning = delta.get("reasoning")
-                                                content = delta.get("content")
-                                                if reasoning and not content:
-                                                    delta["content"] = reasoning
-                                                    del delta["reasoning"]
-                                                    modified = True
-                                                elif reasoning:
-                                                    del delta["reasoning"]
-                                                    modified = True
-                                            if modified:
-                                                line = b"data: " + json.dumps(chunk).encode()
-                                        except (json.JSONDecodeError, KeyError):
-                                            pass
-                                    if b'"content"' in line:
+            try:
+                async with client.stream(
+                    request.method,
+                    backend_url,
+                    headers=request_headers,
+                    content=request_body,
+                    timeout=None,
+                ) as resp:
+                    if card.get("stream_aggregate"):
+                        # For reasoning models (qwen3 reasoning parser): parse each SSE
+                        # chunk and promote delta.reasoning → delta.content so clients
+                        # that don't handle the reasoning field always see content.
+                        splitter = SSELineSplitter()
+                        async for raw_chunk in resp.aiter_raw():
+                            for line in splitter.feed(raw_chunk):
+                                if line.startswith(b"data: ") and line != b"data: [DONE]":
+                                    try:
+                                        chunk = json.loads(line[6:])
+                                        modified = False
+                                        for choice in chunk.get("choices", []):
+                                            delta = choice.get("delta", {})
+                                            reasoning = delta.get("reasoning")
+                                            content = delta.get("content")
+                                            if reasoning and not content:
+                                                delta["content"] = reasoning
+                                                del delta["reasoning"]
+                                                modified = True
+                                            elif reasoning:
+                                                del delta["reasoning"]
+                                                modified = True
+                                        if modified:
+                                            line = b"data: " + json.dumps(chunk).encode()
+                                    except (json.JSONDecodeError, KeyError):
+                                        pass
+                                if b'"content"' in line:
+                                    completion_chunks += 1
+                                yield line + b"\n"
+                        rest = splitter.flush()
+                        if rest:
+                            yield rest
+                    else:
+                        async for chunk in resp.aiter_raw():
+                            if chunk:
+                                for line in chunk.split(b"\n"):
+                                    if (
+                                        line.startswith(b"data: ")
+                                        and b'"content"' in line
+                                    ):
                                         completion_chunks += 1
-                                    yield line + b"\n"
-                            if buf:
-                                yield buf
-                        else:
-                            async for chunk in resp.aiter_raw():
-                                if chunk:
-                                    for line in chunk.split(b"\n"):
-                                        if (
-                                            line.startswith(b"data: ")
-                                            and b'"content"' in line
-                                        ):
-                                            completion_chunks += 1
-                                yield chunk
-                except httpx.ConnectError as e:
-                    error = {"error": f"Could not connect to model backend: {e}"}
-                    yield f"data: {json.dumps(error)}\n\n".encode()
-                    _finish_request(success=False)
-                    return
-                except Exception as e:
-                    error = {"error": f"Proxy error: {e}"}
-                    yield f"data: {json.dumps(error)}\n\n".encode()
-                    _finish_request(success=False)
-                    return
+                            yield chunk
+            except httpx.ConnectError as e:
+                error = {"error": f"Could not connect to model backend: {e}"}
+                yield f"data: {json.dumps(error)}\n\n".encode()
+                _finish_request(success=False)
+                return
+            except Exception as e:
+                error = {"error": f"Proxy error: {e}"}
+                yield f"data: {json.dumps(error)}\n\n".encode()
+                _finish_request(success=False)
+                return
             _finish_request(success=True)
 
         return StreamingResponse(stream_response(), media_type="text/event-stream")
@@ -1113,102 +1268,65 @@ async def proxy(request: Request, path: str):
         # Non-streaming: stream internally and aggregate to bypass vLLM's broken
         # non-streaming aggregation path (qwen3 reasoning parser bug).
         if card.get("stream_aggregate") and request.method == "POST":
-            stream_body = {**body, "stream": True}
+            # Ask for a final usage chunk so the response carries real token counts
+            stream_body = {
+                **body,
+                "stream": True,
+                "stream_options": {**(body.get("stream_options") or {}), "include_usage": True},
+            }
             stream_bytes = json.dumps(stream_body).encode()
-            agg_content = ""
-            agg_reasoning = ""
-            agg_tool_calls = []
-            finish_reason = None
-            response_id = None
-            response_model = None
-            completion_tokens = 0
-            prompt_tokens_resp = prompt_tokens
+            aggregator = ChatStreamAggregator()
             try:
-                async with httpx.AsyncClient(timeout=300) as client:
-                    async with client.stream(
-                        "POST",
-                        backend_url,
-                        headers=request_headers,
-                        content=stream_bytes,
-                    ) as resp:
-                        if resp.status_code != 200:
-                            error_text = await resp.aread()
-                            _finish_request(success=False)
-                            raise HTTPException(status_code=resp.status_code, detail=error_text.decode())
-                        async for line in resp.aiter_lines():
-                            if not line.startswith("data: ") or line == "data: [DONE]":
-                                continue
-                            try:
-                                chunk = json.loads(line[6:])
-                            except Exception:
-                                continue
-                            if not response_id:
-                                response_id = chunk.get("id")
-                                response_model = chunk.get("model")
-                            for choice in chunk.get("choices", []):
-                                delta = choice.get("delta", {})
-                                agg_content += delta.get("content") or ""
-                                agg_reasoning += delta.get("reasoning") or ""
-                                finish_reason = choice.get("finish_reason") or finish_reason
-                            usage = chunk.get("usage") or {}
-                            if usage.get("completion_tokens"):
-                                completion_tokens = usage["completion_tokens"]
-                                prompt_tokens_resp = usage.get("prompt_tokens", prompt_tokens)
+                async with client.stream(
+                    "POST",
+                    backend_url,
+                    headers=request_headers,
+                    content=stream_bytes,
+                ) as resp:
+                    if resp.status_code != 200:
+                        error_text = await resp.aread()
+                        _finish_request(success=False)
+                        raise HTTPException(status_code=resp.status_code, detail=error_text.decode())
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data: ") or line == "data: [DONE]":
+                            continue
+                        try:
+                            chunk = json.loads(line[6:])
+                        except Exception:
+                            continue
+                        aggregator.add(chunk)
             except HTTPException:
                 raise
             except Exception as e:
                 _finish_request(success=False)
                 raise HTTPException(status_code=502, detail=f"Backend error: {e}")
 
-            if not completion_tokens:
-                completion_tokens = len(agg_content.split())
-            completion_chunks = completion_tokens
-            rdata = {
-                "id": response_id or f"chatcmpl-agg",
-                "object": "chat.completion",
-                "created": int(time.time()),
-                "model": response_model or model_id,
-                "choices": [{
-                    "index": 0,
-                    "message": {
-                        "role": "assistant",
-                        "content": agg_content or None,
-                        **({"reasoning": agg_reasoning} if agg_reasoning else {}),
-                        "tool_calls": [],
-                    },
-                    "finish_reason": finish_reason or "stop",
-                }],
-                "usage": {
-                    "prompt_tokens": prompt_tokens_resp,
-                    "completion_tokens": completion_tokens,
-                    "total_tokens": prompt_tokens_resp + completion_tokens,
-                },
-            }
+            rdata = aggregator.result(model_id, prompt_tokens, int(time.time()))
+            completion_chunks = rdata["usage"].get("completion_tokens", 0)
             _finish_request(success=True)
             return JSONResponse(content=rdata)
         else:
             # Standard non-streaming proxy
-            async with httpx.AsyncClient(timeout=300) as client:
+            try:
+                resp = await client.request(
+                    request.method,
+                    backend_url,
+                    headers=request_headers,
+                    content=request_body,
+                )
                 try:
-                    resp = await client.request(
-                        request.method,
-                        backend_url,
-                        headers=request_headers,
-                        content=request_body,
-                    )
-                    try:
-                        rdata = resp.json()
-                        usage = rdata.get("usage", {})
-                        completion_chunks = usage.get("completion_tokens", 0)
-                        # Normalize: promote reasoning → content when content is absent
-                        for choice in rdata.get("choices", []):
-                            msg = choice.get("message", {})
-                            if msg.get("content") is None and msg.get("reasoning"):
-                                msg["content"] = msg.pop("reasoning")
-                    except Exception:
-                        rdata = None
-                    _finish_request(success=resp.status_code < 400)
-                    return JSONResponse(content=rdata if rdata else {}, status_code=resp.status_code)
-                except Exception as e:
-                    _finish_request(success=False)
-                    raise HTTPException(status_code=502, detail=f"Backend error: {e}")
+                    rdata = resp.json()
+                    usage = rdata.get("usage", {})
+                    completion_chunks = usage.get("completion_tokens", 0)
+                    # Normalize: promote reasoning → content when content is absent
+                    for choice in rdata.get("choices", []):
+                        msg = choice.get("message", {})
+                        if msg.get("content") is None and msg.get("reasoning"):
+                            msg["content"] = msg.pop("reasoning")
+                except Exception:
+                    rdata = None
+                _finish_request(success=resp.status_code < 400)
+                return JSONResponse(content=rdata if rdata else {}, status_code=resp.status_code)
+            except Exception as e:
+                _finish_request(success=False)
+                raise HTTPException(status_code=502, detail=f"Backend error: {e}")
@@ -0,0 +1,159 @@
+"""
+Helpers for proxying server-sent event streams from model backends.
+"""
+
+
+class SSELineSplitter:
+    """
+    Split a byte stream into lines in linear time.
+
+    Chunks are appended to one buffer and only the unscanned tail is searched
+    for newlines, so a long line arriving in many small chunks, or a chunk
+    holding many lines, is never rescanned or re-copied per line.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._scanned = 0  # bytes of _buf already known to hold no newline
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        """Add a chunk and return the complete lines it finished (without line endings)."""
+        buf = self._buf
+        buf += chunk
+        lines = []
+        start = 0
+        pos = self._scanned
+        while True:
+            end = buf.find(b"\n", pos)
+            if end < 0:
+                break
+            line = buf[start:end]
+            if line.endswith(b"\r"):
+                line = line[:-1]
+            lines.append(bytes(line))
+            start = pos = end + 1
+        if start:
+            del buf[:start]
+        self._scanned = len(buf)
+        return lines
+
+    def flush(self) -> bytes:
+        """Return whatever is left after the last newline."""
+        rest = bytes(self._buf)
+        self._buf.clear()
+        self._scanned = 0
+        return rest
+
+
+class ChatStreamAggregator:
+    """
+    Rebuild a non-streaming chat completion from streamed chunks.
+
+    Content, reasoning and tool-call argument fragments are appended to
+    lists and joined once in result(). Tool calls are reassembled by their
+    index, so an agent's function calls survive the stream_aggregate path.
+    """
+
+    def __init__(self):
+        self.id = None
+        self.model = None
+        self.usage = None
+        self.deltas = 0
+        self._choices: dict[int, dict] = {}
+
+    def _choice(self, index: int) -> dict:
+        choice = self._choices.get(index)
+        if choice is None:
+            choice = self._choices[index] = {
+                "content": [],
+                "reasoning": [],
+                "tool_calls": {},
+                "finish_reason": None,
+            }
+        return choice
+
+    def add(self, chunk: dict):
+        """Fold one parsed chunk into the result."""
+        if not self.id:
+            self.id = chunk.get("id")
+            self.model = chunk.get("model")
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        for choice in chunk.get("choices") or []:
+            agg = self._choice(choice.get("index", 0))
+            delta = choice.get("delta") or {}
+            if delta.get("content"):
+                agg["content"].append(delta["content"])
+                self.deltas += 1
+            if delta.get("reasoning"):
+                agg["reasoning"].append(delta["reasoning"])
+                self.deltas += 1
+            for call in delta.get("tool_calls") or []:
+                self._add_tool_call(agg["tool_calls"], call)
+            if choice.get("finish_reason"):
+                agg["finish_reason"] = choice["finish_reason"]
+
+    def _add_tool_call(self, calls: dict, fragment: dict):
+        index = fragment.get("index", len(calls))
+        call = calls.get(index)
+        if call is None:
+            call = calls[index] = {"id": None, "type": "function", "name": None, "arguments": []}
+        if fragment.get("id"):
+            call["id"] = fragment["id"]
+        if fragment.get("type"):
+            call["type"] = fragment["type"]
+        function = fragment.get("function") or {}
+        if function.get("name") and not call["name"]:
+            call["name"] = function["name"]
+        if function.get("arguments"):
+            call["arguments"].append(function["arguments"])
+            self.deltas += 1
+
+    def result(self, model_id: str, prompt_tokens: int, created: int) -> dict:
+        """
+        The aggregated chat.completion response.
+
+        Usage comes from the backend's include_usage chunk; without one,
+        completion tokens are estimated from the number of deltas (vLLM emits
+        about one token per delta).
+        """
+        choices = []
+        for index in sorted(self._choices) or [0]:
+            agg = self._choice(index)
+            tool_calls = []
+            for i, key in enumerate(sorted(agg["tool_calls"])):
+                call = agg["tool_calls"][key]
+                tool_calls.append({
+                    "id": call["id"] or f"call_{index}_{i}",
+                    "type": call["type"],
+                    "function": {"name": call["name"], "arguments": "".join(call["arguments"])},
+                })
+            content = "".join(agg["content"])
+            reasoning = "".join(agg["reasoning"])
+            finish_reason = agg["finish_reason"] or ("tool_calls" if tool_calls else "stop")
+            choices.append({
+                "index": index,
+                "message": {
+                    "role": "assistant",
+                    "content": content or None,
+                    **({"reasoning": reasoning} if reasoning else {}),
+                    "tool_calls": tool_calls,
+                },
+                "finish_reason": finish_reason,
+            })
+
+        usage = self.usage
+        if not usage or not usage.get("completion_tokens"):
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": self.deltas,
+                "total_tokens": prompt_tokens + self.deltas,
+            }
+        return {
+            "id": self.id or "chatcmpl-agg",
+            "object": "chat.completion",
+            "created": created,
+            "model": self.model or model_id,
+            "choices": choices,
+            "usage": usage,
+        }
@@ -3,7 +3,9 @@
 Design Principles (from OpenCode):
 - The HOST, not the model, owns: loop control, step count, tool execution, error handling, termination
 - Model is a stateless decision oracle
-- Single-action constraint: model emits exactly ONE action per turn
+- One decision per turn: a set of tool calls or a final answer. Independent
+  read-only tool calls from the same turn run concurrently; mutating calls run
+  alone, in the order the model emitted them
 - Host-enforced retries with structured feedback for malformed output
 - Provider-agnostic: can swap Claude, GPT-4, local models without system rewrite
 
@@ -12,6 +14,11 @@ Tools are now organized in the tools/ package:
 - tools/shell_tools.py: run_shell, task_complete
 - tools/git_tools.py: git_status, git_diff, git_log, git_add, git_commit, git_push, git_pull, git_branch, git_checkout
 - tools/security.py: Path validation, command blocklists, audit logging
+- tools/executor.py: Worker-pool execution so tools never block the event loop
+
+Context size is managed by agent_context.ContextLedger: each message is
+tokenized once when appended and old tool outputs are pruned against a budget
+derived from the routed model's context window.
 """
 
 import os
@@ -20,12 +27,21 @@ import json
 import logging
 import asyncio
 import time
+from dataclasses import dataclass
+from functools import partial
 from typing import Optional
 from pydantic import BaseModel, Field
 from enum import Enum
 
-from tools import get_tool_definitions, execute_tool
-from agent_storage import create_agent_run, add_agent_step, complete_agent_run
+from tools import get_tool_definitions, execute_tool_async, is_read_only_tool, ToolRunContext
+from agent_storage import (
+    AgentStepBuffer, create_agent_run, complete_agent_run, reopen_agent_run,
+    get_agent_checkpoints,
+)
+from agent_context import (
+    ContextLedger, DEFAULT_CONTEXT_WINDOW, PRUNE_MUTATING, PRUNE_READ_ONLY,
+    count_tools_tokens, prompt_budget,
+)
 from models import AgentRunStatus
 
 logger = logging.getLogger(__name__)
@@ -47,12 +63,18 @@ class ToolCall(BaseModel):
     """A tool call action."""
     name: str
     arguments: dict
+    id: Optional[str] = None
 
 
 class AgentAction(BaseModel):
-    """Model's single-action output. Exactly ONE field must be set."""
+    """Model's output for one turn. Exactly ONE kind of action is set.
+
+    ``tool_calls`` holds every call from the turn; ``tool_call`` mirrors the
+    first one for older clients.
+    """
     action_type: ActionType
     tool_call: Optional[ToolCall] = None
+    tool_calls: list[ToolCall] = []
     response: Optional[str] = None
     thinking: Optional[str] = None
     final_answer: Optional[str] = None
@@ -66,6 +88,12 @@ class AgentRequest(BaseModel):
     max_steps: int = Field(default=50, ge=1, le=100, description="Maximum steps before termination")
     source: Optional[str] = Field(default=None, description="Source of request (n8n, api, dashboard)")
     triggered_by: Optional[str] = Field(default=None, description="What triggered this run")
+    priority: Optional[str] = Field(
+        default=None,
+        description="Scheduling priority: interactive or background (default: derived from source)"
+    )
+    token_budget: Optional[int] = Field(default=None, ge=1, description="Max prompt+completion tokens for the run")
+    time_budget_s: Optional[float] = Field(default=None, gt=0, description="Max wall-clock seconds of execution")
 
 
 class AgentStep(BaseModel):
@@ -73,6 +101,7 @@ class AgentStep(BaseModel):
     step_number: int
     action: AgentAction
     tool_result: Optional[str] = None
+    tool_results: Optional[list[str]] = None
     error: Optional[str] = None
 
 
@@ -89,6 +118,104 @@ class AgentResponse(BaseModel):
     backend_name: Optional[str] = None
 
 
+class AgentResumeRequest(BaseModel):
+    """Request to resume a stopped agent run from its last checkpoint."""
+    model: Optional[str] = Field(default=None, description="Model to continue with (default: the run's model)")
+    max_steps: int = Field(default=50, ge=1, le=100, description="Maximum additional steps")
+
+
+class AgentForkRequest(BaseModel):
+    """Request to fork an agent run at a given step into a new run."""
+    step: int = Field(..., ge=0, description="Last step of the original run to keep")
+    model: Optional[str] = Field(default=None, description="Model for the forked run (default: the run's model)")
+    max_steps: int = Field(default=50, ge=1, le=100, description="Maximum additional steps")
+    triggered_by: Optional[str] = Field(default=None, description="What triggered this fork")
+
+
+class RunControl:
+    """
+    Host-side limits checked at every step boundary.
+
+    The scheduler sets ``preempt_requested`` to make a background run stop
+    after its current step (it is checkpointed and resumed later), and sets
+    ``cancel_reason`` before cancelling a run mid-step, so the run is stored
+    with that reason instead of as a user cancel.
+    ``deadline`` is a ``time.monotonic()`` value.
+    """
+
+    def __init__(self, token_budget: Optional[int] = None, deadline: Optional[float] = None):
+        self.token_budget = token_budget
+        self.deadline = deadline
+        self.preempt_requested = False
+        self.cancel_reason: Optional[str] = None
+
+    def stop_reason(self, tokens_used: int) -> Optional[str]:
+        if self.preempt_requested:
+            return "preempted"
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "time_budget_exceeded"
+        if self.token_budget and tokens_used >= self.token_budget:
+            return "token_budget_exceeded"
+        return None
+
+
+@dataclass
+class ResumeState:
+    """Loop state rebuilt from a run's checkpoints."""
+    run_id: str
+    step_number: int
+    records: list[dict]
+    steps: list[AgentStep]
+    state: dict
+
+
+# Runs currently executing in this process (resume must not race them)
+_active_runs: set[str] = set()
+
+
+def is_agent_run_active(run_id: str) -> bool:
+    return run_id in _active_runs
+
+
+def load_resume_state(
+    run_id: str,
+    up_to_step: Optional[int] = None,
+    reset_model: bool = False
+) -> Optional[ResumeState]:
+    """
+    Rebuild a run's loop state from its checkpoints.
+
+    Args:
+        run_id: Agent run ID
+        up_to_step: Last step to include (default: latest checkpoint)
+        reset_model: Forget the routed model/context window (continuing on another model)
+
+    Returns:
+        ResumeState, or None if the run has no checkpoints
+    """
+    checkpoints = get_agent_checkpoints(run_id, up_to_step)
+    if not checkpoints:
+        return None
+
+    records: list[dict] = []
+    steps: list[AgentStep] = []
+    for checkpoint in checkpoints:
+        records.extend(checkpoint["messages"])
+        steps.extend(AgentStep(**step) for step in checkpoint["steps"])
+
+    state = dict(checkpoints[-1]["state"])
+    if reset_model:
+        state.update(model_used=None, backend=None, backend_name=None, context_window=None)
+
+    return ResumeState(
+        run_id=run_id,
+        step_number=checkpoints[-1]["step_number"],
+        records=records,
+        steps=steps,
+        state=state,
+    )
+
+
 def get_agent_tools() -> list[dict]:
     """Get all registered tools for the agent."""
     return get_tool_definitions()
@@ -134,48 +261,11 @@ def build_system_prompt(task: str, working_dir: str) -> str:
 
 1. Search for skills FIRST - don't guess
 2. If task includes logs/data to analyze, analyze it directly
-3. One tool call at a time
+3. Batch independent lookups (read_file, search_files, list_directory, git_status, ...) into one turn; they run in parallel
 4. No thinking out loud - just act
 """
 
 
-def estimate_tokens(messages: list) -> int:
-    """Rough token estimation (~4 chars per token for English text)."""
-    total_chars = sum(len(str(m.get("content", ""))) for m in messages)
-    return total_chars // 4
-
-
-def prune_context_if_needed(messages: list, max_tokens: int = 6000) -> list:
-    """
-    Prune old tool results if context is getting too large.
-    Keeps system prompt and recent messages, summarizes old tool results.
-    """
-    estimated = estimate_tokens(messages)
-    if estimated <= max_tokens:
-        return messages
-    
-    logger.warning(f"Context too large (~{estimated} tokens), pruning old messages")
-    
-    pruned = []
-    for i, msg in enumerate(messages):
-        if msg.get("role") == "system":
-            pruned.append(msg)
-        elif msg.get("role") == "tool" and i < len(messages) - 4:
-            content = msg.get("content", "")
-            if len(content) > 500:
-                pruned.append({
-                    **msg,
-                    "content": f"[Summarized: {content[:200]}...]"
-                })
-            else:
-                pruned.append(msg)
-        else:
-            pruned.append(msg)
-    
-    logger.info(f"Pruned context: {estimated} -> ~{estimate_tokens(pruned)} tokens")
-    return pruned
-
-
 def extract_tool_from_text(content: str) -> Optional[ToolCall]:
     """
     Fallback: extract tool call from plain text like 'search_skills("docker")'.
@@ -217,27 +307,37 @@ def parse_model_response(response: dict) -> tuple[AgentAction, Optional[str]]:
         # Check for tool calls
         tool_calls = message.get("tool_calls", [])
         if tool_calls:
-            tc = tool_calls[0]  # Single-action: only process first
-            func = tc.get("function", {})
-            name = func.get("name", "")
-
-            # Parse arguments
-            args_str = func.get("arguments", "{}")
-            try:
-                args = json.loads(args_str) if isinstance(args_str, str) else args_str
-            except json.JSONDecodeError:
-                return None, f"Invalid JSON in tool arguments: {args_str}"
-
-            # Check if this is termination
-            if name == "task_complete":
+            calls = []
+            final_answer = None
+            for tc in tool_calls:
+                func = tc.get("function", {})
+                name = func.get("name", "")
+
+                # Parse arguments
+                args_str = func.get("arguments", "{}")
+                try:
+                    args = json.loads(args_str) if isinstance(args_str, str) else args_str
+                except json.JSONDecodeError:
+                    return None, f"Invalid JSON in tool arguments for {name}: {args_str}"
+
+                # Termination is applied after the turn's other calls have run
+                if name == "task_complete":
+                    final_answer = (args or {}).get("answer", "Task completed")
+                    continue
+
+                calls.append(ToolCall(name=name, arguments=args or {}, id=tc.get("id")))
+
+            if not calls:
                 return AgentAction(
                     action_type=ActionType.TERMINATE,
-                    final_answer=args.get("answer", "Task completed")
+                    final_answer=final_answer
                 ), None
 
             return AgentAction(
                 action_type=ActionType.TOOL_CALL,
-                tool_call=ToolCall(name=name, arguments=args)
+                tool_call=calls[0],
+                tool_calls=calls,
+                final_answer=final_answer
             ), None
 
         # Check for regular content (response or thinking)
@@ -262,7 +362,8 @@ def parse_model_response(response: dict) -> tuple[AgentAction, Optional[str]]:
                     ), None
                 return AgentAction(
                     action_type=ActionType.TOOL_CALL,
-                    tool_call=extracted
+                    tool_call=extracted,
+                    tool_calls=[extracted]
                 ), None
 
             # Treat as thinking/response
@@ -277,9 +378,64 @@ def parse_model_response(response: dict) -> tuple[AgentAction, Optional[str]]:
         return None, f"Failed to parse response: {e}"
 
 
+def plan_tool_batches(tool_calls: list[ToolCall]) -> list[list[ToolCall]]:
+    """
+    Group one turn's tool calls into batches that can run concurrently.
+
+    Consecutive read-only calls share a batch. Every mutating call gets a
+    batch of its own, so side effects happen in the order the model asked for.
+    """
+    batches: list[list[ToolCall]] = []
+    for call in tool_calls:
+        read_only = is_read_only_tool(call.name)
+        if read_only and batches and all(is_read_only_tool(c.name) for c in batches[-1]):
+            batches[-1].append(call)
+        else:
+            batches.append([call])
+    return batches
+
+
+def emit_event(events: Optional[asyncio.Queue], event_type: str, **data) -> None:
+    """Publish an agent event to a stream consumer, if one is attached."""
+    if events is not None:
+        events.put_nowait({"type": event_type, "timestamp": time.time(), **data})
+
+
+async def execute_tool_calls(
+    tool_calls: list[ToolCall],
+    working_dir: str,
+    run: Optional[ToolRunContext] = None,
+    events: Optional[asyncio.Queue] = None,
+    step_number: Optional[int] = None
+) -> list[tuple[str, int]]:
+    """Execute a turn's tool calls, batch by batch. Returns (result, duration_ms) per call, in order."""
+    run_id = run.run_id if run else None
+
+    async def _timed(call: ToolCall) -> tuple[str, int]:
+        emit_event(events, "tool_started", run_id=run_id, step=step_number,
+                   tool_call_id=call.id, name=call.name, arguments=call.arguments)
+        start = time.time()
+        result = await execute_tool_async(call.name, call.arguments, working_dir, run=run, call_id=call.id)
+        duration_ms = int((time.time() - start) * 1000)
+        emit_event(events, "tool_finished", run_id=run_id, step=step_number,
+                   tool_call_id=call.id, name=call.name, duration_ms=duration_ms,
+                   result=result[:5000] if result else result)
+        return result, duration_ms
+
+    outcomes: list[tuple[str, int]] = []
+    for batch in plan_tool_batches(tool_calls):
+        if len(batch) > 1:
+            logger.info(f"Running {len(batch)} read-only tools in parallel: {[c.name for c in batch]}")
+        outcomes.extend(await asyncio.gather(*[_timed(call) for call in batch]))
+    return outcomes
+
+
 async def run_agent_loop(
     request: AgentRequest,
-    call_llm: callable
+    call_llm: callable,
+    events: Optional[asyncio.Queue] = None,
+    resume: Optional[ResumeState] = None,
+    control: Optional[RunControl] = None
 ) -> AgentResponse:
     """
     Run the host-controlled agent loop.
@@ -292,173 +448,357 @@ async def run_agent_loop(
     - Termination conditions
 
     The model is a stateless decision oracle.
-    """
-    system_prompt = build_system_prompt(request.task, request.working_directory)
-    
-    run_id = create_agent_run(
-        task=request.task,
-        working_directory=request.working_directory,
-        model_requested=request.model,
-        source=request.source,
-        triggered_by=request.triggered_by,
-        system_prompt=system_prompt
-    )
-    
-    steps: list[AgentStep] = []
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": f"Please complete this task: {request.task}"}
-    ]
 
+    If ``events`` is given, progress is published to it as it happens
+    (run_started, step_started, model_decision, tool_started, tool_output,
+    tool_finished, run_completed / run_cancelled) for streaming clients.
+
+    A checkpoint is saved after every step. Pass ``resume`` (from
+    ``load_resume_state``) to continue an existing run after its last
+    checkpoint instead of starting a new one; ``request.max_steps`` then
+    bounds the additional steps. ``control`` adds token/time budgets and
+    preemption, checked before each step.
+    """
     max_steps = min(request.max_steps, MAX_STEPS)
     terminated_reason = "max_steps_reached"
     final_answer = None
-    model_used = None
-    backend_used = None
-    backend_name = None
-    
+
     current_tools = get_agent_tools()
+    tools_tokens = count_tools_tokens(current_tools)
+
+    if resume is None:
+        system_prompt = build_system_prompt(request.task, request.working_directory)
+
+        run_id = create_agent_run(
+            task=request.task,
+            working_directory=request.working_directory,
+            model_requested=request.model,
+            source=request.source,
+            triggered_by=request.triggered_by,
+            system_prompt=system_prompt
+        )
+
+        steps: list[AgentStep] = []
+        start_step = 0
+        model_used = None
+        backend_used = None
+        backend_name = None
+        context_window = None
+        total_prompt_tokens = 0
+        total_completion_tokens = 0
+
+        # Turn 0 (system prompt + task) is pinned; later turns are keyed by step number
+        context = ContextLedger(prompt_budget(DEFAULT_CONTEXT_WINDOW, tools_tokens))
+        context.append({"role": "system", "content": system_prompt}, turn=0)
+        context.append({"role": "user", "content": f"Please complete this task: {request.task}"}, turn=0)
+    else:
+        run_id = resume.run_id
+        reopen_agent_run(run_id, model_requested=request.model)
+
+        steps = list(resume.steps)
+        start_step = resume.step_number
+        state = resume.state
+        model_used = state.get("model_used")
+        backend_used = state.get("backend")
+        backend_name = state.get("backend_name")
+        context_window = state.get("context_window")
+        total_prompt_tokens = state.get("prompt_tokens", 0)
+        total_completion_tokens = state.get("completion_tokens", 0)
+
+        context = ContextLedger(prompt_budget(context_window or DEFAULT_CONTEXT_WINDOW, tools_tokens))
+        context.replay(resume.records)
+        logger.info(f"Resuming agent run {run_id} after step {start_step} ({len(context)} messages)")
+
+    # Step rows and checkpoints are written in batches, not one transaction per step
+    step_log = AgentStepBuffer(run_id)
+    checkpointed_steps = len(steps)
+
+    def checkpoint(step_number: int) -> None:
+        """Record what this step added so the run can be resumed or forked from here."""
+        nonlocal checkpointed_steps
+        try:
+            step_log.checkpoint(
+                step_number,
+                messages=context.drain_journal(),
+                steps=[step.model_dump(mode="json") for step in steps[checkpointed_steps:]],
+                state={
+                    "model_used": model_used,
+                    "backend": backend_used,
+                    "backend_name": backend_name,
+                    "context_window": context_window,
+                    "prompt_tokens": total_prompt_tokens,
+                    "completion_tokens": total_completion_tokens,
+                }
+            )
+            checkpointed_steps = len(steps)
+        except Exception as e:
+            logger.warning(f"Failed to checkpoint agent run {run_id} at step {step_number}: {e}")
 
-    for step_num in range(1, max_steps + 1):
-        logger.info(f"Agent step {step_num}/{max_steps}")
-
-        retries = 0
-        action = None
-        error = None
-        step_prompt_tokens = None
-        step_completion_tokens = None
-
-        while retries < MAX_RETRIES:
-            try:
-                pruned_messages = prune_context_if_needed(messages)
-                
-                response = await call_llm(
-                    messages=pruned_messages,
-                    model=request.model,
-                    tools=current_tools,
-                    tool_choice="auto"
-                )
+    if resume is None:
+        checkpoint(0)
 
-                routing_info = response.pop("_routing_info", None)
-                if routing_info and not model_used:
-                    model_used = routing_info.get("model")
-                    backend_used = routing_info.get("backend")
-                    backend_name = routing_info.get("backend_name")
+    on_output = None
+    if events is not None:
+        loop = asyncio.get_running_loop()
 
-                usage = response.get("usage", {})
-                step_prompt_tokens = usage.get("prompt_tokens")
-                step_completion_tokens = usage.get("completion_tokens")
+        def on_output(call_id: Optional[str], chunk: str) -> None:
+            loop.call_soon_threadsafe(partial(
+                emit_event, events, "tool_output", run_id=run_id, tool_call_id=call_id, chunk=chunk
+            ))
 
-                action, error = parse_model_response(response)
+    tool_run = ToolRunContext(run_id, on_output=on_output)
+    _active_runs.add(run_id)
+    emit_event(
+        events, "run_started", run_id=run_id, task=request.task, model=request.model,
+        resumed_from_step=start_step if resume is not None else None
+    )
 
-                if action:
-                    break
+    last_step = start_step
+    try:
+        for step_num in range(start_step + 1, start_step + max_steps + 1):
+            stop_reason = control.stop_reason(total_prompt_tokens + total_completion_tokens) if control else None
+            if stop_reason:
+                logger.info(f"Agent run {run_id} stopping before step {step_num}: {stop_reason}")
+                terminated_reason = stop_reason
+                break
+            if step_num > start_step + 1:
+                checkpoint(step_num - 1)
+            last_step = step_num
+            logger.info(f"Agent step {step_num}/{start_step + max_steps}")
+            emit_event(events, "step_started", run_id=run_id, step=step_num)
+
+            retries = 0
+            action = None
+            error = None
+            step_prompt_tokens = None
+            step_completion_tokens = None
+
+            while retries < MAX_RETRIES:
+                try:
+                    response = await call_llm(
+                        messages=context.messages,
+                        model=request.model,
+                        tools=current_tools,
+                        tool_choice="auto",
+                        prompt_tokens=context.total,
+                        tools_tokens=tools_tokens,
+                    )
+
+                    routing_info = response.pop("_routing_info", None)
+                    if routing_info and not model_used:
+                        model_used = routing_info.get("model")
+                        backend_used = routing_info.get("backend")
+                        backend_name = routing_info.get("backend_name")
+                    if routing_info and routing_info.get("context_window") and not context_window:
+                        context_window = routing_info["context_window"]
+                        context.set_budget(prompt_budget(context_window, tools_tokens))
+
+                    usage = response.get("usage", {})
+                    step_prompt_tokens = usage.get("prompt_tokens")
+                    step_completion_tokens = usage.get("completion_tokens")
+
+                    total_prompt_tokens += step_prompt_tokens or 0
+                    total_completion_tokens += step_completion_tokens or 0
+
+                    action, error = parse_model_response(response)
+
+                    if action:
+                        break
+
+                    retries += 1
+                    logger.warning(f"Parse error (retry {retries}): {error}")
+                    emit_event(events, "parse_error", run_id=run_id, step=step_num, retry=retries, error=error)
+                    context.append({
+                        "role": "user",
+                        "content": f"[SYSTEM ERROR] Your response could not be parsed: {error}\n"
+                                   f"Please respond with a valid tool call or a clear message."
+                    }, turn=step_num)
+
+                except Exception as e:
+                    retries += 1
+                    error = str(e)
+                    logger.error(f"LLM call failed (retry {retries}): {e}")
+                    await asyncio.sleep(1)
+
+            if action:
+                # Host-assigned IDs for calls the model left unnamed (and text-extracted calls)
+                for i, call in enumerate(action.tool_calls):
+                    call.id = call.id or f"call_{step_num}_{i}"
+                emit_event(
+                    events, "model_decision", run_id=run_id, step=step_num,
+                    action=action.model_dump(mode="json"), model=model_used,
+                    usage={
+                        "prompt_tokens": step_prompt_tokens,
+                        "completion_tokens": step_completion_tokens,
+                    }
+                )
 
-                retries += 1
-                logger.warning(f"Parse error (retry {retries}): {error}")
-                messages.append({
+            if not action:
+                steps.append(AgentStep(
+                    step_number=step_num,
+                    action=AgentAction(action_type=ActionType.RESPONSE, response="Failed to get valid response"),
+                    error=error
+                ))
+                step_log.add(step_num, "response", error=error,
+                              prompt_tokens=step_prompt_tokens, completion_tokens=step_completion_tokens)
+                terminated_reason = "parse_failure"
+                break
+
+            if action.action_type == ActionType.TERMINATE:
+                steps.append(AgentStep(
+                    step_number=step_num,
+                    action=action
+                ))
+                step_log.add(step_num, "terminate",
+                              prompt_tokens=step_prompt_tokens, completion_tokens=step_completion_tokens)
+                final_answer = action.final_answer
+                terminated_reason = "completed"
+                break
+
+            if action.action_type == ActionType.THINK:
+                steps.append(AgentStep(
+                    step_number=step_num,
+                    action=action
+                ))
+                step_log.add(step_num, "think", thinking=action.thinking,
+                              prompt_tokens=step_prompt_tokens, completion_tokens=step_completion_tokens)
+                context.append({"role": "assistant", "content": action.thinking}, turn=step_num)
+                context.append({
                     "role": "user",
-                    "content": f"[SYSTEM ERROR] Your response could not be parsed: {error}\n"
-                               f"Please respond with a valid tool call or a clear message."
-                })
-
-            except Exception as e:
-                retries += 1
-                error = str(e)
-                logger.error(f"LLM call failed (retry {retries}): {e}")
-                await asyncio.sleep(1)
-
-        if not action:
-            steps.append(AgentStep(
-                step_number=step_num,
-                action=AgentAction(action_type=ActionType.RESPONSE, response="Failed to get valid response"),
-                error=error
-            ))
-            add_agent_step(run_id, step_num, "response", error=error,
-                          prompt_tokens=step_prompt_tokens, completion_tokens=step_completion_tokens)
-            terminated_reason = "parse_failure"
-            break
-
-        if action.action_type == ActionType.TERMINATE:
-            steps.append(AgentStep(
-                step_number=step_num,
-                action=action
-            ))
-            add_agent_step(run_id, step_num, "terminate",
-                          prompt_tokens=step_prompt_tokens, completion_tokens=step_completion_tokens)
-            final_answer = action.final_answer
-            terminated_reason = "completed"
-            break
-
-        if action.action_type == ActionType.THINK:
-            steps.append(AgentStep(
-                step_number=step_num,
-                action=action
-            ))
-            add_agent_step(run_id, step_num, "think", thinking=action.thinking,
-                          prompt_tokens=step_prompt_tokens, completion_tokens=step_completion_tokens)
-            messages.append({"role": "assistant", "content": action.thinking})
-            messages.append({
-                "role": "user",
-                "content": "Good thinking. Now please take an action by calling a tool."
-            })
-            continue
-
-        if action.action_type == ActionType.TOOL_CALL and action.tool_call:
-            step_start = time.time()
-            tool_result = execute_tool(
-                action.tool_call.name,
-                action.tool_call.arguments,
-                request.working_directory
-            )
-            step_duration = int((time.time() - step_start) * 1000)
+                    "content": "Good thinking. Now please take an action by calling a tool."
+                }, turn=step_num)
+                continue
+
+            if action.action_type == ActionType.TOOL_CALL and action.tool_calls:
+                outcomes = await execute_tool_calls(
+                    action.tool_calls,
+                    request.working_directory,
+                    run=tool_run,
+                    events=events,
+                    step_number=step_num
+                )
+                tool_results = [result for result, _ in outcomes]
+
+                steps.append(AgentStep(
+                    step_number=step_num,
+                    action=action,
+                    tool_result=tool_results[0] if len(tool_results) == 1 else "\n\n".join(
+                        f"[{call.name}]\n{result}" for call, result in zip(action.tool_calls, tool_results)
+                    ),
+                    tool_results=tool_results
+                ))
+
+                for i, (call, (tool_result, duration_ms)) in enumerate(zip(action.tool_calls, outcomes)):
+                    # Token usage belongs to the model turn, so only the first call carries it
+                    step_log.add(
+                        step_num, "tool_call",
+                        tool_name=call.name,
+                        tool_args=call.arguments,
+                        tool_result=tool_result[:5000] if tool_result else None,
+                        duration_ms=duration_ms,
+                        prompt_tokens=step_prompt_tokens if i == 0 else None,
+                        completion_tokens=step_completion_tokens if i == 0 else None
+                    )
+                    logger.info(f"Tool {call.name} executed: {tool_result[:200]}...")
+
+                context.append({
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {
+                            "id": call.id,
+                            "type": "function",
+                            "function": {
+                                "name": call.name,
+                                "arguments": json.dumps(call.arguments)
+                            }
+                        }
+                        for call in action.tool_calls
+                    ]
+                }, turn=step_num)
+                for call, tool_result in zip(action.tool_calls, tool_results):
+                    # Read-only outputs can be re-fetched, so they are pruned first
+                    context.append(
+                        {"role": "tool", "tool_call_id": call.id, "content": tool_result},
+                        turn=step_num,
+                        prune_class=PRUNE_READ_ONLY if is_read_only_tool(call.name) else PRUNE_MUTATING,
+                        label=call.name
+                    )
+
+                # task_complete emitted alongside other calls ends the run once they have run
+                if action.final_answer is not None:
+                    step_log.add(step_num, "terminate")
+                    final_answer = action.final_answer
+                    terminated_reason = "completed"
+                    break
 
-            steps.append(AgentStep(
-                step_number=step_num,
-                action=action,
-                tool_result=tool_result
-            ))
-            
-            add_agent_step(
-                run_id, step_num, "tool_call",
-                tool_name=action.tool_call.name,
-                tool_args=action.tool_call.arguments,
-                tool_result=tool_result[:5000] if tool_result else None,
-                duration_ms=step_duration,
-                prompt_tokens=step_prompt_tokens,
-                completion_tokens=step_completion_tokens
+    except asyncio.CancelledError:
+        tool_run.cancel()
+        cancel_reason = control.cancel_reason if control else None
+        if cancel_reason:
+            # Stopped by the host (e.g. hard time budget), not by the client
+            logger.info(f"Agent run {run_id} stopped after {len(steps)} steps: {cancel_reason}")
+            complete_agent_run(
+                run_id,
+                status=AgentRunStatus.FAILED,
+                model_used=model_used,
+                backend=backend_used,
+                error=cancel_reason,
+                step_buffer=step_log
             )
-
-            messages.append({
-                "role": "assistant",
-                "content": None,
-                "tool_calls": [{
-                    "id": f"call_{step_num}",
-                    "type": "function",
-                    "function": {
-                        "name": action.tool_call.name,
-                        "arguments": json.dumps(action.tool_call.arguments)
-                    }
-                }]
-            })
-            messages.append({
-                "role": "tool",
-                "tool_call_id": f"call_{step_num}",
-                "content": tool_result
-            })
-
-            logger.info(f"Tool {action.tool_call.name} executed: {tool_result[:200]}...")
-
-    status = AgentRunStatus.COMPLETED if terminated_reason == "completed" else (
-        AgentRunStatus.MAX_STEPS if terminated_reason == "max_steps_reached" else AgentRunStatus.FAILED
-    )
+            emit_event(
+                events, "run_completed",
+                run_id=run_id, status=AgentRunStatus.FAILED.value,
+                terminated_reason=cancel_reason, final_answer=None,
+                total_steps=len(steps), model_used=model_used, backend=backend_used,
+                usage={
+                    "prompt_tokens": total_prompt_tokens,
+                    "completion_tokens": total_completion_tokens,
+                }
+            )
+            raise
+        logger.info(f"Agent run {run_id} cancelled after {len(steps)} steps")
+        complete_agent_run(
+            run_id,
+            status=AgentRunStatus.CANCELLED,
+            model_used=model_used,
+            backend=backend_used,
+            error="cancelled",
+            step_buffer=step_log
+        )
+        emit_event(events, "run_cancelled", run_id=run_id, total_steps=len(steps))
+        raise
+    finally:
+        _active_runs.discard(run_id)
+
+    if last_step > start_step:
+        checkpoint(last_step)
+
+    status = {
+        "completed": AgentRunStatus.COMPLETED,
+        "max_steps_reached": AgentRunStatus.MAX_STEPS,
+        "preempted": AgentRunStatus.PREEMPTED,
+    }.get(terminated_reason, AgentRunStatus.FAILED)
     complete_agent_run(
         run_id,
         status=status,
         final_answer=final_answer,
         model_used=model_used,
         backend=backend_used,
-        error=None if terminated_reason == "completed" else terminated_reason
+        error=None if terminated_reason == "completed" else terminated_reason,
+        step_buffer=step_log
+    )
+
+    # A preempted run is requeued by the scheduler, so it is not terminal for clients
+    emit_event(
+        events, "run_preempted" if status == AgentRunStatus.PREEMPTED else "run_completed",
+        run_id=run_id, status=status.value,
+        terminated_reason=terminated_reason, final_answer=final_answer,
+        total_steps=len(steps), model_used=model_used, backend=backend_used,
+        usage={
+            "prompt_tokens": total_prompt_tokens,
+            "completion_tokens": total_completion_tokens,
+        }
     )
 
     return AgentResponse(
@@ -0,0 +1,271 @@
+"""Token-aware context management for agent runs.
+
+The agent loop appends every message to a ``ContextLedger`` instead of a bare
+list. Each message is tokenized once, when it is appended, and the ledger keeps
+a running total, so checking the budget before a model call is O(1) regardless
+of history length.
+
+When the total exceeds the budget (derived from the routed model's
+``context_window``), the ledger frees tokens in order of least value:
+
+1. Old outputs of read-only tools (read_file, search_files, ...) are replaced
+   with a short stub; the model can simply re-run the tool.
+2. Old outputs of mutating tools are stubbed the same way.
+3. Whole old turns are dropped: an assistant message together with all of its
+   tool results, so tool_call/tool pairing is never broken.
+
+The system prompt, the task message and the most recent turns are never pruned.
+
+Appended messages are also journaled in their original form, so the agent
+can checkpoint each step's additions and later rebuild the ledger by
+replaying them (see ``ContextLedger.replay``).
+"""
+
+import os
+import json
+import heapq
+import logging
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Used until the first response tells us which model (and window) was routed to
+DEFAULT_CONTEXT_WINDOW = int(os.getenv("AGENT_DEFAULT_CONTEXT_WINDOW", "8192"))
+
+# Tokens reserved for the model's reply
+COMPLETION_RESERVE = int(os.getenv("AGENT_COMPLETION_RESERVE", "2048"))
+
+# Turns at the end of the history that are never pruned
+KEEP_RECENT_TURNS = int(os.getenv("AGENT_KEEP_RECENT_TURNS", "2"))
+
+# Tool outputs at or below this size are not worth stubbing
+MIN_PRUNABLE_TOKENS = 64
+
+# Characters of the original output kept in a stub
+STUB_HEAD_CHARS = 200
+
+# Per-message overhead (role, separators) in chat templates
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Pruning classes: lower is pruned first
+PRUNE_READ_ONLY = 0
+PRUNE_MUTATING = 1
+
+_encoding = None
+_encoding_failed = False
+
+
+def count_text_tokens(text: str) -> int:
+    """Count tokens with tiktoken (cl100k_base), or ~4 chars/token if unavailable."""
+    global _encoding, _encoding_failed
+    if not text:
+        return 0
+    if _encoding is None and not _encoding_failed:
+        try:
+            from compaction import get_tokenizer
+            _encoding = get_tokenizer()
+        except Exception as e:
+            _encoding_failed = True
+            logger.warning(f"tiktoken unavailable ({e}), estimating agent context at ~4 chars/token")
+    if _encoding is None:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(message: dict) -> int:
+    """Tokens for one chat message, including tool call arguments."""
+    total = MESSAGE_OVERHEAD_TOKENS
+    content = message.get("content")
+    if isinstance(content, str):
+        total += count_text_tokens(content)
+    elif isinstance(content, list):
+        for part in content:
+            if isinstance(part, dict) and part.get("type") == "text":
+                total += count_text_tokens(part.get("text", ""))
+    for call in message.get("tool_calls") or []:
+        function = call.get("function", {})
+        total += count_text_tokens(function.get("name", ""))
+        total += count_text_tokens(function.get("arguments", ""))
+    return total
+
+
+def prompt_budget(context_window: int, tools_tokens: int = 0) -> int:
+    """Tokens available for messages once the reply and tool schemas are accounted for."""
+    return max(context_window - COMPLETION_RESERVE - tools_tokens, 1024)
+
+
+def count_tools_tokens(tools: list[dict]) -> int:
+    """Tokens taken by the tool schemas sent with every request."""
+    return count_text_tokens(json.dumps(tools)) if tools else 0
+
+
+@dataclass(eq=False)
+class _Entry:
+    message: dict
+    tokens: int
+    turn: int
+    label: Optional[str] = None
+    pruned: bool = False
+
+
+class ContextLedger:
+    """
+    Message history with per-message token counts and budget enforcement.
+
+    ``turn`` groups messages that must be kept or dropped together (an
+    assistant message and its tool results). Turn 0 is pinned.
+    """
+
+    def __init__(
+        self,
+        budget_tokens: int,
+        keep_recent_turns: int = KEEP_RECENT_TURNS,
+        count_tokens: Callable[[dict], int] = count_message_tokens,
+    ):
+        self.budget = budget_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.count_tokens = count_tokens
+        self.total = 0
+        self.pruned_count = 0
+        self.dropped_count = 0
+
+        self._entries: list[_Entry] = []
+        self._messages: list[dict] = []
+        self._heap: list[tuple[int, int, _Entry]] = []
+        self._seq = 0
+        self._last_turn = 0
+        self._journal: list[dict] = []
+
+    @property
+    def messages(self) -> list[dict]:
+        """Current (possibly pruned) message list to send to the model."""
+        return self._messages
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def append(
+        self,
+        message: dict,
+        turn: int,
+        prune_class: Optional[int] = None,
+        label: Optional[str] = None,
+    ) -> None:
+        """
+        Add a message, counting its tokens once.
+
+        Args:
+            message: Chat message dict
+            turn: Turn (step) the message belongs to; 0 pins it
+            prune_class: PRUNE_READ_ONLY / PRUNE_MUTATING for tool outputs that
+                may be stubbed, None to never stub the message
+            label: Name shown in the stub (usually the tool name)
+        """
+        # Stubbing replaces "content" on the live dict, so journal a copy
+        self._journal.append({
+            "message": dict(message), "turn": turn, "prune_class": prune_class, "label": label,
+        })
+        entry = _Entry(message=message, tokens=self.count_tokens(message), turn=turn, label=label)
+        self._entries.append(entry)
+        self._messages.append(message)
+        self.total += entry.tokens
+        self._last_turn = max(self._last_turn, turn)
+
+        if prune_class is not None and entry.tokens > MIN_PRUNABLE_TOKENS:
+            self._seq += 1
+            heapq.heappush(self._heap, (prune_class, self._seq, entry))
+
+        if self.total > self.budget:
+            self.enforce_budget()
+
+    def drain_journal(self) -> list[dict]:
+        """Messages appended since the last drain, as originally appended."""
+        journal, self._journal = self._journal, []
+        return journal
+
+    def replay(self, records: list[dict]) -> None:
+        """Re-append journaled messages (e.g. from checkpoints) without re-journaling them."""
+        start = len(self._journal)
+        for record in records:
+            self.append(
+                dict(record["message"]),
+                turn=record["turn"],
+                prune_class=record.get("prune_class"),
+                label=record.get("label"),
+            )
+        del self._journal[start:]
+
+    def set_budget(self, budget_tokens: int) -> None:
+        self.budget = budget_tokens
+        if self.total > self.budget:
+            self.enforce_budget()
+
+    def _is_recent(self, entry: _Entry) -> bool:
+        return entry.turn > self._last_turn - self.keep_recent_turns
+
+    def _stub(self, entry: _Entry) -> None:
+        content = entry.message.get("content") or ""
+        head = content[:STUB_HEAD_CHARS].rstrip()
+        entry.message["content"] = (
+            f"[Pruned {entry.label or 'tool'} output ({entry.tokens} tokens) to save context. "
+            f"Re-run the tool if you need it again.]\n{head}..."
+        )
+        new_tokens = self.count_tokens(entry.message)
+        self.total += new_tokens - entry.tokens
+        entry.tokens = new_tokens
+        entry.pruned = True
+        self.pruned_count += 1
+
+    def _drop_oldest_turn(self) -> bool:
+        """Drop the oldest unpinned, non-recent turn. Returns False if none is left."""
+        candidates = [e.turn for e in self._entries if e.turn > 0 and not self._is_recent(e)]
+        if not candidates:
+            return False
+        oldest = min(candidates)
+        kept = []
+        for entry in self._entries:
+            if entry.turn == oldest:
+                self.total -= entry.tokens
+                entry.pruned = True
+                self.dropped_count += 1
+            else:
+                kept.append(entry)
+        self._entries = kept
+        self._messages = [e.message for e in kept]
+        return True
+
+    def _stub_from_heap(self, protect: Callable[[_Entry], bool]) -> None:
+        """Stub queued tool outputs, least valuable first, skipping protected ones."""
+        deferred = []
+        while self.total > self.budget and self._heap:
+            item = heapq.heappop(self._heap)
+            entry = item[2]
+            if entry.pruned:
+                continue
+            if protect(entry):
+                deferred.append(item)
+                continue
+            self._stub(entry)
+        for item in deferred:
+            heapq.heappush(self._heap, item)
+
+    def enforce_budget(self) -> None:
+        """Free tokens (stub, then drop) until the history fits the budget."""
+        before = self.total
+
+        self._stub_from_heap(self._is_recent)
+
+        while self.total > self.budget and self._drop_oldest_turn():
+            pass
+
+        # Recent turns alone exceed the budget: stub them too, except the latest
+        self._stub_from_heap(lambda entry: entry.turn == self._last_turn)
+
+        if self.total != before:
+            logger.info(
+                f"Pruned agent context: {before} -> {self.total} tokens "
+                f"(budget {self.budget}, {self.pruned_count} stubbed, {self.dropped_count} dropped)"
+            )
+        if self.total > self.budget:
+            logger.warning(f"Agent context still over budget: {self.total} > {self.budget} tokens")
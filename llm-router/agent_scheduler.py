@@ -0,0 +1,373 @@
+"""Agent run scheduler.
+
+Every /agent/run* request is submitted here instead of calling
+``run_agent_loop`` directly, so the gateway controls how many agent loops
+compete for provider slots at once:
+
+- Global concurrency (AGENT_MAX_CONCURRENT_RUNS) and optional per-source
+  limits (AGENT_SOURCE_LIMITS="ralph=1,n8n=1"). Runs over the limit wait in
+  a queue ordered by priority, then submission order.
+- Priority: "interactive" runs (dashboard/API) go ahead of "background" runs
+  (AGENT_BACKGROUND_SOURCES). When an interactive run is waiting and every
+  slot is taken, the most recently started background run is preempted: it
+  stops after its current step, is checkpointed, and is requeued to resume
+  from that checkpoint once a slot frees up. The caller waiting on it just
+  sees a longer run.
+- Budgets per run: total tokens (AGENT_RUN_TOKEN_BUDGET) and wall-clock
+  execution time (AGENT_RUN_TIME_BUDGET), checked at step boundaries, with a
+  hard cancel if a single step overruns the deadline by AGENT_RUN_TIME_GRACE.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import itertools
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from agent import (
+    MAX_STEPS,
+    AgentRequest,
+    AgentResponse,
+    ResumeState,
+    RunControl,
+    emit_event,
+    load_resume_state,
+    run_agent_loop,
+)
+from models import AgentSchedulerStats
+from prometheus_metrics import record_agent_scheduler_state, record_agent_queue_wait, record_agent_preemption
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_source_limits(value: str) -> dict[str, int]:
+    """Parse "ralph=1,n8n=2" into {"ralph": 1, "n8n": 2}."""
+    limits = {}
+    for part in value.split(","):
+        if "=" in part:
+            source, limit = part.split("=", 1)
+            limits[source.strip()] = int(limit)
+    return limits
+
+
+MAX_CONCURRENT_RUNS = int(os.getenv("AGENT_MAX_CONCURRENT_RUNS", "2"))
+MAX_QUEUED_RUNS = int(os.getenv("AGENT_MAX_QUEUED_RUNS", "100"))
+SOURCE_LIMITS = _parse_source_limits(os.getenv("AGENT_SOURCE_LIMITS", ""))
+BACKGROUND_SOURCES = {
+    s.strip() for s in os.getenv("AGENT_BACKGROUND_SOURCES", "n8n,ralph,cron").split(",") if s.strip()
+}
+RUN_TOKEN_BUDGET = int(os.getenv("AGENT_RUN_TOKEN_BUDGET", "0"))  # 0 = unlimited
+RUN_TIME_BUDGET = float(os.getenv("AGENT_RUN_TIME_BUDGET", "1800"))  # seconds
+RUN_TIME_GRACE = float(os.getenv("AGENT_RUN_TIME_GRACE", "60"))  # seconds
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+
+class AgentQueueFullError(RuntimeError):
+    """Raised when the agent run queue is at capacity."""
+
+
+class AgentRunConflictError(RuntimeError):
+    """Raised when a run is submitted while the same run is already queued or running."""
+
+
+class AgentTimeBudgetError(TimeoutError):
+    """Raised when a run is hard-cancelled for overrunning its time budget."""
+
+
+@dataclass(eq=False)
+class _Ticket:
+    """A submitted run, across queueing, execution and any preemptions."""
+    request: AgentRequest
+    call_llm: Callable
+    events: Optional[asyncio.Queue]
+    resume: Optional[ResumeState]
+    priority: int
+    seq: int
+    future: asyncio.Future
+    last_step: int
+    submitted_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    used_seconds: float = 0.0
+    preemptions: int = 0
+    control: Optional[RunControl] = None
+    task: Optional[asyncio.Task] = None
+
+    @property
+    def source(self) -> str:
+        return self.request.source or "unknown"
+
+    @property
+    def run_id(self) -> Optional[str]:
+        return self.resume.run_id if self.resume else None
+
+
+class AgentScheduler:
+    """Queues agent runs and enforces concurrency, priority and budgets."""
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_RUNS,
+        source_limits: Optional[dict[str, int]] = None,
+        background_sources: Optional[set[str]] = None,
+        max_queued: int = MAX_QUEUED_RUNS,
+        token_budget: int = RUN_TOKEN_BUDGET,
+        time_budget: float = RUN_TIME_BUDGET,
+        time_grace: float = RUN_TIME_GRACE,
+    ):
+        self.max_concurrent = max_concurrent
+        self.source_limits = SOURCE_LIMITS if source_limits is None else source_limits
+        self.background_sources = BACKGROUND_SOURCES if background_sources is None else background_sources
+        self.max_queued = max_queued
+        self.token_budget = token_budget
+        self.time_budget = time_budget
+        self.time_grace = time_grace
+
+        self._queue: list[_Ticket] = []
+        self._running: set[_Ticket] = set()
+        # Run ids claimed by a resume request that has not submitted yet
+        self._reserved: set[str] = set()
+        self._seq = itertools.count()
+        self.preemptions = 0
+
+    # -------------------------------------------------------------------------
+    # Submission
+    # -------------------------------------------------------------------------
+
+    def classify(self, request: AgentRequest) -> int:
+        if request.priority:
+            return PRIORITY_BACKGROUND if request.priority == "background" else PRIORITY_INTERACTIVE
+        return PRIORITY_BACKGROUND if request.source in self.background_sources else PRIORITY_INTERACTIVE
+
+    async def submit(
+        self,
+        request: AgentRequest,
+        call_llm: Callable,
+        events: Optional[asyncio.Queue] = None,
+        resume: Optional[ResumeState] = None,
+    ) -> AgentResponse:
+        """
+        Queue a run and wait for it to finish.
+
+        Cancelling the caller removes a queued run or cancels a running one.
+
+        Raises:
+            AgentQueueFullError: If the queue is at capacity
+            AgentRunConflictError: If the resumed run is already queued or running
+            AgentTimeBudgetError: If the run was cancelled for overrunning its time budget
+        """
+        if resume is not None and self._has_ticket(resume.run_id):
+            raise AgentRunConflictError(f"Agent run {resume.run_id} is already queued or running")
+        if len(self._queue) >= self.max_queued:
+            raise AgentQueueFullError(f"Agent run queue is full ({self.max_queued} runs waiting)")
+
+        ticket = _Ticket(
+            request=request,
+            call_llm=call_llm,
+            events=events,
+            resume=resume,
+            priority=self.classify(request),
+            seq=next(self._seq),
+            future=asyncio.get_running_loop().create_future(),
+            last_step=(resume.step_number if resume else 0) + min(request.max_steps, MAX_STEPS),
+        )
+        self._queue.append(ticket)
+        self._pump()
+
+        if ticket.started_at is None:
+            logger.info(
+                f"Agent run queued ({PRIORITY_NAMES[ticket.priority]}, source={ticket.source}, "
+                f"position {self._queue.index(ticket) + 1}/{len(self._queue)})"
+            )
+            emit_event(
+                events, "run_queued", run_id=ticket.run_id,
+                priority=PRIORITY_NAMES[ticket.priority], position=self._queue.index(ticket) + 1
+            )
+
+        try:
+            return await ticket.future
+        except asyncio.CancelledError:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+            elif ticket.task is not None and not ticket.task.done():
+                ticket.task.cancel()
+            self._pump()
+            raise
+
+    def is_queued(self, run_id: str) -> bool:
+        """Whether a (preempted) run is waiting in the queue."""
+        return any(ticket.run_id == run_id for ticket in self._queue)
+
+    def _has_ticket(self, run_id: str) -> bool:
+        return any(ticket.run_id == run_id for ticket in (*self._queue, *self._running))
+
+    def reserve(self, run_id: str) -> bool:
+        """
+        Claim a run id before submitting a resume of it.
+
+        Returns False if the run is already reserved, queued or running. The
+        caller must release() it once its submit() has returned or failed.
+        """
+        if run_id in self._reserved or self._has_ticket(run_id):
+            return False
+        self._reserved.add(run_id)
+        return True
+
+    def release(self, run_id: str) -> None:
+        self._reserved.discard(run_id)
+
+    # -------------------------------------------------------------------------
+    # Dispatch
+    # -------------------------------------------------------------------------
+
+    def _running_for(self, source: str) -> int:
+        return sum(1 for ticket in self._running if ticket.source == source)
+
+    def _source_has_room(self, ticket: _Ticket) -> bool:
+        limit = self.source_limits.get(ticket.source, 0)
+        return limit <= 0 or self._running_for(ticket.source) < limit
+
+    def _next_eligible(self) -> Optional[_Ticket]:
+        eligible = [ticket for ticket in self._queue if self._source_has_room(ticket)]
+        return min(eligible, key=lambda t: (t.priority, t.seq)) if eligible else None
+
+    def _pump(self) -> None:
+        """Start queued runs while slots are free, then preempt for waiting interactive runs."""
+        while len(self._running) < self.max_concurrent:
+            ticket = self._next_eligible()
+            if ticket is None:
+                break
+            self._queue.remove(ticket)
+            self._start(ticket)
+
+        waiting = sum(
+            1 for ticket in self._queue
+            if ticket.priority == PRIORITY_INTERACTIVE and self._source_has_room(ticket)
+        )
+        stopping = sum(1 for ticket in self._running if ticket.control.preempt_requested)
+        victims = sorted(
+            (
+                ticket for ticket in self._running
+                if ticket.priority == PRIORITY_BACKGROUND and not ticket.control.preempt_requested
+            ),
+            key=lambda t: t.started_at,
+            reverse=True,
+        )
+        for victim in victims[:max(waiting - stopping, 0)]:
+            logger.info(f"Preempting background agent run {victim.run_id or ''} (source={victim.source})")
+            victim.control.preempt_requested = True
+            victim.preemptions += 1
+            self.preemptions += 1
+            record_agent_preemption()
+
+        record_agent_scheduler_state(len(self._running), len(self._queue))
+
+    def _start(self, ticket: _Ticket) -> None:
+        now = time.monotonic()
+        if ticket.started_at is None:
+            record_agent_queue_wait(PRIORITY_NAMES[ticket.priority], now - ticket.submitted_at)
+        ticket.started_at = now
+
+        time_budget = ticket.request.time_budget_s or self.time_budget
+        remaining_s = max(time_budget - ticket.used_seconds, 0.0)
+        ticket.control = RunControl(
+            token_budget=ticket.request.token_budget or self.token_budget or None,
+            deadline=now + remaining_s,
+        )
+        ticket.task = asyncio.create_task(self._execute(ticket, remaining_s))
+        self._running.add(ticket)
+
+    async def _execute(self, ticket: _Ticket, remaining_s: float) -> None:
+        start_step = ticket.resume.step_number if ticket.resume else 0
+        request = ticket.request.model_copy(update={"max_steps": max(ticket.last_step - start_step, 1)})
+
+        result = None
+        error = None
+        run = asyncio.create_task(run_agent_loop(
+            request, ticket.call_llm, events=ticket.events,
+            resume=ticket.resume, control=ticket.control
+        ))
+        # Runs still inside a step past deadline + grace are cancelled with a
+        # reason, so they are recorded as over budget rather than cancelled
+        overrun = asyncio.get_running_loop().call_later(
+            remaining_s + self.time_grace, self._stop_overrun, ticket, run
+        )
+        try:
+            result = await run
+        except asyncio.CancelledError:
+            if ticket.control.cancel_reason == "time_budget_exceeded":
+                error = AgentTimeBudgetError(f"Agent run exceeded its time budget of {remaining_s:.0f}s")
+        except Exception as e:
+            error = e
+        finally:
+            overrun.cancel()
+            self._running.discard(ticket)
+            ticket.used_seconds += time.monotonic() - ticket.started_at
+
+        resume = None
+        if result is not None and result.terminated_reason == "preempted" and not ticket.future.done():
+            resume = load_resume_state(result.run_id)
+
+        if resume is not None:
+            ticket.resume = resume
+            self._queue.append(ticket)
+            emit_event(
+                ticket.events, "run_queued", run_id=result.run_id,
+                priority=PRIORITY_NAMES[ticket.priority], position=len(self._queue), preempted=True
+            )
+        elif not ticket.future.done():
+            if error is not None:
+                ticket.future.set_exception(error)
+            elif result is not None:
+                ticket.future.set_result(result)
+            else:
+                ticket.future.cancel()
+
+        self._pump()
+
+    @staticmethod
+    def _stop_overrun(ticket: _Ticket, run: asyncio.Task) -> None:
+        if not run.done():
+            logger.info(f"Agent run {ticket.run_id or ''} overran its time budget, cancelling")
+            ticket.control.cancel_reason = "time_budget_exceeded"
+            run.cancel()
+
+    # -------------------------------------------------------------------------
+    # Introspection
+    # -------------------------------------------------------------------------
+
+    def stats(self) -> AgentSchedulerStats:
+        now = time.monotonic()
+        running_by_source: dict[str, int] = {}
+        queued_by_source: dict[str, int] = {}
+        for ticket in self._running:
+            running_by_source[ticket.source] = running_by_source.get(ticket.source, 0) + 1
+        for ticket in self._queue:
+            queued_by_source[ticket.source] = queued_by_source.get(ticket.source, 0) + 1
+
+        return AgentSchedulerStats(
+            max_concurrent=self.max_concurrent,
+            running=len(self._running),
+            queued=len(self._queue),
+            queued_interactive=sum(1 for t in self._queue if t.priority == PRIORITY_INTERACTIVE),
+            running_by_source=running_by_source,
+            queued_by_source=queued_by_source,
+            source_limits=self.source_limits,
+            oldest_queued_s=round(max((now - t.submitted_at for t in self._queue), default=0.0), 1),
+            preemptions=self.preemptions,
+        )
+
+
+_scheduler: Optional[AgentScheduler] = None
+
+
+def get_agent_scheduler() -> AgentScheduler:
+    """Get the process-wide agent scheduler."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = AgentScheduler()
+    return _scheduler
@@ -1,3 +1,4 @@
+import os
 import json
 import logging
 import uuid
@@ -9,6 +10,99 @@ from models import AgentRunRecord, AgentStepRecord, AgentRunWithSteps, AgentRunS
 
 logger = logging.getLogger(__name__)
 
+# Buffered steps (and their checkpoints) are written in one transaction this often
+STEP_FLUSH_EVERY = int(os.getenv("AGENT_STEP_FLUSH_EVERY", "5"))
+
+_STEP_COLUMNS = (
+    "agent_run_id, step_number, action_type, tool_name, tool_args, tool_result, "
+    "thinking, error, started_at, duration_ms, prompt_tokens, completion_tokens"
+)
+
+
+def _bump_run_counters(
+    cursor,
+    source: Optional[str],
+    status: str,
+    runs: int = 0,
+    steps: int = 0,
+    duration_ms: Optional[int] = None,
+    sign: int = 1
+) -> None:
+    """Add (sign=1) or remove (sign=-1) a run's contribution to agent_run_counters."""
+    cursor.execute("""
+        INSERT INTO agent_run_counters (source, status, runs, steps_sum, duration_sum, duration_count)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(source, status) DO UPDATE SET
+            runs = runs + excluded.runs,
+            steps_sum = steps_sum + excluded.steps_sum,
+            duration_sum = duration_sum + excluded.duration_sum,
+            duration_count = duration_count + excluded.duration_count
+    """, (
+        source or "",
+        status,
+        sign * runs,
+        sign * steps,
+        sign * (duration_ms or 0),
+        sign * (1 if duration_ms is not None else 0)
+    ))
+
+
+def _move_run_status(cursor, agent_run_id: str, new_status: str, new_duration_ms: Optional[int] = None) -> None:
+    """Move a run between status buckets in agent_run_counters (call before updating agent_runs)."""
+    cursor.execute(
+        "SELECT source, status, total_steps, duration_ms FROM agent_runs WHERE id = ?",
+        (agent_run_id,)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return
+    _bump_run_counters(cursor, row["source"], row["status"], 1, row["total_steps"], row["duration_ms"], sign=-1)
+    _bump_run_counters(cursor, row["source"], new_status, 1, row["total_steps"], new_duration_ms)
+
+
+def _insert_steps(cursor, agent_run_id: str, rows: List[tuple]) -> None:
+    """Insert step rows and bump the run's step count (and its counters bucket) once."""
+    cursor.executemany(
+        f"INSERT INTO agent_steps ({_STEP_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    cursor.execute("""
+        UPDATE agent_runs SET total_steps = total_steps + ? WHERE id = ?
+    """, (len(rows), agent_run_id))
+    cursor.execute("""
+        UPDATE agent_run_counters SET steps_sum = steps_sum + ?
+        WHERE (source, status) = (SELECT COALESCE(source, ''), status FROM agent_runs WHERE id = ?)
+    """, (len(rows), agent_run_id))
+
+
+def _step_row(
+    agent_run_id: str,
+    step_number: int,
+    action_type: str,
+    tool_name: Optional[str] = None,
+    tool_args: Optional[Dict[str, Any]] = None,
+    tool_result: Optional[str] = None,
+    thinking: Optional[str] = None,
+    error: Optional[str] = None,
+    duration_ms: Optional[int] = None,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None
+) -> tuple:
+    return (
+        agent_run_id,
+        step_number,
+        action_type,
+        tool_name,
+        json.dumps(tool_args) if tool_args else None,
+        tool_result,
+        thinking,
+        error,
+        datetime.utcnow().isoformat() + "Z",
+        duration_ms,
+        prompt_tokens,
+        completion_tokens
+    )
+
 
 def create_agent_run(
     task: str,
@@ -40,56 +134,85 @@ def create_agent_run(
             triggered_by,
             json.dumps(metadata) if metadata else None
         ))
+        _bump_run_counters(cursor, source, AgentRunStatus.RUNNING.value, runs=1)
         conn.commit()
     
     logger.info(f"Created agent run {run_id}: {task[:50]}...")
     return run_id
 
 
-def add_agent_step(
-    agent_run_id: str,
-    step_number: int,
-    action_type: str,
-    tool_name: Optional[str] = None,
-    tool_args: Optional[Dict[str, Any]] = None,
-    tool_result: Optional[str] = None,
-    thinking: Optional[str] = None,
-    error: Optional[str] = None,
-    duration_ms: Optional[int] = None,
-    prompt_tokens: Optional[int] = None,
-    completion_tokens: Optional[int] = None
-) -> int:
-    now = datetime.utcnow()
+class AgentStepBuffer:
+    """
+    Buffers an agent run's step rows and checkpoints for batched writes.
     
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO agent_steps 
-            (agent_run_id, step_number, action_type, tool_name, tool_args, tool_result, thinking, error, started_at, duration_ms, prompt_tokens, completion_tokens)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            agent_run_id,
+    This is the only way steps and checkpoints are written. Rows are
+    written in one transaction by ``flush()``, which ``checkpoint()`` calls
+    every ``flush_every`` steps and ``complete_agent_run()`` calls as part of
+    its own transaction. A gateway crash loses at most the unflushed steps;
+    since their checkpoints are lost with them, resume repeats those steps
+    instead of skipping them.
+    """
+    
+    def __init__(self, agent_run_id: str, flush_every: int = STEP_FLUSH_EVERY):
+        self.agent_run_id = agent_run_id
+        self.flush_every = max(flush_every, 1)
+        self._steps: List[tuple] = []
+        self._checkpoints: List[tuple] = []
+        self._pending_step_numbers: set[int] = set()
+    
+    def __len__(self) -> int:
+        return len(self._steps)
+    
+    def add(self, step_number: int, action_type: str, **fields) -> None:
+        self._steps.append(_step_row(self.agent_run_id, step_number, action_type, **fields))
+        self._pending_step_numbers.add(step_number)
+    
+    def checkpoint(
+        self,
+        step_number: int,
+        messages: List[Dict[str, Any]],
+        steps: List[Dict[str, Any]],
+        state: Dict[str, Any]
+    ) -> None:
+        """
+        Queue the messages and steps a step added, plus loop state after it,
+        and flush if enough steps are pending.
+        
+        Checkpoints are deltas: replaying checkpoints 0..N in order rebuilds
+        the run's context as of step N.
+        """
+        self._checkpoints.append((
+            self.agent_run_id,
             step_number,
-            action_type,
-            tool_name,
-            json.dumps(tool_args) if tool_args else None,
-            tool_result,
-            thinking,
-            error,
-            now.isoformat() + "Z",
-            duration_ms,
-            prompt_tokens,
-            completion_tokens
+            json.dumps(messages),
+            json.dumps(steps),
+            json.dumps(state),
+            datetime.utcnow().isoformat() + "Z"
         ))
-        step_id = cursor.lastrowid or 0
-        
-        cursor.execute("""
-            UPDATE agent_runs SET total_steps = total_steps + 1 WHERE id = ?
-        """, (agent_run_id,))
-        
-        conn.commit()
+        if len(self._pending_step_numbers) >= self.flush_every:
+            self.flush()
+    
+    def write(self, cursor) -> None:
+        """Write pending rows with an existing cursor (caller commits)."""
+        if self._steps:
+            _insert_steps(cursor, self.agent_run_id, self._steps)
+        if self._checkpoints:
+            cursor.executemany("""
+                INSERT OR REPLACE INTO agent_checkpoints
+                (agent_run_id, step_number, messages, steps, state, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, self._checkpoints)
+        self._steps = []
+        self._checkpoints = []
+        self._pending_step_numbers = set()
     
-    return step_id
+    def flush(self) -> None:
+        """Write pending rows in one transaction."""
+        if not self._steps and not self._checkpoints:
+            return
+        with get_db_connection() as conn:
+            self.write(conn.cursor())
+            conn.commit()
 
 
 def complete_agent_run(
@@ -98,13 +221,18 @@ def complete_agent_run(
     final_answer: Optional[str] = None,
     model_used: Optional[str] = None,
     backend: Optional[str] = None,
-    error: Optional[str] = None
+    error: Optional[str] = None,
+    step_buffer: Optional[AgentStepBuffer] = None
 ) -> None:
+    """Finish a run, writing any buffered steps in the same transaction."""
     now = datetime.utcnow()
     
     with get_db_connection() as conn:
         cursor = conn.cursor()
         
+        if step_buffer is not None:
+            step_buffer.write(cursor)
+        
         cursor.execute("SELECT started_at FROM agent_runs WHERE id = ?", (agent_run_id,))
         row = cursor.fetchone()
         if row:
@@ -115,6 +243,7 @@ def complete_agent_run(
         else:
             duration_ms = None
         
+        _move_run_status(cursor, agent_run_id, status.value, duration_ms)
         cursor.execute("""
             UPDATE agent_runs 
             SET status = ?, final_answer = ?, model_used = ?, backend = ?, 
@@ -135,6 +264,119 @@ def complete_agent_run(
     logger.info(f"Completed agent run {agent_run_id}: {status.value}")
 
 
+def reopen_agent_run(agent_run_id: str, model_requested: Optional[str] = None) -> None:
+    """Mark a stopped run as running again so it can be resumed."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        _move_run_status(cursor, agent_run_id, AgentRunStatus.RUNNING.value)
+        cursor.execute("""
+            UPDATE agent_runs
+            SET status = ?, completed_at = NULL, duration_ms = NULL, error = NULL,
+                model_requested = COALESCE(?, model_requested)
+            WHERE id = ?
+        """, (AgentRunStatus.RUNNING.value, model_requested, agent_run_id))
+        conn.commit()
+    
+    logger.info(f"Reopened agent run {agent_run_id}")
+
+
+def get_agent_checkpoints(
+    agent_run_id: str,
+    up_to_step: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Get a run's checkpoints in step order, optionally only through ``up_to_step``."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        query = "SELECT * FROM agent_checkpoints WHERE agent_run_id = ?"
+        params: list = [agent_run_id]
+        if up_to_step is not None:
+            query += " AND step_number <= ?"
+            params.append(up_to_step)
+        query += " ORDER BY step_number"
+        
+        cursor.execute(query, params)
+        return [
+            {
+                "step_number": row["step_number"],
+                "messages": json.loads(row["messages"]),
+                "steps": json.loads(row["steps"]),
+                "state": json.loads(row["state"]),
+            }
+            for row in cursor.fetchall()
+        ]
+
+
+def fork_agent_run(
+    agent_run_id: str,
+    step_number: int,
+    model_requested: Optional[str] = None,
+    triggered_by: Optional[str] = None
+) -> Optional[str]:
+    """
+    Create a new run that shares ``agent_run_id``'s history through ``step_number``.
+    
+    Checkpoints and step records up to that step are copied, so the fork can
+    be resumed (e.g. with a different model) without repeating those LLM calls.
+    Returns the new run ID, or None if the source run does not exist.
+    """
+    new_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT * FROM agent_runs WHERE id = ?", (agent_run_id,))
+        source = cursor.fetchone()
+        if not source:
+            return None
+        
+        metadata = json.loads(source["metadata"]) if source["metadata"] else {}
+        metadata.update({"forked_from": agent_run_id, "forked_at_step": step_number})
+        
+        cursor.execute("""
+            INSERT INTO agent_runs 
+            (id, task, system_prompt, working_directory, model_requested, status, started_at, source, triggered_by, metadata)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            new_id,
+            source["task"],
+            source["system_prompt"],
+            source["working_directory"],
+            model_requested or source["model_requested"],
+            AgentRunStatus.RUNNING.value,
+            now.isoformat() + "Z",
+            source["source"],
+            triggered_by or source["triggered_by"],
+            json.dumps(metadata)
+        ))
+        
+        cursor.execute("""
+            INSERT INTO agent_checkpoints (agent_run_id, step_number, messages, steps, state, created_at)
+            SELECT ?, step_number, messages, steps, state, created_at
+            FROM agent_checkpoints WHERE agent_run_id = ? AND step_number <= ?
+        """, (new_id, agent_run_id, step_number))
+        
+        cursor.execute("""
+            INSERT INTO agent_steps 
+            (agent_run_id, step_number, action_type, tool_name, tool_args, tool_result, thinking, error, started_at, duration_ms, prompt_tokens, completion_tokens)
+            SELECT ?, step_number, action_type, tool_name, tool_args, tool_result, thinking, error, started_at, duration_ms, prompt_tokens, completion_tokens
+            FROM agent_steps WHERE agent_run_id = ? AND step_number <= ?
+            ORDER BY id
+        """, (new_id, agent_run_id, step_number))
+        
+        copied_steps = cursor.rowcount
+        cursor.execute("""
+            UPDATE agent_runs SET total_steps = ? WHERE id = ?
+        """, (copied_steps, new_id))
+        _bump_run_counters(cursor, source["source"], AgentRunStatus.RUNNING.value, runs=1, steps=copied_steps)
+        
+        conn.commit()
+    
+    logger.info(f"Forked agent run {agent_run_id} at step {step_number} -> {new_id}")
+    return new_id
+
+
 def get_agent_run(agent_run_id: str) -> Optional[AgentRunWithSteps]:
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -200,40 +442,40 @@ def list_agent_runs(
 
 
 def get_agent_runs_stats() -> AgentRunsStats:
+    """Aggregate run statistics from the incrementally maintained agent_run_counters table."""
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM agent_runs")
-        total_runs = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM agent_runs WHERE status = 'completed'")
-        completed = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM agent_runs WHERE status = 'failed'")
-        failed = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM agent_runs WHERE status = 'running'")
-        running = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT AVG(total_steps) FROM agent_runs WHERE status != 'running'")
-        avg_steps = cursor.fetchone()[0] or 0
-        
-        cursor.execute("SELECT AVG(duration_ms) FROM agent_runs WHERE duration_ms IS NOT NULL")
-        avg_duration = cursor.fetchone()[0] or 0
-        
-        cursor.execute("SELECT source, COUNT(*) FROM agent_runs GROUP BY source")
-        by_source = {row[0] or "unknown": row[1] for row in cursor.fetchall()}
-        
-        cursor.execute("SELECT status, COUNT(*) FROM agent_runs GROUP BY status")
-        by_status = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        return AgentRunsStats(
-            total_runs=total_runs,
-            completed=completed,
-            failed=failed,
-            running=running,
-            avg_steps=round(avg_steps, 1),
-            avg_duration_ms=round(avg_duration, 0),
-            by_source=by_source,
-            by_status=by_status
-        )
+        cursor.execute("""
+            SELECT source, status, runs, steps_sum, duration_sum, duration_count
+            FROM agent_run_counters WHERE runs > 0
+        """)
+        rows = cursor.fetchall()
+    
+    by_source: Dict[str, int] = {}
+    by_status: Dict[str, int] = {}
+    finished_runs = finished_steps = 0
+    duration_sum = duration_count = 0
+    
+    for row in rows:
+        source = row["source"] or "unknown"
+        by_source[source] = by_source.get(source, 0) + row["runs"]
+        by_status[row["status"]] = by_status.get(row["status"], 0) + row["runs"]
+        if row["status"] != AgentRunStatus.RUNNING.value:
+            finished_runs += row["runs"]
+            finished_steps += row["steps_sum"]
+        duration_sum += row["duration_sum"]
+        duration_count += row["duration_count"]
+    
+    avg_steps = finished_steps / finished_runs if finished_runs else 0
+    avg_duration = duration_sum / duration_count if duration_count else 0
+    
+    return AgentRunsStats(
+        total_runs=sum(by_status.values()),
+        completed=by_status.get(AgentRunStatus.COMPLETED.value, 0),
+        failed=by_status.get(AgentRunStatus.FAILED.value, 0),
+        running=by_status.get(AgentRunStatus.RUNNING.value, 0),
+        avg_steps=round(avg_steps, 1),
+        avg_duration_ms=round(avg_duration, 0),
+        by_source=by_source,
+        by_status=by_status
+    )
@@ -0,0 +1,34 @@
+"""Add compaction_summaries table
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '007'
+down_revision: Union[str, None] = '006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create table holding per-conversation compaction summaries and watermarks."""
+    op.create_table(
+        'compaction_summaries',
+        sa.Column('conversation_id', sa.Text(), primary_key=True),
+        sa.Column('summary', sa.Text(), nullable=False),
+        sa.Column('watermark', sa.Integer(), nullable=False),
+        sa.Column('fingerprint', sa.Text(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Drop compaction_summaries table."""
+    op.drop_table('compaction_summaries')
@@ -0,0 +1,35 @@
+"""Add agent_checkpoints table
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '008'
+down_revision: Union[str, None] = '007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create table holding per-step agent run checkpoints for resume/fork."""
+    op.create_table(
+        'agent_checkpoints',
+        sa.Column('agent_run_id', sa.Text(), sa.ForeignKey('agent_runs.id'), primary_key=True),
+        sa.Column('step_number', sa.Integer(), primary_key=True),
+        sa.Column('messages', sa.Text(), nullable=False),
+        sa.Column('steps', sa.Text(), nullable=False),
+        sa.Column('state', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Drop agent_checkpoints table."""
+    op.drop_table('agent_checkpoints')
@@ -0,0 +1,45 @@
+"""Add agent_run_counters table and agent_runs listing indexes
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '009'
+down_revision: Union[str, None] = '008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create incrementally maintained run stats, backfilled from agent_runs."""
+    op.create_table(
+        'agent_run_counters',
+        sa.Column('source', sa.Text(), primary_key=True),
+        sa.Column('status', sa.Text(), primary_key=True),
+        sa.Column('runs', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('steps_sum', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('duration_sum', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('duration_count', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.execute("""
+        INSERT INTO agent_run_counters (source, status, runs, steps_sum, duration_sum, duration_count)
+        SELECT COALESCE(source, ''), status, COUNT(*), COALESCE(SUM(total_steps), 0),
+               COALESCE(SUM(duration_ms), 0), COUNT(duration_ms)
+        FROM agent_runs GROUP BY COALESCE(source, ''), status
+    """)
+    op.create_index('idx_agent_runs_status_started', 'agent_runs', ['status', 'started_at'])
+    op.create_index('idx_agent_runs_source_started', 'agent_runs', ['source', 'started_at'])
+
+
+def downgrade() -> None:
+    """Drop agent_run_counters table and listing indexes."""
+    op.drop_index('idx_agent_runs_source_started', table_name='agent_runs')
+    op.drop_index('idx_agent_runs_status_started', table_name='agent_runs')
+    op.drop_table('agent_run_counters')
@@ -4,11 +4,22 @@ Rolling conversation compaction for context window management.
 When a conversation approaches the model's context limit, older messages
 are summarized into a compact form while preserving recent context.
 Full uncompacted history is always preserved in the router's SQLite DB.
+
+Summaries are cached per conversation together with a watermark (the number
+of non-system messages already folded into the summary), so each compaction
+only summarizes the turns that aged out since the previous one and chains
+from the stored summary instead of re-reading the whole history.
 """
+import hashlib
+import json
 import logging
 import tiktoken
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from typing import Optional
 
+from database import get_db_connection
+
 logger = logging.getLogger(__name__)
 
 # Lazy-loaded tokenizer
@@ -135,3 +146,243 @@ def rebuild_messages_with_summary(
     result.extend(non_system)
 
     return result
+
+
+# ============================================================================
+# Incremental summary store
+# ============================================================================
+
+def _message_fingerprint(message: dict) -> str:
+    """Stable hash of a message's role and content, used to detect edited history."""
+    content = message.get("content", "") or ""
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True)
+    digest = hashlib.sha256(f"{message.get('role', '')}:{content}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+@dataclass
+class StoredSummary:
+    """A cached compaction summary and the history position it covers."""
+    summary: str
+    watermark: int
+    fingerprint: str
+
+
+@dataclass
+class CompactionPlan:
+    """
+    Result of planning a compaction against the summary store.
+
+    ``messages_to_compact`` only holds turns that aged out since the stored
+    watermark. When it is empty the stored summary already covers everything
+    and ``messages`` is ready to send without calling the model.
+    """
+    conversation_id: str
+    messages_to_compact: list[dict]
+    messages_to_keep: list[dict]
+    prompt: str
+    previous_summary: Optional[str]
+    watermark: int
+    fingerprint: str
+    cache_hit: bool
+    messages: list[dict] = field(default_factory=list)
+
+
+class CompactionSummaryStore:
+    """
+    Per-conversation compaction summaries keyed by message-index watermark.
+
+    Summaries are held in memory and persisted to the ``compaction_summaries``
+    table so they survive restarts. A stored summary is only reused while the
+    message at its watermark still matches the recorded fingerprint; edited or
+    truncated histories fall back to a full compaction.
+    """
+
+    def __init__(self, persist: bool = True):
+        self.persist = persist
+        self._cache: dict[str, StoredSummary] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.messages_summarized = 0
+
+    def get(self, conversation_id: str) -> Optional[StoredSummary]:
+        """Look up the stored summary for a conversation (memory first, then DB)."""
+        stored = self._cache.get(conversation_id)
+        if stored is not None or not self.persist:
+            return stored
+
+        try:
+            with get_db_connection() as conn:
+                row = conn.execute(
+                    "SELECT summary, watermark, fingerprint FROM compaction_summaries "
+                    "WHERE conversation_id = ?",
+                    (conversation_id,),
+                ).fetchone()
+        except Exception as e:
+            logger.warning(f"Failed to load compaction summary for {conversation_id}: {e}")
+            return None
+
+        if row:
+            stored = StoredSummary(
+                summary=row["summary"],
+                watermark=row["watermark"],
+                fingerprint=row["fingerprint"],
+            )
+            self._cache[conversation_id] = stored
+        return stored
+
+    def save(self, conversation_id: str, stored: StoredSummary) -> None:
+        """Store a summary, replacing any previous one for the conversation."""
+        self._cache[conversation_id] = stored
+        if not self.persist:
+            return
+
+        try:
+            with get_db_connection() as conn:
+                conn.execute(
+                    """
+                    INSERT INTO compaction_summaries
+                    (conversation_id, summary, watermark, fingerprint, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(conversation_id) DO UPDATE SET
+                        summary = excluded.summary,
+                        watermark = excluded.watermark,
+                        fingerprint = excluded.fingerprint,
+                        updated_at = excluded.updated_at
+                    """,
+                    (
+                        conversation_id,
+                        stored.summary,
+                        stored.watermark,
+                        stored.fingerprint,
+                        datetime.now(timezone.utc).isoformat(),
+                    ),
+                )
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"Failed to persist compaction summary for {conversation_id}: {e}")
+
+    def invalidate(self, conversation_id: str) -> None:
+        """Drop the stored summary for a conversation."""
+        self._cache.pop(conversation_id, None)
+        self.invalidations += 1
+        if not self.persist:
+            return
+
+        try:
+            with get_db_connection() as conn:
+                conn.execute(
+                    "DELETE FROM compaction_summaries WHERE conversation_id = ?",
+                    (conversation_id,),
+                )
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"Failed to delete compaction summary for {conversation_id}: {e}")
+
+    def _valid_summary(self, conversation_id: str, non_system: list[dict]) -> Optional[StoredSummary]:
+        stored = self.get(conversation_id)
+        if stored is None:
+            return None
+
+        if (
+            stored.watermark > len(non_system)
+            or stored.watermark <= 0
+            or _message_fingerprint(non_system[stored.watermark - 1]) != stored.fingerprint
+        ):
+            logger.info(f"Compaction summary for {conversation_id} no longer matches history, discarding")
+            self.invalidate(conversation_id)
+            return None
+
+        return stored
+
+    def plan(
+        self,
+        conversation_id: str,
+        messages: list[dict],
+        keep_recent: int = 6,
+    ) -> CompactionPlan:
+        """
+        Plan a compaction that only summarizes turns aged out since the last one.
+
+        The caller should:
+        1. If ``plan.prompt`` is non-empty, send it to the model to get a summary
+           and pass that summary to ``commit()``
+        2. Otherwise use ``plan.messages`` directly (cache hit, no model call)
+        """
+        system_messages = [m for m in messages if m.get("role") == "system"]
+        non_system = [m for m in messages if m.get("role") != "system"]
+
+        stored = self._valid_summary(conversation_id, non_system)
+        cutoff = max(len(non_system) - keep_recent, 0)
+        watermark = stored.watermark if stored else 0
+        previous_summary = stored.summary if stored else None
+
+        if cutoff <= watermark:
+            # Everything that aged out is already in the stored summary
+            kept = non_system[watermark:]
+            if stored:
+                self.hits += 1
+                rebuilt = rebuild_messages_with_summary(stored.summary, system_messages + kept)
+            else:
+                rebuilt = list(messages)
+            return CompactionPlan(
+                conversation_id=conversation_id,
+                messages_to_compact=[],
+                messages_to_keep=system_messages + kept,
+                prompt="",
+                previous_summary=previous_summary,
+                watermark=watermark,
+                fingerprint=stored.fingerprint if stored else "",
+                cache_hit=stored is not None,
+                messages=rebuilt,
+            )
+
+        self.misses += 1
+        to_compact = non_system[watermark:cutoff]
+        to_keep = non_system[cutoff:]
+
+        return CompactionPlan(
+            conversation_id=conversation_id,
+            messages_to_compact=to_compact,
+            messages_to_keep=system_messages + to_keep,
+            prompt=build_compaction_prompt(to_compact, previous_summary),
+            previous_summary=previous_summary,
+            watermark=cutoff,
+            fingerprint=_message_fingerprint(non_system[cutoff - 1]),
+            cache_hit=False,
+        )
+
+    def commit(self, plan: CompactionPlan, summary: str) -> list[dict]:
+        """Store the model's summary for a planned compaction and rebuild the messages."""
+        self.save(
+            plan.conversation_id,
+            StoredSummary(summary=summary, watermark=plan.watermark, fingerprint=plan.fingerprint),
+        )
+        self.messages_summarized += len(plan.messages_to_compact)
+        plan.messages = rebuild_messages_with_summary(summary, plan.messages_to_keep)
+        return plan.messages
+
+    def stats(self) -> dict:
+        """Hit/miss counters for the summary store."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "messages_summarized": self.messages_summarized,
+            "cached_conversations": len(self._cache),
+        }
+
+
+_summary_store: Optional[CompactionSummaryStore] = None
+
+
+def get_summary_store() -> CompactionSummaryStore:
+    """Get the process-wide compaction summary store."""
+    global _summary_store
+    if _summary_store is None:
+        _summary_store = CompactionSummaryStore()
+    return _summary_store
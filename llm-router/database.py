@@ -98,13 +98,6 @@ def init_database():
             logger.info("Migrating: Adding image_refs column to messages table")
             cursor.execute("ALTER TABLE messages ADD COLUMN image_refs TEXT")
 
-        # Migration: Add cost_usd column to metrics table
-        try:
-            cursor.execute("SELECT cost_usd FROM metrics LIMIT 1")
-        except sqlite3.OperationalError:
-            logger.info("Migrating: Adding cost_usd column to metrics table")
-            cursor.execute("ALTER TABLE metrics ADD COLUMN cost_usd REAL")
-
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_messages_conversation
             ON messages(conversation_id)
@@ -141,6 +134,13 @@ def init_database():
             )
         """)
 
+        # Migration: Add cost_usd column to metrics table
+        try:
+            cursor.execute("SELECT cost_usd FROM metrics LIMIT 1")
+        except sqlite3.OperationalError:
+            logger.info("Migrating: Adding cost_usd column to metrics table")
+            cursor.execute("ALTER TABLE metrics ADD COLUMN cost_usd REAL")
+
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_metrics_date
             ON metrics(date)
@@ -240,6 +240,29 @@ def init_database():
             ON agent_runs(source)
         """)
 
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_agent_runs_status_started
+            ON agent_runs(status, started_at)
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_agent_runs_source_started
+            ON agent_runs(source, started_at)
+        """)
+
+        # Create agent_run_counters table: incrementally maintained run stats
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS agent_run_counters (
+                source TEXT NOT NULL,
+                status TEXT NOT NULL,
+                runs INTEGER NOT NULL DEFAULT 0,
+                steps_sum INTEGER NOT NULL DEFAULT 0,
+                duration_sum INTEGER NOT NULL DEFAULT 0,
+                duration_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (source, status)
+            )
+        """)
+
         # Create agent_steps table for tracking individual steps
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS agent_steps (
@@ -318,6 +341,31 @@ def init_database():
             ON daily_summaries(date)
         """)
 
+        # Create compaction_summaries table for incremental conversation compaction
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS compaction_summaries (
+                conversation_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                watermark INTEGER NOT NULL,
+                fingerprint TEXT NOT NULL,
+                updated_at DATETIME NOT NULL
+            )
+        """)
+
+        # Create agent_checkpoints table for resumable agent runs
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS agent_checkpoints (
+                agent_run_id TEXT NOT NULL,
+                step_number INTEGER NOT NULL,
+                messages TEXT NOT NULL,
+                steps TEXT NOT NULL,
+                state TEXT NOT NULL,
+                created_at DATETIME NOT NULL,
+                PRIMARY KEY (agent_run_id, step_number),
+                FOREIGN KEY (agent_run_id) REFERENCES agent_runs(id)
+            )
+        """)
+
         # Migration: Add token columns to agent_steps table
         try:
             cursor.execute("SELECT prompt_tokens FROM agent_steps LIMIT 1")
@@ -326,6 +374,25 @@ def init_database():
             cursor.execute("ALTER TABLE agent_steps ADD COLUMN prompt_tokens INTEGER")
             cursor.execute("ALTER TABLE agent_steps ADD COLUMN completion_tokens INTEGER")
 
+        # Migration: Backfill agent_run_counters from existing agent runs
+        cursor.execute("SELECT COUNT(*) FROM agent_run_counters")
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("""
+                INSERT INTO agent_run_counters (source, status, runs, steps_sum, duration_sum, duration_count)
+                SELECT COALESCE(source, ''), status, COUNT(*), COALESCE(SUM(total_steps), 0),
+                       COALESCE(SUM(duration_ms), 0), COUNT(duration_ms)
+                FROM agent_runs GROUP BY COALESCE(source, ''), status
+            """)
+            if cursor.rowcount > 0:
+                logger.info("Migrating: Backfilled agent_run_counters from agent_runs")
+
+        # Migration: Add system_prompt column to agent_runs table
+        try:
+            cursor.execute("SELECT system_prompt FROM agent_runs LIMIT 1")
+        except sqlite3.OperationalError:
+            logger.info("Migrating: Adding system_prompt column to agent_runs table")
+            cursor.execute("ALTER TABLE agent_runs ADD COLUMN system_prompt TEXT")
+
         conn.commit()
         logger.info("Database schema created successfully")
 
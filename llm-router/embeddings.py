@@ -0,0 +1,230 @@
+"""Micro-batching and caching for /v1/embeddings.
+
+Concurrent embedding requests are collected for EMBEDDINGS_BATCH_WINDOW_MS
+(or until EMBEDDINGS_MAX_BATCH inputs are waiting) and sent to the embeddings
+server as one batched ``input`` array over a shared connection; the results
+are split back to each caller by index.
+
+Vectors are cached by a hash of (model, dimensions, text) in an LRU of
+EMBEDDINGS_CACHE_SIZE entries, stored as float32 arrays to keep the cache
+small. Computed vectors are returned with the upstream floats unchanged;
+only cache hits are served from the float32 copy (the precision the
+embeddings server computes in, and what base64 encoding carries anyway).
+An input that is already being computed for another request waits for that
+result instead of being sent again. If a batched call fails, its inputs are
+retried one per call, so one rejected input only fails the requests that
+asked for it.
+"""
+
+import os
+import base64
+import struct
+import asyncio
+import hashlib
+import logging
+from array import array
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import httpx
+
+from prometheus_metrics import record_embeddings_batch, record_embeddings_inputs
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_MODEL = os.getenv("EMBEDDINGS_MODEL", "bge-base-en")
+EMBEDDINGS_BATCH_WINDOW_MS = float(os.getenv("EMBEDDINGS_BATCH_WINDOW_MS", "5"))
+EMBEDDINGS_MAX_BATCH = int(os.getenv("EMBEDDINGS_MAX_BATCH", "64"))
+EMBEDDINGS_CACHE_SIZE = int(os.getenv("EMBEDDINGS_CACHE_SIZE", "20000"))  # 0 = disabled
+
+# (vector, estimated prompt tokens); vectors are upstream float lists or
+# float32 arrays from the cache
+_Result = tuple[Sequence[float], int]
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embedding inputs into batched upstream calls."""
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        model: str = EMBEDDINGS_MODEL,
+        window_ms: float = EMBEDDINGS_BATCH_WINDOW_MS,
+        max_batch: int = EMBEDDINGS_MAX_BATCH,
+        cache_size: int = EMBEDDINGS_CACHE_SIZE,
+        timeout: float = 60.0,
+    ):
+        self.endpoint_url = endpoint_url
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self.timeout = timeout
+
+        self._cache: OrderedDict[str, _Result] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._pending: dict[Optional[int], list[tuple[str, str, asyncio.Future]]] = {}
+        self._timers: dict[Optional[int], asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # -------------------------------------------------------------------------
+    # OpenAI-compatible entry point
+    # -------------------------------------------------------------------------
+
+    async def create_embeddings(self, body: dict) -> dict:
+        """Handle an OpenAI embeddings request body."""
+        inputs = body.get("input")
+        if isinstance(inputs, str):
+            texts = [inputs]
+        elif isinstance(inputs, list) and inputs and all(isinstance(item, str) for item in inputs):
+            texts = inputs
+        else:
+            # Token-id inputs are rare; send them through unbatched
+            return await self._forward(body)
+
+        results = await self.embed(texts, body.get("dimensions"))
+        tokens = sum(result[1] for result in results)
+        as_base64 = body.get("encoding_format") == "base64"
+        return {
+            "object": "list",
+            "data": [
+                {
+                    "object": "embedding",
+                    "index": i,
+                    "embedding": _encode_base64(vector) if as_base64 else _as_list(vector),
+                }
+                for i, (vector, _) in enumerate(results)
+            ],
+            "model": self.model,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    async def _forward(self, body: dict) -> dict:
+        resp = await self._get_client().post(self.endpoint_url, json={**body, "model": self.model})
+        resp.raise_for_status()
+        return resp.json()
+
+    # -------------------------------------------------------------------------
+    # Batching
+    # -------------------------------------------------------------------------
+
+    def _key(self, text: str, dimensions: Optional[int]) -> str:
+        return hashlib.sha256(f"{self.model}\0{dimensions}\0{text}".encode()).hexdigest()
+
+    async def embed(self, texts: list[str], dimensions: Optional[int] = None) -> list[_Result]:
+        """Embed texts via cache, in-flight requests, or the next batch."""
+        loop = asyncio.get_running_loop()
+        futures = []
+        hits = coalesced = 0
+        for text in texts:
+            key = self._key(text, dimensions)
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                future = loop.create_future()
+                future.set_result(cached)
+                hits += 1
+            elif key in self._inflight:
+                future = self._inflight[key]
+                coalesced += 1
+            else:
+                future = loop.create_future()
+                self._inflight[key] = future
+                self._enqueue(dimensions, text, key, future)
+            futures.append(future)
+
+        record_embeddings_inputs("cache_hit", hits)
+        record_embeddings_inputs("coalesced", coalesced)
+        record_embeddings_inputs("computed", len(texts) - hits - coalesced)
+
+        # Shield: other requests may be waiting on the same futures
+        return list(await asyncio.gather(*(asyncio.shield(f) for f in futures)))
+
+    def _enqueue(self, dimensions: Optional[int], text: str, key: str, future: asyncio.Future) -> None:
+        batch = self._pending.setdefault(dimensions, [])
+        batch.append((text, key, future))
+        if len(batch) >= self.max_batch:
+            self._flush(dimensions)
+        elif len(batch) == 1:
+            self._timers[dimensions] = asyncio.get_running_loop().call_later(
+                self.window, self._flush, dimensions
+            )
+
+    def _flush(self, dimensions: Optional[int]) -> None:
+        timer = self._timers.pop(dimensions, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(dimensions, [])
+        if batch:
+            task = asyncio.create_task(self._send(dimensions, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, dimensions: Optional[int], batch: list[tuple[str, str, asyncio.Future]]) -> None:
+        record_embeddings_batch(len(batch))
+        try:
+            await self._post(dimensions, batch)
+        except Exception as e:
+            if len(batch) == 1:
+                logger.warning(f"Embeddings input failed: {e}")
+                _, _, future = batch[0]
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                # Other callers' inputs shouldn't fail because one input was rejected
+                logger.warning(f"Embeddings batch of {len(batch)} failed, retrying inputs one by one: {e}")
+                await asyncio.gather(*(self._send(dimensions, [entry]) for entry in batch))
+        finally:
+            for _, key, _ in batch:
+                self._inflight.pop(key, None)
+
+    async def _post(self, dimensions: Optional[int], batch: list[tuple[str, str, asyncio.Future]]) -> None:
+        """Send one batched upstream call and resolve its futures."""
+        texts = [text for text, _, _ in batch]
+        body = {"model": self.model, "input": texts}
+        if dimensions:
+            body["dimensions"] = dimensions
+
+        resp = await self._get_client().post(self.endpoint_url, json=body)
+        resp.raise_for_status()
+        data = resp.json()
+        items = sorted(data["data"], key=lambda item: item["index"])
+        if len(items) != len(batch):
+            raise ValueError(f"Embeddings server returned {len(items)} vectors for {len(batch)} inputs")
+
+        # Upstream reports tokens for the whole batch; apportion by length
+        prompt_tokens = data.get("usage", {}).get("prompt_tokens", 0)
+        total_chars = sum(len(text) for text in texts) or 1
+        for (text, key, future), item in zip(batch, items):
+            tokens = round(prompt_tokens * len(text) / total_chars)
+            self._remember(key, (array("f", item["embedding"]), tokens))
+            if not future.done():
+                future.set_result((item["embedding"], tokens))
+
+    def _remember(self, key: str, result: _Result) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = result
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+def _as_list(vector: Sequence[float]) -> list[float]:
+    return vector.tolist() if isinstance(vector, array) else vector
+
+
+def _encode_base64(vector: Sequence[float]) -> str:
+    """OpenAI's base64 encoding: little-endian float32."""
+    return base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
@@ -0,0 +1,192 @@
+"""HTTP caching for image endpoints.
+
+- ``conditional_file_response`` serves a file from disk (streamed by
+  FileResponse, or handed to the server via ``pathsend`` where supported)
+  with ETag / Last-Modified / Cache-Control, and answers revalidations with
+  304 Not Modified.
+- ``ThumbnailCache`` is a small on-disk cache for proxied Immich thumbnails.
+  Misses are streamed to the client and written to the cache at the same
+  time; entries expire after a TTL and the oldest are evicted once the cache
+  exceeds its size budget. Size accounting and eviction scan the cache
+  directory, so they run on a worker thread.
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+import mimetypes
+import tempfile
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+logger = logging.getLogger(__name__)
+
+IMMICH_THUMB_CACHE_DIR = Path(os.getenv("DATA_PATH", "/data")) / "cache" / "immich-thumbnails"
+IMMICH_THUMB_CACHE_MB = int(os.getenv("IMMICH_THUMB_CACHE_MB", "256"))  # 0 = disabled
+IMMICH_THUMB_CACHE_TTL = int(os.getenv("IMMICH_THUMB_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+
+# Uploaded images never change once written
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+THUMBNAIL_CACHE_CONTROL = "private, max-age=86400"
+
+_SAFE_KEY = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+_THUMB_EXTENSIONS = (".jpg", ".webp", ".png", ".jpeg")
+
+
+def file_validators(stat: os.stat_result) -> tuple[str, str]:
+    """ETag and Last-Modified values for a file."""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"', formatdate(stat.st_mtime, usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against a file."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional_file_response(
+    request: Request,
+    path: Path,
+    media_type: Optional[str] = None,
+    cache_control: str = IMMUTABLE_CACHE_CONTROL,
+) -> Response:
+    """FileResponse with caching headers, or 304 if the client's copy is current."""
+    stat = os.stat(path)
+    etag, last_modified = file_validators(stat)
+    headers = {"ETag": etag, "Last-Modified": last_modified, "Cache-Control": cache_control}
+    if is_not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
+
+
+class ThumbnailCache:
+    """Size- and age-bounded on-disk cache of thumbnails, keyed by asset and size."""
+
+    def __init__(
+        self,
+        root: Path = IMMICH_THUMB_CACHE_DIR,
+        max_bytes: int = IMMICH_THUMB_CACHE_MB * 1024 * 1024,
+        ttl: float = IMMICH_THUMB_CACHE_TTL,
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._total: Optional[int] = None
+        # Fills account on worker threads; one directory scan at a time
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, asset_id: str, size: str) -> Optional[str]:
+        """Cache key, or None if the request should bypass the cache."""
+        if not self.enabled or not _SAFE_KEY.match(asset_id) or not _SAFE_KEY.match(size):
+            return None
+        return f"{asset_id}.{size}"
+
+    def lookup(self, key: str) -> Optional[tuple[Path, str]]:
+        """Path and media type of a fresh cached thumbnail."""
+        for ext in _THUMB_EXTENSIONS:
+            path = self.root / f"{key}{ext}"
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if time.time() - stat.st_mtime > self.ttl:
+                self._remove(path)
+                return None
+            return path, mimetypes.guess_type(path.name)[0] or "image/jpeg"
+        return None
+
+    async def fill(self, key: str, media_type: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Pass chunks through while writing them to the cache; commit only if complete."""
+        ext = mimetypes.guess_extension(media_type.split(";")[0].strip()) or ".jpg"
+        if ext not in _THUMB_EXTENSIONS:
+            async for chunk in chunks:
+                yield chunk
+            return
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, prefix=".fill-")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                async for chunk in chunks:
+                    tmp.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+            os.replace(tmp_name, self.root / f"{key}{ext}")
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+        await asyncio.to_thread(self._account, size)
+
+    def _remove(self, path: Path) -> None:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        # Not locked: lookup() runs on the event loop and must not wait on a prune
+        if self._total is not None:
+            self._total -= size
+
+    def _account(self, added: int) -> None:
+        with self._lock:
+            if self._total is None:
+                self._total = sum(p.stat().st_size for p in self.root.iterdir() if not p.name.startswith("."))
+            else:
+                self._total += added
+            if self._total > self.max_bytes:
+                self._prune()
+
+    def prune(self) -> None:
+        """Evict the oldest entries until the cache is within its size budget."""
+        with self._lock:
+            self._prune()
+
+    def _prune(self) -> None:
+        entries = []
+        for path in self.root.iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        self._total = total
+        if evicted:
+            logger.info(f"Evicted {evicted} cached thumbnails ({total // 1024} KiB kept)")
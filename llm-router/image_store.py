@@ -0,0 +1,241 @@
+"""Content-addressed image store for multimodal messages.
+
+Uploads are streamed to disk in chunks while being hashed, and stored once
+per content hash under ``<images>/blobs/<aa>/<sha256><ext>``. The per-message
+path the dashboard uses (``<images>/<conversation>/<message>/<file>``) is a
+hard link to the blob, so existing ``image_refs`` paths keep working.
+
+At upload time, images larger than IMAGE_MAX_EDGE on either side also get a
+downscaled "vision" variant; that is what vision models receive. Encoded
+``data:`` URLs are kept in a byte-bounded LRU keyed by content hash, so a
+conversation with images costs one base64 encode per image instead of one
+per image per turn.
+"""
+
+import os
+import re
+import base64
+import asyncio
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+# Longest side sent to vision models; larger uploads get a downscaled variant (0 = never)
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "2048"))
+IMAGE_DATA_URL_CACHE_MB = int(os.getenv("IMAGE_DATA_URL_CACHE_MB", "256"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+MIME_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+PIL_FORMATS = {"image/png": "PNG", "image/jpeg": "JPEG", "image/webp": "WEBP"}
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds the size limit."""
+
+
+@dataclass
+class StoredImage:
+    """A stored upload and its vision variant."""
+    sha256: str
+    path: Path
+    size: int
+    mime_type: str
+    width: int
+    height: int
+    vision_width: int
+    vision_height: int
+
+
+class ImageStore:
+    """Content-addressed image blobs plus a cache of encoded data URLs."""
+
+    def __init__(
+        self,
+        root: Path,
+        max_edge: int = IMAGE_MAX_EDGE,
+        cache_bytes: int = IMAGE_DATA_URL_CACHE_MB * 1024 * 1024,
+    ):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.max_edge = max_edge
+        self.cache_bytes = cache_bytes
+
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._cache_size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # -------------------------------------------------------------------------
+    # Storage
+    # -------------------------------------------------------------------------
+
+    def blob_path(self, sha256: str, mime_type: str, variant: str = "") -> Path:
+        ext = MIME_EXTENSIONS.get(mime_type, ".bin")
+        suffix = f".{variant}" if variant else ""
+        return self.blob_dir / sha256[:2] / f"{sha256}{suffix}{ext}"
+
+    async def save_upload(self, upload, mime_type: str, max_size: int) -> StoredImage:
+        """
+        Stream an upload (anything with ``async read(n)``) into the store.
+
+        Raises:
+            ImageTooLargeError: If the upload exceeds ``max_size`` bytes
+        """
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+
+        fd, tmp_name = tempfile.mkstemp(dir=self.blob_dir, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while True:
+                    chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_size:
+                        raise ImageTooLargeError(f"Image too large. Max size: {max_size // (1024 * 1024)}MB")
+                    digest.update(chunk)
+                    tmp.write(chunk)
+
+            sha256 = digest.hexdigest()
+            path = self.blob_path(sha256, mime_type)
+            if path.exists():
+                os.unlink(tmp_name)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_name, path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+        width, height, vision_width, vision_height = await asyncio.to_thread(
+            self._prepare_vision_variant, sha256, path, mime_type
+        )
+        return StoredImage(
+            sha256=sha256,
+            path=path,
+            size=size,
+            mime_type=mime_type,
+            width=width,
+            height=height,
+            vision_width=vision_width,
+            vision_height=vision_height,
+        )
+
+    def _prepare_vision_variant(self, sha256: str, path: Path, mime_type: str) -> tuple[int, int, int, int]:
+        """Write a downscaled copy for vision models if the image is oversized."""
+        from PIL import Image
+
+        try:
+            with Image.open(path) as img:
+                width, height = img.size
+                variant = self.blob_path(sha256, mime_type, "vision")
+                if (
+                    not self.max_edge
+                    or max(width, height) <= self.max_edge
+                    or mime_type not in PIL_FORMATS
+                ):
+                    return width, height, width, height
+                if variant.exists():
+                    with Image.open(variant) as existing:
+                        return (width, height) + existing.size
+
+                img.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS)
+                save_kwargs = {"optimize": True}
+                if mime_type == "image/jpeg":
+                    img = img.convert("RGB")
+                    save_kwargs["quality"] = 90
+                elif mime_type == "image/webp":
+                    save_kwargs["quality"] = 90
+                img.save(variant, PIL_FORMATS[mime_type], **save_kwargs)
+                logger.info(
+                    f"Vision variant for {sha256[:12]}: {width}x{height} -> {img.size[0]}x{img.size[1]} "
+                    f"({path.stat().st_size} -> {variant.stat().st_size} bytes)"
+                )
+                return (width, height) + img.size
+        except Exception as e:
+            logger.warning(f"Could not inspect image {path}: {e}")
+            return 0, 0, 0, 0
+
+    def link(self, stored: StoredImage, dest: Path) -> None:
+        """Expose a blob at a per-message path (hard link, copy if linking fails)."""
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(stored.path, dest)
+        except OSError:
+            shutil.copyfile(stored.path, dest)
+
+    # -------------------------------------------------------------------------
+    # Data URLs
+    # -------------------------------------------------------------------------
+
+    def _resolve(self, ref: dict) -> tuple[Optional[Path], str, Optional[str]]:
+        """File to send for an image_ref, its MIME type, and a cache key."""
+        mime_type = ref.get("mimeType", "image/png")
+        sha256 = ref.get("sha256")
+        if isinstance(sha256, str) and _SHA256.match(sha256):
+            for variant in ("vision", ""):
+                path = self.blob_path(sha256, mime_type, variant)
+                if path.exists():
+                    return path, mime_type, f"{sha256}:{variant}"
+
+        # Refs from before the store existed: key by path + stat
+        path = (self.root.parent / ref.get("path", "")).resolve()
+        if not path.is_relative_to(self.root.resolve()) or not path.exists():
+            return None, mime_type, None
+        st = path.stat()
+        return path, mime_type, f"{path}:{st.st_mtime_ns}:{st.st_size}"
+
+    def data_url(self, ref: dict) -> Optional[str]:
+        """``data:`` URL for an image_ref, from cache when possible. None if missing."""
+        path, mime_type, key = self._resolve(ref)
+        if path is None:
+            logger.warning(f"Image not found: {ref.get('path', ref.get('sha256'))}")
+            return None
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        with open(path, "rb") as f:
+            url = f"data:{mime_type};base64,{base64.b64encode(f.read()).decode('ascii')}"
+
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = url
+                self._cache_size += len(url)
+                while self._cache_size > self.cache_bytes and len(self._cache) > 1:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cache_size -= len(evicted)
+        return url
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "cached_images": len(self._cache),
+                "cached_bytes": self._cache_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
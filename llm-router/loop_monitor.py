@@ -0,0 +1,78 @@
+"""
+Event loop stall detection.
+
+A background task sleeps for a fixed interval and measures how late it wakes
+up. Any lag beyond the threshold means something ran synchronously on the
+event loop (blocking I/O, subprocess, heavy CPU) and stalled every in-flight
+request, including streaming completions.
+"""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+import prometheus_metrics as prom
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.5"))  # seconds
+LOOP_STALL_THRESHOLD_MS = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "250"))
+
+
+class EventLoopMonitor:
+    """Background task that alarms when the event loop is blocked."""
+
+    def __init__(
+        self,
+        interval: float = LOOP_MONITOR_INTERVAL,
+        stall_threshold_ms: float = LOOP_STALL_THRESHOLD_MS,
+    ):
+        self.interval = interval
+        self.stall_threshold_ms = stall_threshold_ms
+        self.stalls = 0
+        self.max_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start monitoring the running event loop."""
+        if self._task:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Event loop monitor started (interval={self.interval}s, "
+            f"stall threshold={self.stall_threshold_ms:.0f}ms)"
+        )
+
+    async def stop(self):
+        """Stop the monitor task."""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (loop.time() - scheduled - self.interval) * 1000)
+
+            stalled = lag_ms > self.stall_threshold_ms
+            prom.record_event_loop_lag(lag_ms / 1000, stalled)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+            if stalled:
+                self.stalls += 1
+                logger.warning(f"Event loop stalled for {lag_ms:.0f}ms (threshold {self.stall_threshold_ms:.0f}ms)")
+
+    def stats(self) -> dict:
+        """Stall counters for health reporting."""
+        return {
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "stall_threshold_ms": self.stall_threshold_ms,
+        }
@@ -78,6 +78,7 @@ class ImageRef(BaseModel):
     mimeType: str
     width: int
     height: int
+    sha256: Optional[str] = None  # content hash in the image store
 
 
 class MessageCreate(BaseModel):
@@ -254,6 +255,7 @@ class AgentRunStatus(str, Enum):
     FAILED = "failed"
     MAX_STEPS = "max_steps"
     CANCELLED = "cancelled"
+    PREEMPTED = "preempted"
 
 
 class AgentStepRecord(BaseModel):
@@ -304,6 +306,19 @@ class AgentRunWithSteps(AgentRunRecord):
     steps: List[AgentStepRecord] = []
 
 
+class AgentSchedulerStats(BaseModel):
+    """Live agent scheduler queue state."""
+    max_concurrent: int
+    running: int
+    queued: int
+    queued_interactive: int
+    running_by_source: Dict[str, int]
+    queued_by_source: Dict[str, int]
+    source_limits: Dict[str, int]
+    oldest_queued_s: float
+    preemptions: int
+
+
 class AgentRunsStats(BaseModel):
     """Aggregated statistics for agent runs."""
     total_runs: int
@@ -314,6 +329,7 @@ class AgentRunsStats(BaseModel):
     avg_duration_ms: float
     by_source: Dict[str, int]
     by_status: Dict[str, int]
+    scheduler: Optional[AgentSchedulerStats] = None
 
 
 # ============================================================================
@@ -115,6 +115,63 @@ MESSAGES_TOTAL = Gauge(
     'Total number of messages in memory'
 )
 
+# ============================================================================
+# Event Loop Metrics
+# ============================================================================
+
+EVENT_LOOP_LAG = Histogram(
+    'local_ai_event_loop_lag_seconds',
+    'Delay between scheduled and actual wakeup of the event loop monitor',
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+)
+
+EVENT_LOOP_STALLS = Counter(
+    'local_ai_event_loop_stalls_total',
+    'Number of times the event loop was blocked longer than the stall threshold'
+)
+
+# ============================================================================
+# Agent Scheduler Metrics
+# ============================================================================
+
+AGENT_RUNS_RUNNING = Gauge(
+    'local_ai_agent_runs_running',
+    'Agent runs currently executing'
+)
+
+AGENT_RUNS_QUEUED = Gauge(
+    'local_ai_agent_runs_queued',
+    'Agent runs waiting for a scheduler slot'
+)
+
+AGENT_QUEUE_WAIT = Histogram(
+    'local_ai_agent_queue_wait_seconds',
+    'Time agent runs spent queued before starting',
+    ['priority'],
+    buckets=[0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0]
+)
+
+AGENT_PREEMPTIONS = Counter(
+    'local_ai_agent_preemptions_total',
+    'Background agent runs preempted for interactive runs'
+)
+
+# ============================================================================
+# Embeddings Metrics
+# ============================================================================
+
+EMBEDDINGS_BATCH_SIZE = Histogram(
+    'local_ai_embeddings_batch_size',
+    'Inputs per batched upstream embeddings call',
+    buckets=[1, 2, 4, 8, 16, 32, 64, 128, 256]
+)
+
+EMBEDDINGS_INPUTS = Counter(
+    'local_ai_embeddings_inputs_total',
+    'Embedding inputs by how they were served',
+    ['result']  # cache_hit, coalesced, computed
+)
+
 # ============================================================================
 # System Info
 # ============================================================================
@@ -223,6 +280,40 @@ def update_provider_metrics(
         PROVIDER_RESPONSE_TIME.labels(provider=provider_id).set(response_time_ms)
 
 
+def record_event_loop_lag(lag_seconds: float, stalled: bool):
+    """Record an event loop lag sample."""
+    EVENT_LOOP_LAG.observe(lag_seconds)
+    if stalled:
+        EVENT_LOOP_STALLS.inc()
+
+
+def record_agent_scheduler_state(running: int, queued: int):
+    """Update agent scheduler occupancy."""
+    AGENT_RUNS_RUNNING.set(running)
+    AGENT_RUNS_QUEUED.set(queued)
+
+
+def record_agent_queue_wait(priority: str, wait_seconds: float):
+    """Record how long an agent run waited for a scheduler slot."""
+    AGENT_QUEUE_WAIT.labels(priority=priority).observe(wait_seconds)
+
+
+def record_agent_preemption():
+    """Record a background agent run being preempted."""
+    AGENT_PREEMPTIONS.inc()
+
+
+def record_embeddings_batch(size: int):
+    """Record one batched upstream embeddings call."""
+    EMBEDDINGS_BATCH_SIZE.observe(size)
+
+
+def record_embeddings_inputs(result: str, count: int = 1):
+    """Record embedding inputs served from cache, coalesced, or computed."""
+    if count:
+        EMBEDDINGS_INPUTS.labels(result=result).inc(count)
+
+
 def update_memory_metrics(conversations: int, messages: int):
     """Update memory/conversation metrics."""
     CONVERSATIONS_TOTAL.set(conversations)
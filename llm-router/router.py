@@ -23,7 +23,24 @@ from pydantic import BaseModel
 from typing import Optional
 import asyncio
 
-from agent import AgentRequest, AgentResponse, run_agent_loop, AGENT_TOOLS
+from agent import (
+    AgentRequest,
+    AgentResponse,
+    AgentResumeRequest,
+    AgentForkRequest,
+    load_resume_state,
+    is_agent_run_active,
+    AGENT_TOOLS,
+)
+from agent_context import count_tools_tokens
+from agent_scheduler import get_agent_scheduler, AgentQueueFullError, AgentRunConflictError, AgentTimeBudgetError
+from embeddings import EmbeddingBatcher
+from image_store import ImageStore, ImageTooLargeError
+from http_cache import (
+    THUMBNAIL_CACHE_CONTROL,
+    ThumbnailCache,
+    conditional_file_response,
+)
 from auth import ApiKey, validate_api_key_header, get_request_priority
 from dependencies import get_request_tracker, log_chat_completion, RequestTracker
 from memory import generate_conversation_id
@@ -40,6 +57,7 @@ from stream import (
     StreamAccumulator,
 )
 from complexity import is_agent_request
+from loop_monitor import EventLoopMonitor
 import prometheus_metrics as prom
 from routers.docs import router as docs_router
 from routers.anthropic import router as anthropic_router
@@ -54,6 +72,7 @@ logger = logging.getLogger(__name__)
 # Global provider manager and health checker
 provider_manager: Optional[ProviderManager] = None
 health_checker: Optional[HealthChecker] = None
+loop_monitor = EventLoopMonitor()
 
 # Gaming PC status cache (updated by background poller, not per-request)
 _gaming_cache: dict = {
@@ -97,9 +116,13 @@ async def lifespan(app: FastAPI):
     global _gaming_poller_task
     _gaming_poller_task = asyncio.create_task(_gaming_status_poller())
 
+    await loop_monitor.start()
+
     yield
 
     # Shutdown: stop background tasks
+    await loop_monitor.stop()
+
     if _gaming_poller_task:
         _gaming_poller_task.cancel()
         try:
@@ -111,6 +134,8 @@ async def lifespan(app: FastAPI):
         await health_checker.stop()
         logger.info("Health checker stopped")
 
+    await embedding_batcher.aclose()
+
 
 app = FastAPI(
     title="Local AI Router",
@@ -217,6 +242,7 @@ class HealthResponse(BaseModel):
     gaming_cache_age: Optional[float] = None
     queue_depth: int = 0
     queue_max_depth: int = 0
+    event_loop: Optional[dict] = None
 
 
 async def get_gaming_pc_status() -> Optional[GamingModeStatus]:
@@ -848,25 +874,68 @@ async def get_activity_feed(limit: int = 20, before: Optional[str] = None):
     }
 
 
+thumbnail_cache = ThumbnailCache()
+
+
 @app.get("/api/immich/thumbnail/{asset_id}")
-async def immich_thumbnail(asset_id: str, size: str = "thumbnail"):
-    """Proxy Immich asset thumbnail — keeps API key server-side."""
+async def immich_thumbnail(request: Request, asset_id: str, size: str = "thumbnail"):
+    """
+    Proxy Immich asset thumbnail — keeps API key server-side.
+
+    Thumbnails are served from a small on-disk cache when present; misses are
+    streamed from Immich and written to the cache on the way through.
+    """
     immich_url = os.getenv("IMMICH_URL", "http://immich-server:2283")
     api_key = os.getenv("IMMICH_API_KEY", "")
     if not api_key:
         raise HTTPException(status_code=503, detail="Immich not configured")
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.get(
-            f"{immich_url}/api/assets/{asset_id}/thumbnail",
-            params={"size": size},
-            headers={"x-api-key": api_key},
+
+    cache_key = thumbnail_cache.key(asset_id, size)
+    if cache_key:
+        cached = thumbnail_cache.lookup(cache_key)
+        if cached:
+            path, media_type = cached
+            return conditional_file_response(request, path, media_type, THUMBNAIL_CACHE_CONTROL)
+
+    client = httpx.AsyncClient(timeout=10.0)
+    try:
+        resp = await client.send(
+            client.build_request(
+                "GET",
+                f"{immich_url}/api/assets/{asset_id}/thumbnail",
+                params={"size": size},
+                headers={"x-api-key": api_key},
+            ),
+            stream=True,
         )
-        if resp.status_code != 200:
-            raise HTTPException(
-                status_code=resp.status_code, detail="Thumbnail not found"
-            )
-        content_type = resp.headers.get("content-type", "image/jpeg")
-        return Response(content=resp.content, media_type=content_type)
+    except Exception:
+        await client.aclose()
+        raise
+
+    if resp.status_code != 200:
+        await resp.aclose()
+        await client.aclose()
+        raise HTTPException(
+            status_code=resp.status_code, detail="Thumbnail not found"
+        )
+    content_type = resp.headers.get("content-type", "image/jpeg")
+
+    async def body():
+        try:
+            chunks = resp.aiter_bytes()
+            if cache_key:
+                chunks = thumbnail_cache.fill(cache_key, content_type, chunks)
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await resp.aclose()
+            await client.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type=content_type,
+        headers={"Cache-Control": THUMBNAIL_CACHE_CONTROL},
+    )
 
 
 @app.get("/api/dashboard")
@@ -989,6 +1058,7 @@ async def health_check() -> HealthResponse:
         gaming_cache_age=cache_age,
         queue_depth=queue_info["depth"],
         queue_max_depth=queue_info["max_depth"],
+        event_loop=loop_monitor.stats(),
     )
 
 
@@ -1597,20 +1667,22 @@ async def unregister_custom_model(model_id: str):
     return {"status": "unregistered", "model_id": model_id}
 
 
+embedding_batcher = EmbeddingBatcher(f"{LOCAL_3070_URL}/v1/embeddings")
+
+
 @app.post("/v1/embeddings")
 async def embeddings(request: Request):
-    """OpenAI-compatible embeddings — always routed to server 3070 llm-manager."""
-    body = await request.json()
-    body["model"] = "bge-base-en"
+    """
+    OpenAI-compatible embeddings — always routed to server 3070 llm-manager.
 
-    endpoint_url = f"{LOCAL_3070_URL}/v1/embeddings"
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        try:
-            resp = await client.post(endpoint_url, json=body)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception as e:
-            raise HTTPException(status_code=503, detail=f"Embeddings unavailable: {e}")
+    Concurrent requests are micro-batched into one upstream call and vectors
+    are cached by content hash (see embeddings.py).
+    """
+    body = await request.json()
+    try:
+        return await embedding_batcher.create_embeddings(body)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Embeddings unavailable: {e}")
 
 
 @app.post("/v1/chat/completions")
@@ -1658,7 +1730,8 @@ async def chat_completions(
     messages = body.get("messages", [])
     if messages_have_images(messages):
         if selection.model.capabilities.vision:
-            body["messages"] = format_messages_for_vision(messages, IMAGE_DATA_DIR)
+            # Cache misses read and encode files, keep that off the event loop
+            body["messages"] = await asyncio.to_thread(format_messages_for_vision, messages, image_store)
             logger.info(f"Formatted {len(messages)} messages for vision model")
         else:
             logger.warning(
@@ -2008,6 +2081,7 @@ class TTSSpeechRequest(BaseModel):
     voice: str = "alloy"  # Voice to use (alloy, echo, fable, onyx, nova, shimmer)
     response_format: str = "mp3"  # Format: mp3, opus, aac, flac, wav, pcm
     speed: float = 1.0  # Speed: 0.25 to 4.0
+    stream: bool = False  # Stream audio sentence by sentence as it is generated
 
 
 @app.post("/v1/audio/speech")
@@ -2018,7 +2092,9 @@ async def text_to_speech(
     OpenAI-compatible text-to-speech endpoint.
     
     Proxies requests to Gaming PC manager which hosts Chatterbox TTS.
-    Returns audio data with appropriate headers.
+    Returns audio data with appropriate headers, streamed through as the
+    TTS server produces it (pass "stream": true for sentence-by-sentence
+    audio on long inputs).
     
     Example:
         curl -X POST http://localhost:8012/v1/audio/speech \
@@ -2032,6 +2108,8 @@ async def text_to_speech(
             }' \
             --output speech.mp3
     """
+    client = httpx.AsyncClient(timeout=120.0)
+    handed_off = False
     try:
         body = await request.json()
 
@@ -2046,35 +2124,50 @@ async def text_to_speech(
             f"TTS request: input='{body['input'][:50]}...', voice={body.get('voice', 'alloy')}"
         )
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{TTS_ENDPOINT}/v1/audio/speech",
-                json=body,
-            )
+        response = await client.send(
+            client.build_request("POST", f"{TTS_ENDPOINT}/v1/audio/speech", json=body),
+            stream=True,
+        )
 
-            if response.status_code != 200:
-                error_msg = f"TTS generation failed: {response.text}"
-                logger.error(error_msg)
-                raise HTTPException(status_code=response.status_code, detail=error_msg)
-
-            # Return audio data with headers from upstream
-            response_headers = {}
-
-            # Copy relevant headers from TTS service
-            for header in [
-                "content-type",
-                "content-length",
-                "x-audio-duration",
-                "x-generation-time",
-            ]:
-                if header in response.headers:
-                    response_headers[header] = response.headers[header]
-
-            return Response(
-                content=response.content,
-                headers=response_headers,
-                media_type=response.headers.get("content-type", "audio/mpeg"),
-            )
+        if response.status_code != 200:
+            detail = (await response.aread()).decode(errors="replace")
+            await response.aclose()
+            error_msg = f"TTS generation failed: {detail}"
+            logger.error(error_msg)
+            raise HTTPException(status_code=response.status_code, detail=error_msg)
+
+        # Return audio data with headers from upstream
+        response_headers = {}
+
+        # Copy relevant headers from TTS service
+        for header in [
+            "content-type",
+            "content-length",
+            "x-audio-duration",
+            "x-generation-time",
+            "x-sample-rate",
+            "x-audio-chunks",
+            "x-cache",
+        ]:
+            if header in response.headers:
+                response_headers[header] = response.headers[header]
+
+        # Pass audio through as it arrives; with "stream": true the TTS
+        # server sends each sentence as soon as it is generated
+        async def audio_chunks():
+            try:
+                async for chunk in response.aiter_bytes():
+                    yield chunk
+            finally:
+                await response.aclose()
+                await client.aclose()
+
+        handed_off = True
+        return StreamingResponse(
+            audio_chunks(),
+            headers=response_headers,
+            media_type=response.headers.get("content-type", "audio/mpeg"),
+        )
 
     except httpx.TimeoutException:
         error_msg = "TTS generation timed out"
@@ -2088,6 +2181,9 @@ async def text_to_speech(
         error_msg = f"TTS generation failed: {e}"
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
+    finally:
+        if not handed_off:
+            await client.aclose()
 
 
 # ============================================================================
@@ -2099,8 +2195,10 @@ MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
 MAX_IMAGES_PER_MESSAGE = 5
 ALLOWED_IMAGE_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp"}
 
+image_store = ImageStore(IMAGE_DATA_DIR)
+
 
-def format_messages_for_vision(messages: list, image_data_dir: Path) -> list:
+def format_messages_for_vision(messages: list, store: ImageStore) -> list:
     """
     Convert messages with image_refs to OpenAI vision format.
 
@@ -2112,9 +2210,10 @@ def format_messages_for_vision(messages: list, image_data_dir: Path) -> list:
             {"type": "text", "text": "What's in this image?"},
             {"type": "image_url", "image_url": {"url": "data:image/png;base64,..."}}
         ]}
-    """
-    import base64
 
+    Encoded data URLs come from the image store's cache, so earlier turns'
+    images are not re-read and re-encoded on every request.
+    """
     formatted = []
     for msg in messages:
         if not isinstance(msg, dict):
@@ -2133,23 +2232,11 @@ def format_messages_for_vision(messages: list, image_data_dir: Path) -> list:
 
         for ref in image_refs:
             try:
-                filepath = image_data_dir.parent / ref.get("path", "")
-                if not filepath.exists():
-                    logger.warning(f"Image not found: {filepath}")
+                url = store.data_url(ref)
+                if url is None:
                     continue
 
-                with open(filepath, "rb") as f:
-                    image_data = f.read()
-
-                b64_data = base64.b64encode(image_data).decode("utf-8")
-                mime_type = ref.get("mimeType", "image/png")
-
-                content_parts.append(
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:{mime_type};base64,{b64_data}"},
-                    }
-                )
+                content_parts.append({"type": "image_url", "image_url": {"url": url}})
                 logger.debug(
                     f"Added image to message: {ref.get('filename', 'unknown')}"
                 )
@@ -2180,23 +2267,19 @@ async def upload_image(
     file: UploadFile = File(...),
     api_key: ApiKey = Depends(validate_api_key_header),
 ):
-    """Upload an image for a message (multimodal support)."""
-    from PIL import Image
-    import io
+    """
+    Upload an image for a message (multimodal support).
 
+    The upload is streamed into the content-addressed image store; the
+    returned path is a link to the stored blob. Oversized images also get a
+    downscaled variant that is what vision models receive.
+    """
     if file.content_type not in ALLOWED_IMAGE_TYPES:
         raise HTTPException(
             status_code=400,
             detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_IMAGE_TYPES)}",
         )
 
-    content = await file.read()
-    if len(content) > MAX_IMAGE_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Image too large. Max size: {MAX_IMAGE_SIZE // (1024 * 1024)}MB",
-        )
-
     image_dir = IMAGE_DATA_DIR / conversation_id / message_id
     image_dir.mkdir(parents=True, exist_ok=True)
 
@@ -2207,40 +2290,42 @@ async def upload_image(
             detail=f"Maximum {MAX_IMAGES_PER_MESSAGE} images per message",
         )
 
+    try:
+        stored = await image_store.save_upload(file, file.content_type, MAX_IMAGE_SIZE)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     sequence = f"{len(existing_images) + 1:03d}"
     safe_filename = "".join(c for c in file.filename if c.isalnum() or c in "._-")
     filename = f"{sequence}_{safe_filename}"
     filepath = image_dir / filename
+    image_store.link(stored, filepath)
 
-    with open(filepath, "wb") as f:
-        f.write(content)
-
-    try:
-        with Image.open(io.BytesIO(content)) as img:
-            width, height = img.size
-    except Exception:
-        width, height = 0, 0
-
-    logger.info(f"Image uploaded: {filepath} ({len(content)} bytes, {width}x{height})")
+    logger.info(
+        f"Image uploaded: {filepath} ({stored.size} bytes, {stored.width}x{stored.height}, "
+        f"sha256 {stored.sha256[:12]})"
+    )
 
     return {
         "filename": filename,
         "path": str(filepath.relative_to(IMAGE_DATA_DIR.parent)),
-        "size": len(content),
+        "size": stored.size,
         "mimeType": file.content_type,
-        "width": width,
-        "height": height,
+        "width": stored.width,
+        "height": stored.height,
+        "sha256": stored.sha256,
     }
 
 
 @app.get("/v1/images/{conversation_id}/{message_id}/{filename}")
 async def get_image(
+    request: Request,
     conversation_id: str,
     message_id: str,
     filename: str,
     api_key: ApiKey = Depends(validate_api_key_header),
 ):
-    """Retrieve an uploaded image."""
+    """Retrieve an uploaded image (streamed from disk, revalidated via ETag)."""
     filepath = IMAGE_DATA_DIR / conversation_id / message_id / filename
 
     if not filepath.exists():
@@ -2249,7 +2334,7 @@ async def get_image(
     if not filepath.is_relative_to(IMAGE_DATA_DIR):
         raise HTTPException(status_code=403, detail="Access denied")
 
-    return FileResponse(filepath)
+    return conditional_file_response(request, filepath)
 
 
 # ============================================================================
@@ -2258,27 +2343,37 @@ async def get_image(
 
 
 async def call_llm_for_agent(
-    messages: list, model: str = "auto", tools: list = None, tool_choice: str = "auto"
+    messages: list,
+    model: str = "auto",
+    tools: list = None,
+    tool_choice: str = "auto",
+    prompt_tokens: Optional[int] = None,
+    tools_tokens: Optional[int] = None,
 ) -> dict:
     """Call the LLM through the router for agent use.
 
     Routes via ProviderManager (auto → 3090 default, fallback to Z.ai).
     Agent context capped at AGENT_CONTEXT_CAP.
 
-    Returns the response with additional _routing_info for tracking.
+    ``prompt_tokens`` is the agent's running token count for ``messages``;
+    when given, the history is not re-tokenized on every step.
+    ``tools_tokens`` is the size of the tool schemas (counted here when not
+    given); max_tokens leaves room for both, so prompt + tools + completion
+    stays inside the model's context window.
+
+    Returns the response with additional _routing_info for tracking,
+    including the selected model's context window.
     """
     if not provider_manager:
         raise HTTPException(status_code=503, detail="Provider manager not initialized")
 
-    token_estimate = estimate_tokens(messages)
-    max_tokens = min(AGENT_CONTEXT_CAP, max(512, 8192 - token_estimate - 500))
+    token_estimate = prompt_tokens if prompt_tokens is not None else estimate_tokens(messages)
 
     body = {
         "model": model,
         "messages": messages,
         "tools": tools or [],
         "tool_choice": tool_choice,
-        "max_tokens": max_tokens,
     }
 
     if token_estimate > 6000:
@@ -2293,6 +2388,13 @@ async def call_llm_for_agent(
         )
 
     body["model"] = selection.model.id
+    context_window = selection.model.context_window or 8192
+    if tools_tokens is None:
+        tools_tokens = count_tools_tokens(tools or [])
+    body["max_tokens"] = min(
+        AGENT_CONTEXT_CAP,
+        max(512, context_window - token_estimate - tools_tokens - 500),
+    )
     endpoint_url = build_chat_completions_url(selection.provider)
     request_headers = build_request_headers(selection.provider)
 
@@ -2317,22 +2419,40 @@ async def call_llm_for_agent(
                 "model": selection.model.id,
                 "backend": selection.provider.id,
                 "backend_name": selection.provider.name,
+                "context_window": context_window,
             }
             provider_manager.record_inference_success(selection.provider.id)
             return result
 
 
+async def _cancel_on_disconnect(
+    http_request: Request, task: asyncio.Task, poll_interval: float = 1.0
+) -> None:
+    """Cancel an in-flight agent run once its client goes away."""
+    while not task.done():
+        if await http_request.is_disconnected():
+            logger.info("Agent client disconnected, cancelling run")
+            task.cancel()
+            return
+        await asyncio.sleep(poll_interval)
+
+
 @app.post("/agent/run", response_model=AgentResponse)
-async def run_agent(request: AgentRequest):
+async def run_agent(request: AgentRequest, http_request: Request):
     """
     Run an autonomous agent task.
 
     The agent follows OpenCode's host-controlled design:
     - Host owns loop control, step count, tool execution, error handling
-    - Model emits exactly ONE action per turn (tool call OR response)
+    - Model emits one decision per turn (tool calls OR response); independent
+      read-only tool calls from the same turn run in parallel
     - Host validates and re-prompts on malformed output
     - Provider-agnostic: can swap models without system rewrite
 
+    Tools run on a worker pool so the event loop stays responsive, and the
+    run (including any tool subprocesses) is cancelled if the client
+    disconnects.
+
     Example:
         curl -X POST http://localhost:8000/agent/run \\
             -H "Content-Type: application/json" \\
@@ -2344,16 +2464,102 @@ async def run_agent(request: AgentRequest):
             }'
     """
     logger.info(f"Agent task started: {request.task[:100]}...")
+    return await _await_agent_run(
+        http_request, get_agent_scheduler().submit(request, call_llm_for_agent)
+    )
+
+
+async def _await_agent_run(http_request: Request, loop_coro) -> AgentResponse:
+    """Run an agent loop as a task that is cancelled if the client disconnects."""
+    agent_task = asyncio.create_task(loop_coro)
+    watcher = asyncio.create_task(_cancel_on_disconnect(http_request, agent_task))
 
     try:
-        result = await run_agent_loop(request, call_llm_for_agent)
+        result = await agent_task
         logger.info(
             f"Agent completed: success={result.success}, steps={result.total_steps}"
         )
         return result
+    except asyncio.CancelledError:
+        if asyncio.current_task().cancelling():
+            raise
+        raise HTTPException(status_code=499, detail="Client disconnected, agent run cancelled")
+    except AgentQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except AgentRunConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except AgentTimeBudgetError as e:
+        raise HTTPException(status_code=504, detail=f"time_budget_exceeded: {e}")
     except Exception as e:
         logger.error(f"Agent error: {e}")
         raise HTTPException(status_code=500, detail=f"Agent execution failed: {e}")
+    finally:
+        watcher.cancel()
+
+
+AGENT_STREAM_KEEPALIVE = float(os.getenv("AGENT_STREAM_KEEPALIVE", "15"))  # seconds
+
+
+@app.post("/agent/run/stream")
+async def run_agent_stream(request: AgentRequest):
+    """
+    Run an agent task and stream its progress as Server-Sent Events.
+
+    Same loop and agent_storage records as /agent/run, but each step is
+    emitted as it happens instead of one response at the end:
+
+    - run_started: run_id assigned (use GET /agent/runs/{run_id} afterwards)
+    - step_started / model_decision: model turn with its action and token usage
+    - tool_started / tool_output / tool_finished: tool execution, with live
+      subprocess output chunks for shell/git/ssh tools
+    - run_completed / run_cancelled / error: terminal event, then [DONE]
+
+    Comment keepalives are sent while idle so proxies don't time out long
+    runs. Closing the connection cancels the run.
+
+    Example:
+        curl -N -X POST http://localhost:8000/agent/run/stream \\
+            -H "Content-Type: application/json" \\
+            -d '{"task": "Summarize git status in /tmp/repo", "working_directory": "/tmp/repo"}'
+    """
+    logger.info(f"Streaming agent task started: {request.task[:100]}...")
+
+    events: asyncio.Queue = asyncio.Queue()
+    agent_task = asyncio.create_task(
+        get_agent_scheduler().submit(request, call_llm_for_agent, events=events)
+    )
+    agent_task.add_done_callback(lambda _: events.put_nowait(None))
+
+    async def event_stream():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        events.get(), timeout=AGENT_STREAM_KEEPALIVE
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if event is None:
+                    break
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+
+            if not agent_task.cancelled() and agent_task.exception():
+                error = agent_task.exception()
+                logger.error(f"Streaming agent error: {error}")
+                yield f"data: {json.dumps({'type': 'error', 'timestamp': time.time(), 'error': str(error)})}\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            if not agent_task.done():
+                logger.info("Agent stream closed by client, cancelling run")
+                agent_task.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/agent/tools")
@@ -2412,8 +2618,8 @@ async def run_claude_agent(request: Request):
 # Agent Runs API Endpoints
 # ============================================================================
 
-from agent_storage import list_agent_runs, get_agent_run, get_agent_runs_stats
-from models import AgentRunRecord, AgentRunWithSteps, AgentRunsStats
+from agent_storage import list_agent_runs, get_agent_run, get_agent_runs_stats, fork_agent_run
+from models import AgentRunRecord, AgentRunWithSteps, AgentRunsStats, AgentRunStatus
 
 
 @app.get("/agent/runs", response_model=list[AgentRunRecord])
@@ -2429,8 +2635,10 @@ async def api_list_agent_runs(
 
 @app.get("/agent/runs/stats", response_model=AgentRunsStats)
 async def api_agent_runs_stats():
-    """Get aggregated statistics for agent runs."""
-    return get_agent_runs_stats()
+    """Get aggregated statistics for agent runs, plus live scheduler queue state."""
+    stats = get_agent_runs_stats()
+    stats.scheduler = get_agent_scheduler().stats()
+    return stats
 
 
 @app.get("/agent/runs/{run_id}", response_model=AgentRunWithSteps)
@@ -2442,6 +2650,85 @@ async def api_get_agent_run(run_id: str):
     return run
 
 
+@app.post("/agent/runs/{run_id}/resume", response_model=AgentResponse)
+async def api_resume_agent_run(
+    run_id: str, body: AgentResumeRequest, http_request: Request
+):
+    """
+    Resume a stopped agent run from its last checkpoint.
+
+    Works for runs that were cancelled, failed, hit max_steps, or were left
+    "running" by a gateway restart. Prior steps are replayed from the
+    checkpoint, so their LLM calls are not repeated.
+    """
+    run = get_agent_run(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Agent run not found")
+    if run.status == AgentRunStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail="Agent run already completed; fork it instead")
+    # Reserve the run before any await so a concurrent resume can't pass this check too
+    scheduler = get_agent_scheduler()
+    if is_agent_run_active(run_id) or not scheduler.reserve(run_id):
+        raise HTTPException(status_code=409, detail="Agent run is still executing or queued")
+
+    try:
+        model_changed = body.model is not None and body.model != run.model_requested
+        resume = load_resume_state(run_id, reset_model=model_changed)
+        if resume is None:
+            raise HTTPException(status_code=409, detail="Agent run has no checkpoints to resume from")
+
+        request = AgentRequest(
+            task=run.task,
+            working_directory=run.working_directory or "/tmp",
+            model=body.model or run.model_requested or "auto",
+            max_steps=body.max_steps,
+            source=run.source,
+            triggered_by=run.triggered_by,
+        )
+        logger.info(f"Resuming agent run {run_id} from step {resume.step_number}")
+        return await _await_agent_run(
+            http_request, scheduler.submit(request, call_llm_for_agent, resume=resume)
+        )
+    finally:
+        scheduler.release(run_id)
+
+
+@app.post("/agent/runs/{run_id}/fork", response_model=AgentResponse)
+async def api_fork_agent_run(run_id: str, body: AgentForkRequest, http_request: Request):
+    """
+    Fork an agent run after step N into a new run and continue it.
+
+    The new run shares the original's history through ``step`` (no LLM calls
+    are repeated) and can continue on a different model.
+    """
+    run = get_agent_run(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Agent run not found")
+
+    model_changed = body.model is not None and body.model != run.model_requested
+    resume = load_resume_state(run_id, up_to_step=body.step, reset_model=model_changed)
+    if resume is None or resume.step_number != body.step:
+        raise HTTPException(status_code=404, detail=f"No checkpoint for step {body.step}")
+
+    fork_id = fork_agent_run(
+        run_id, body.step, model_requested=body.model, triggered_by=body.triggered_by
+    )
+    resume.run_id = fork_id
+
+    request = AgentRequest(
+        task=run.task,
+        working_directory=run.working_directory or "/tmp",
+        model=body.model or run.model_requested or "auto",
+        max_steps=body.max_steps,
+        source=run.source,
+        triggered_by=body.triggered_by or run.triggered_by,
+    )
+    logger.info(f"Forked agent run {run_id} at step {body.step} -> {fork_id}")
+    return await _await_agent_run(
+        http_request, get_agent_scheduler().submit(request, call_llm_for_agent, resume=resume)
+    )
+
+
 # ============================================================================
 # Memory API Endpoints
 # ============================================================================
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark full-history vs incremental conversation compaction.
+
+Simulates a conversation that grows by a fixed number of turns between
+compactions and measures the size of each compaction prompt (tokens) and the
+time spent building it. Full-history compaction re-summarizes every aged-out
+turn each time (O(history)); the summary store only summarizes turns that aged
+out since the previous compaction (O(new turns)).
+
+Usage:
+    python bench_compaction.py [--rounds N] [--turns-per-round N] [--keep-recent N]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compaction import CompactionSummaryStore, compact_messages, estimate_message_tokens
+
+TURN_TEXT = (
+    "We looked at the deploy logs for the media stack and found that the "
+    "container restarted after the healthcheck timed out on the NFS mount. "
+)
+SUMMARY_TEXT = "Summary of earlier discussion about the media stack deploy. " * 8
+
+
+def make_turn(i: int) -> dict:
+    role = "user" if i % 2 == 0 else "assistant"
+    return {"role": role, "content": f"[{i}] {TURN_TEXT * 3}"}
+
+
+def run(rounds: int, turns_per_round: int, keep_recent: int) -> None:
+    store = CompactionSummaryStore(persist=False)
+    messages = [{"role": "system", "content": "You are a homelab assistant."}]
+    previous_summary = None
+
+    print(f"{'round':>5} {'history':>8} {'full tok':>9} {'full ms':>8} {'incr tok':>9} {'incr ms':>8}")
+    full_total = incr_total = 0
+    for r in range(1, rounds + 1):
+        start = len(messages)
+        messages.extend(make_turn(i) for i in range(start, start + turns_per_round))
+
+        t0 = time.perf_counter()
+        to_compact, _, prompt = compact_messages(
+            messages, context_limit=0, previous_summary=previous_summary, keep_recent=keep_recent
+        )
+        full_tokens = estimate_message_tokens([{"role": "user", "content": prompt}])
+        full_ms = (time.perf_counter() - t0) * 1000
+        previous_summary = SUMMARY_TEXT
+
+        t0 = time.perf_counter()
+        plan = store.plan("bench", messages, keep_recent=keep_recent)
+        incr_tokens = estimate_message_tokens([{"role": "user", "content": plan.prompt}])
+        if plan.prompt:
+            store.commit(plan, SUMMARY_TEXT)
+        incr_ms = (time.perf_counter() - t0) * 1000
+
+        full_total += full_tokens
+        incr_total += incr_tokens
+        print(
+            f"{r:>5} {len(messages) - 1:>8} {full_tokens:>9} {full_ms:>8.2f} "
+            f"{incr_tokens:>9} {incr_ms:>8.2f}"
+        )
+
+    print(f"\nTotal compaction prompt tokens: full={full_total} incremental={incr_total} "
+          f"({full_total / max(incr_total, 1):.1f}x)")
+    print(f"Store stats: {store.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark incremental compaction")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--turns-per-round", type=int, default=8)
+    parser.add_argument("--keep-recent", type=int, default=6)
+    args = parser.parse_args()
+    run(args.rounds, args.turns_per_round, args.keep_recent)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""Unit tests for the host-controlled agent loop."""
+import asyncio
+import json
+
+import pytest
+
+import database
+from agent import (
+    ActionType,
+    AgentRequest,
+    ToolCall,
+    parse_model_response,
+    load_resume_state,
+    plan_tool_batches,
+    run_agent_loop,
+)
+import agent_storage
+from agent_storage import get_agent_run, get_agent_runs_stats
+
+
+def _tool_call(name: str, args: dict, call_id: str = None) -> dict:
+    call = {"type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+    if call_id:
+        call["id"] = call_id
+    return call
+
+
+def _response(*tool_calls: dict) -> dict:
+    return {
+        "choices": [{"message": {"role": "assistant", "content": None, "tool_calls": list(tool_calls)}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+    }
+
+
+@pytest.fixture
+def agent_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "agent.db"))
+    database.init_database()
+
+
+# ============================================================================
+# Parsing
+# ============================================================================
+
+def test_parse_multiple_tool_calls():
+    action, error = parse_model_response(_response(
+        _tool_call("read_file", {"path": "a.py"}, "call_a"),
+        _tool_call("read_file", {"path": "b.py"}, "call_b"),
+    ))
+
+    assert error is None
+    assert action.action_type == ActionType.TOOL_CALL
+    assert [c.arguments["path"] for c in action.tool_calls] == ["a.py", "b.py"]
+    assert [c.id for c in action.tool_calls] == ["call_a", "call_b"]
+    assert action.tool_call == action.tool_calls[0]
+
+
+def test_parse_task_complete_alongside_tool_calls():
+    action, _ = parse_model_response(_response(
+        _tool_call("write_file", {"path": "a.txt", "content": "x"}),
+        _tool_call("task_complete", {"answer": "done"}),
+    ))
+
+    assert action.action_type == ActionType.TOOL_CALL
+    assert [c.name for c in action.tool_calls] == ["write_file"]
+    assert action.final_answer == "done"
+
+
+def test_parse_task_complete_only():
+    action, _ = parse_model_response(_response(_tool_call("task_complete", {"answer": "done"})))
+
+    assert action.action_type == ActionType.TERMINATE
+    assert action.final_answer == "done"
+
+
+# ============================================================================
+# Batching
+# ============================================================================
+
+def test_read_only_calls_share_a_batch_and_mutations_are_barriers():
+    calls = [
+        ToolCall(name="read_file", arguments={}),
+        ToolCall(name="search_files", arguments={}),
+        ToolCall(name="write_file", arguments={}),
+        ToolCall(name="read_file", arguments={}),
+        ToolCall(name="list_directory", arguments={}),
+        ToolCall(name="run_shell", arguments={}),
+        ToolCall(name="run_shell", arguments={}),
+    ]
+
+    batches = plan_tool_batches(calls)
+
+    assert [[c.name for c in b] for b in batches] == [
+        ["read_file", "search_files"],
+        ["write_file"],
+        ["read_file", "list_directory"],
+        ["run_shell"],
+        ["run_shell"],
+    ]
+
+
+# ============================================================================
+# Loop
+# ============================================================================
+
+def test_parallel_reads_complete_in_one_turn(tmp_path, agent_db):
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tmp_path / name).write_text(f"contents of {name}\n")
+
+    calls = []
+
+    async def fake_llm(messages, model, tools, tool_choice, prompt_tokens=None, tools_tokens=None):
+        calls.append(messages)
+        if len(calls) == 1:
+            return _response(*[
+                _tool_call("read_file", {"path": str(tmp_path / n)}, f"call_{n}")
+                for n in ("a.txt", "b.txt", "c.txt")
+            ])
+        return _response(_tool_call("task_complete", {"answer": "read all three"}))
+
+    request = AgentRequest(task="read files", working_directory=str(tmp_path))
+    result = asyncio.run(run_agent_loop(request, fake_llm))
+
+    assert result.success
+    assert result.final_answer == "read all three"
+    assert len(calls) == 2
+
+    second_turn = calls[1]
+    assistant = [m for m in second_turn if m["role"] == "assistant"][-1]
+    tool_messages = [m for m in second_turn if m["role"] == "tool"]
+    assert [tc["id"] for tc in assistant["tool_calls"]] == ["call_a.txt", "call_b.txt", "call_c.txt"]
+    assert [m["tool_call_id"] for m in tool_messages] == ["call_a.txt", "call_b.txt", "call_c.txt"]
+    assert "contents of b.txt" in tool_messages[1]["content"]
+    assert result.steps[0].tool_results is not None
+    assert len(result.steps[0].tool_results) == 3
+
+
+# ============================================================================
+# Context budget
+# ============================================================================
+
+@pytest.mark.parametrize("context_window", [8192, 32768])
+@pytest.mark.parametrize("pass_tools_tokens", [True, False])
+def test_agent_call_fits_context_window_with_ledger_at_budget(monkeypatch, context_window, pass_tools_tokens):
+    from contextlib import asynccontextmanager
+    from types import SimpleNamespace
+
+    import httpx
+    import router
+    from agent import get_agent_tools
+    from agent_context import count_tools_tokens, prompt_budget
+
+    tools = get_agent_tools()
+    tools_tokens = count_tools_tokens(tools)
+    prompt_tokens = prompt_budget(context_window, tools_tokens)
+    selection = SimpleNamespace(
+        model=SimpleNamespace(id="local-model", context_window=context_window),
+        provider=SimpleNamespace(id="gpu", name="GPU"),
+    )
+    sent = {}
+
+    class _Manager:
+        async def acquire_provider_slot(self, model, priority=0):
+            return selection
+
+        @asynccontextmanager
+        async def track_request(self, provider_id):
+            yield
+
+        def record_inference_success(self, provider_id):
+            pass
+
+    class _Client:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def post(self, url, json, headers):
+            sent.update(json)
+            return httpx.Response(200, json={"choices": []})
+
+    monkeypatch.setattr(router, "provider_manager", _Manager())
+    monkeypatch.setattr(router.httpx, "AsyncClient", _Client)
+    monkeypatch.setattr(router, "build_chat_completions_url", lambda provider: "http://backend/v1/chat/completions")
+    monkeypatch.setattr(router, "build_request_headers", lambda provider: {})
+
+    asyncio.run(router.call_llm_for_agent(
+        [{"role": "user", "content": "task"}],
+        tools=tools,
+        prompt_tokens=prompt_tokens,
+        tools_tokens=tools_tokens if pass_tools_tokens else None,
+    ))
+
+    assert prompt_tokens + tools_tokens + sent["max_tokens"] <= context_window
+
+
+# ============================================================================
+# Streaming events
+# ============================================================================
+
+def _drain(queue: asyncio.Queue) -> list[dict]:
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+
+def test_loop_emits_step_events_with_live_tool_output(tmp_path, agent_db):
+    async def fake_llm(messages, model, tools, tool_choice, prompt_tokens=None, tools_tokens=None):
+        if not any(m["role"] == "tool" for m in messages):
+            return _response(_tool_call("run_shell", {"command": "echo one; echo two"}))
+        return _response(_tool_call("task_complete", {"answer": "ok"}))
+
+    async def scenario():
+        queue = asyncio.Queue()
+        request = AgentRequest(task="echo", working_directory=str(tmp_path))
+        result = await run_agent_loop(request, fake_llm, events=queue)
+        await asyncio.sleep(0)
+        return result, _drain(queue)
+
+    result, events = asyncio.run(scenario())
+    types = [e["type"] for e in events]
+
+    assert types[0] == "run_started"
+    assert types[-1] == "run_completed"
+    assert types.index("tool_started") < types.index("tool_output") < types.index("tool_finished")
+    chunks = [e["chunk"] for e in events if e["type"] == "tool_output"]
+    assert chunks == ["one\n", "two\n"]
+    started = next(e for e in events if e["type"] == "tool_started")
+    assert started["tool_call_id"] == "call_1_0"
+    assert all(e["run_id"] == result.run_id for e in events)
+    assert events[-1]["usage"] == {"prompt_tokens": 20, "completion_tokens": 10}
+
+
+def test_stream_endpoint_emits_sse_events(tmp_path, agent_db, monkeypatch):
+    from fastapi.testclient import TestClient
+    import router
+
+    async def fake_llm(messages, model="auto", tools=None, tool_choice="auto", prompt_tokens=None, tools_tokens=None):
+        return _response(_tool_call("task_complete", {"answer": "streamed"}))
+
+    monkeypatch.setattr(router, "call_llm_for_agent", fake_llm)
+    client = TestClient(router.app)
+
+    with client.stream("POST", "/agent/run/stream", json={"task": "t", "working_directory": str(tmp_path)}) as resp:
+        assert resp.status_code == 200
+        lines = [line for line in resp.iter_lines() if line.startswith("data: ")]
+
+    assert lines[-1] == "data: [DONE]"
+    events = [json.loads(line[len("data: "):]) for line in lines[:-1]]
+    assert events[0]["type"] == "run_started"
+    assert events[-1]["type"] == "run_completed"
+    assert events[-1]["final_answer"] == "streamed"
+
+
+# ============================================================================
+# Checkpoints: resume and fork
+# ============================================================================
+
+def _reading_llm(tmp_path, calls, finish_after=None):
+    async def fake_llm(messages, model, tools, tool_choice, prompt_tokens=None, tools_tokens=None):
+        calls.append(([dict(m) for m in messages], model))
+        if finish_after is not None and len(calls) > finish_after:
+            return _response(_tool_call("task_complete", {"answer": f"done on {model}"}))
+        return _response(_tool_call("read_file", {"path": str(tmp_path / "a.txt")}))
+    return fake_llm
+
+
+def test_resume_continues_from_last_checkpoint(tmp_path, agent_db):
+    (tmp_path / "a.txt").write_text("hello\n")
+    first_calls = []
+    request = AgentRequest(task="read", working_directory=str(tmp_path), max_steps=2)
+    first = asyncio.run(run_agent_loop(request, _reading_llm(tmp_path, first_calls)))
+    assert first.terminated_reason == "max_steps_reached"
+
+    resume = load_resume_state(first.run_id)
+    assert resume.step_number == 2
+    assert len(resume.steps) == 2
+
+    resumed_calls = []
+    result = asyncio.run(run_agent_loop(
+        request, _reading_llm(tmp_path, resumed_calls, finish_after=0), resume=resume
+    ))
+
+    assert result.success
+    assert result.run_id == first.run_id
+    assert len(resumed_calls) == 1
+    # The resumed call sees the full prior history: system, task, 2 x (assistant + tool)
+    history = resumed_calls[0][0]
+    assert [m["role"] for m in history] == ["system", "user", "assistant", "tool", "assistant", "tool"]
+    assert history[:4] == first_calls[1][0]
+    assert [step.step_number for step in result.steps] == [1, 2, 3]
+
+    run = get_agent_run(first.run_id)
+    assert run.status.value == "completed"
+    assert run.total_steps == 3  # 2 tool calls + terminate
+
+
+def test_fork_endpoint_continues_on_another_model(tmp_path, agent_db, monkeypatch):
+    from fastapi.testclient import TestClient
+    import router
+
+    (tmp_path / "a.txt").write_text("hello\n")
+    request = AgentRequest(task="read", working_directory=str(tmp_path), max_steps=3)
+    original = asyncio.run(run_agent_loop(request, _reading_llm(tmp_path, [])))
+
+    fork_calls = []
+    monkeypatch.setattr(router, "call_llm_for_agent", _reading_llm(tmp_path, fork_calls, finish_after=0))
+    client = TestClient(router.app)
+
+    resp = client.post(f"/agent/runs/{original.run_id}/fork", json={"step": 1, "model": "big"})
+    assert resp.status_code == 200
+    body = resp.json()
+
+    assert body["run_id"] != original.run_id
+    assert body["final_answer"] == "done on big"
+    assert [m["role"] for m in fork_calls[0][0]] == ["system", "user", "assistant", "tool"]
+
+    fork = get_agent_run(body["run_id"])
+    assert fork.metadata == {"forked_from": original.run_id, "forked_at_step": 1}
+    assert [step.step_number for step in fork.steps] == [1, 2]
+
+    assert client.post(f"/agent/runs/{body['run_id']}/resume", json={}).status_code == 409
+
+
+# ============================================================================
+# Batched persistence and stats
+# ============================================================================
+
+def test_steps_written_in_batches(tmp_path, agent_db, monkeypatch):
+    (tmp_path / "a.txt").write_text("hello\n")
+    opened = []
+    real_connection = agent_storage.get_db_connection
+
+    def counting_connection():
+        opened.append(1)
+        return real_connection()
+
+    monkeypatch.setattr(agent_storage, "get_db_connection", counting_connection)
+    request = AgentRequest(task="read", working_directory=str(tmp_path), max_steps=4)
+    result = asyncio.run(run_agent_loop(request, _reading_llm(tmp_path, [], finish_after=3)))
+
+    # create + one flush on completion, instead of a transaction per step
+    assert len(opened) == 2
+    run = get_agent_run(result.run_id)
+    assert [step.step_number for step in run.steps] == [1, 2, 3, 4]
+    assert run.total_steps == 4
+    assert load_resume_state(result.run_id).step_number == 4
+
+
+def test_incremental_stats_match_full_aggregation(tmp_path, agent_db):
+    (tmp_path / "a.txt").write_text("hello\n")
+    runs = [
+        AgentRequest(task="a", working_directory=str(tmp_path), max_steps=2, source="api"),
+        AgentRequest(task="b", working_directory=str(tmp_path), max_steps=3),
+        AgentRequest(task="c", working_directory=str(tmp_path), max_steps=2, source="n8n"),
+    ]
+    results = [
+        asyncio.run(run_agent_loop(runs[0], _reading_llm(tmp_path, []))),
+        asyncio.run(run_agent_loop(runs[1], _reading_llm(tmp_path, [], finish_after=1))),
+        asyncio.run(run_agent_loop(runs[2], _reading_llm(tmp_path, []))),
+    ]
+    asyncio.run(run_agent_loop(
+        runs[0], _reading_llm(tmp_path, [], finish_after=0), resume=load_resume_state(results[0].run_id)
+    ))
+
+    stats = get_agent_runs_stats()
+
+    with database.get_db_connection() as conn:
+        expected_status = dict(conn.execute("SELECT status, COUNT(*) FROM agent_runs GROUP BY status").fetchall())
+        expected_avg_steps = conn.execute(
+            "SELECT AVG(total_steps) FROM agent_runs WHERE status != 'running'"
+        ).fetchone()[0]
+    assert stats.total_runs == 3
+    assert stats.by_status == expected_status == {"completed": 2, "max_steps": 1}
+    assert stats.by_source == {"api": 1, "unknown": 1, "n8n": 1}
+    assert stats.avg_steps == round(expected_avg_steps, 1)
@@ -0,0 +1,98 @@
+"""Unit tests for token-aware agent context pruning."""
+from agent_context import ContextLedger, PRUNE_MUTATING, PRUNE_READ_ONLY
+
+
+def _count(message):
+    return len(message.get("content") or "") + 10 * len(message.get("tool_calls") or [])
+
+
+def _turn(ledger, turn, outputs):
+    """Append one assistant tool-call turn with (tool_name, output, prune_class) results."""
+    ledger.append({
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [
+            {"id": f"call_{turn}_{i}", "type": "function", "function": {"name": name, "arguments": "{}"}}
+            for i, (name, _, _) in enumerate(outputs)
+        ],
+    }, turn=turn)
+    for i, (name, output, prune_class) in enumerate(outputs):
+        ledger.append(
+            {"role": "tool", "tool_call_id": f"call_{turn}_{i}", "content": output},
+            turn=turn, prune_class=prune_class, label=name
+        )
+
+
+def _assert_paired(messages):
+    pending = set()
+    for message in messages:
+        if message["role"] == "assistant":
+            assert not pending
+            pending = {tc["id"] for tc in message.get("tool_calls") or []}
+        elif message["role"] == "tool":
+            assert message["tool_call_id"] in pending
+            pending.discard(message["tool_call_id"])
+    assert not pending
+
+
+def test_messages_counted_once():
+    counted = []
+
+    def count(message):
+        counted.append(message)
+        return _count(message)
+
+    ledger = ContextLedger(budget_tokens=100_000, count_tokens=count)
+    ledger.append({"role": "system", "content": "s" * 50}, turn=0)
+    for turn in range(1, 20):
+        _turn(ledger, turn, [("read_file", "x" * 100, PRUNE_READ_ONLY)])
+
+    assert len(counted) == len(ledger.messages) == 1 + 19 * 2
+    assert ledger.total == sum(_count(m) for m in ledger.messages)
+
+
+def test_read_only_outputs_pruned_first_and_recent_kept():
+    ledger = ContextLedger(budget_tokens=2500, keep_recent_turns=1, count_tokens=_count)
+    ledger.append({"role": "system", "content": "system"}, turn=0)
+    _turn(ledger, 1, [("write_file", "w" * 1000, PRUNE_MUTATING)])
+    _turn(ledger, 2, [("read_file", "r" * 1000, PRUNE_READ_ONLY)])
+    _turn(ledger, 3, [("search_files", "s" * 1000, PRUNE_READ_ONLY)])
+
+    tool_messages = [m for m in ledger.messages if m["role"] == "tool"]
+    assert tool_messages[0]["content"] == "w" * 1000
+    assert tool_messages[1]["content"].startswith("[Pruned read_file output (1000 tokens)")
+    assert tool_messages[2]["content"] == "s" * 1000
+    assert ledger.total <= ledger.budget
+    assert ledger.total == sum(_count(m) for m in ledger.messages)
+    _assert_paired(ledger.messages)
+
+
+def test_whole_turns_dropped_when_stubbing_is_not_enough():
+    ledger = ContextLedger(budget_tokens=600, keep_recent_turns=1, count_tokens=_count)
+    ledger.append({"role": "system", "content": "system"}, turn=0)
+    ledger.append({"role": "user", "content": "task"}, turn=0)
+    for turn in range(1, 6):
+        _turn(ledger, turn, [
+            ("read_file", "r" * 150, PRUNE_READ_ONLY),
+            ("list_directory", "l" * 150, PRUNE_READ_ONLY),
+        ])
+
+    assert ledger.messages[0]["content"] == "system"
+    assert ledger.messages[1]["content"] == "task"
+    assert ledger.messages[-1]["content"] == "l" * 150
+    assert ledger.dropped_count > 0
+    assert ledger.total <= ledger.budget
+    _assert_paired(ledger.messages)
+
+
+def test_budget_change_triggers_pruning():
+    ledger = ContextLedger(budget_tokens=10_000, keep_recent_turns=1, count_tokens=_count)
+    ledger.append({"role": "system", "content": "system"}, turn=0)
+    _turn(ledger, 1, [("read_file", "r" * 2000, PRUNE_READ_ONLY)])
+    _turn(ledger, 2, [("read_file", "r" * 2000, PRUNE_READ_ONLY)])
+    assert ledger.pruned_count == 0
+
+    ledger.set_budget(3000)
+
+    assert ledger.pruned_count == 1
+    assert ledger.total <= 3000
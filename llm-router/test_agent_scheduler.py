@@ -0,0 +1,197 @@
+"""Unit tests for the agent run scheduler."""
+import asyncio
+import json
+
+import pytest
+
+import database
+from agent import AgentRequest, load_resume_state
+from agent_scheduler import AgentRunConflictError, AgentScheduler, AgentTimeBudgetError
+from agent_storage import get_agent_run
+
+
+def _call(name: str, args: dict) -> dict:
+    return {
+        "choices": [{"message": {"role": "assistant", "content": None, "tool_calls": [
+            {"type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+        ]}}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 50},
+    }
+
+
+def _llm(steps_before_done: int, calls: list, delay: float = 0.05):
+    """Fake model: list_directory for N turns, then task_complete."""
+    async def fake_llm(messages, model, tools, tool_choice, prompt_tokens=None, tools_tokens=None):
+        calls.append(len(messages))
+        await asyncio.sleep(delay)
+        if len(calls) > steps_before_done:
+            return _call("task_complete", {"answer": f"done after {len(calls)} calls"})
+        return _call("list_directory", {"path": "."})
+    return fake_llm
+
+
+@pytest.fixture
+def agent_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "agent.db"))
+    database.init_database()
+
+
+def test_global_limit_queues_runs(tmp_path, agent_db):
+    scheduler = AgentScheduler(max_concurrent=1, source_limits={}, background_sources=set())
+
+    async def scenario():
+        first = asyncio.create_task(scheduler.submit(
+            AgentRequest(task="a", working_directory=str(tmp_path)), _llm(2, [])
+        ))
+        second = asyncio.create_task(scheduler.submit(
+            AgentRequest(task="b", working_directory=str(tmp_path)), _llm(2, [])
+        ))
+        await asyncio.sleep(0.02)
+        stats = scheduler.stats()
+        results = await asyncio.gather(first, second)
+        return stats, results, scheduler.stats()
+
+    during, results, after = asyncio.run(scenario())
+
+    assert (during.running, during.queued) == (1, 1)
+    assert all(result.success for result in results)
+    assert (after.running, after.queued) == (0, 0)
+
+
+def test_per_source_limit(tmp_path, agent_db):
+    scheduler = AgentScheduler(max_concurrent=3, source_limits={"ralph": 1}, background_sources=set())
+
+    async def scenario():
+        tasks = [
+            asyncio.create_task(scheduler.submit(
+                AgentRequest(task=t, working_directory=str(tmp_path), source=source), _llm(1, [])
+            ))
+            for t, source in (("a", "ralph"), ("b", "ralph"), ("c", "api"))
+        ]
+        await asyncio.sleep(0.02)
+        stats = scheduler.stats()
+        await asyncio.gather(*tasks)
+        return stats
+
+    stats = asyncio.run(scenario())
+
+    assert stats.running_by_source == {"ralph": 1, "api": 1}
+    assert stats.queued_by_source == {"ralph": 1}
+
+
+def test_interactive_run_preempts_background_run(tmp_path, agent_db):
+    scheduler = AgentScheduler(max_concurrent=1, source_limits={}, background_sources={"ralph"})
+    background_calls, interactive_calls = [], []
+    order = []
+
+    async def scenario():
+        background = asyncio.create_task(scheduler.submit(
+            AgentRequest(task="bg", working_directory=str(tmp_path), source="ralph"),
+            _llm(4, background_calls)
+        ))
+        background.add_done_callback(lambda _: order.append("background"))
+        await asyncio.sleep(0.08)
+        interactive = asyncio.create_task(scheduler.submit(
+            AgentRequest(task="fg", working_directory=str(tmp_path), source="dashboard"),
+            _llm(1, interactive_calls)
+        ))
+        interactive.add_done_callback(lambda _: order.append("interactive"))
+        return await asyncio.gather(background, interactive)
+
+    background_result, interactive_result = asyncio.run(scenario())
+
+    assert order == ["interactive", "background"]
+    assert scheduler.preemptions == 1
+    assert interactive_result.success
+    assert background_result.success
+    # Resumed from its checkpoint: one model call per step, none repeated
+    assert len(background_calls) == 5
+    assert [step.step_number for step in background_result.steps] == [1, 2, 3, 4, 5]
+    assert get_agent_run(background_result.run_id).status.value == "completed"
+
+
+def test_token_budget_stops_run(tmp_path, agent_db):
+    scheduler = AgentScheduler(max_concurrent=1, source_limits={}, background_sources=set())
+    request = AgentRequest(task="a", working_directory=str(tmp_path), token_budget=300)
+
+    result = asyncio.run(scheduler.submit(request, _llm(10, [], delay=0)))
+
+    assert result.terminated_reason == "token_budget_exceeded"
+    assert result.total_steps == 2
+    assert get_agent_run(result.run_id).status.value == "failed"
+
+
+def _drain(queue: asyncio.Queue) -> list[dict]:
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+
+def test_hard_time_budget_overrun_is_recorded_as_over_budget(tmp_path, agent_db):
+    scheduler = AgentScheduler(
+        max_concurrent=1, source_limits={}, background_sources=set(), time_budget=0.05, time_grace=0.05
+    )
+    request = AgentRequest(task="a", working_directory=str(tmp_path))
+    events = asyncio.Queue()
+
+    async def scenario():
+        with pytest.raises(AgentTimeBudgetError):
+            # Stuck inside a model call well past deadline + grace
+            await scheduler.submit(request, _llm(10, [], delay=5), events=events)
+
+    asyncio.run(scenario())
+
+    done = _drain(events)[-1]
+    assert done["type"] == "run_completed"
+    assert done["terminated_reason"] == "time_budget_exceeded"
+    run = get_agent_run(done["run_id"])
+    assert run.status.value == "failed"
+    assert run.error == "time_budget_exceeded"
+
+
+def test_client_cancel_is_recorded_as_cancelled(tmp_path, agent_db):
+    scheduler = AgentScheduler(max_concurrent=1, source_limits={}, background_sources=set())
+    request = AgentRequest(task="a", working_directory=str(tmp_path))
+    events = asyncio.Queue()
+
+    async def scenario():
+        task = asyncio.create_task(scheduler.submit(request, _llm(10, [], delay=5), events=events))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+    done = _drain(events)[-1]
+    assert done["type"] == "run_cancelled"
+    assert get_agent_run(done["run_id"]).status.value == "cancelled"
+
+
+def test_duplicate_resume_is_rejected(tmp_path, agent_db):
+    scheduler = AgentScheduler(max_concurrent=2, source_limits={}, background_sources=set())
+    request = AgentRequest(task="a", working_directory=str(tmp_path), max_steps=1)
+    first = asyncio.run(scheduler.submit(request, _llm(10, [], delay=0)))
+    run_id = first.run_id
+
+    assert scheduler.reserve(run_id)
+    assert not scheduler.reserve(run_id)
+    scheduler.release(run_id)
+
+    async def scenario():
+        resumed = asyncio.create_task(scheduler.submit(
+            request.model_copy(update={"max_steps": 2}), _llm(1, []), resume=load_resume_state(run_id)
+        ))
+        await asyncio.sleep(0.01)
+        reserved_while_running = scheduler.reserve(run_id)
+        with pytest.raises(AgentRunConflictError):
+            await scheduler.submit(request, _llm(1, []), resume=load_resume_state(run_id))
+        return reserved_while_running, await resumed
+
+    reserved_while_running, result = asyncio.run(scenario())
+
+    assert not reserved_while_running
+    assert result.success
+    assert get_agent_run(run_id).status.value == "completed"
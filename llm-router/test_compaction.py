@@ -0,0 +1,79 @@
+"""Unit tests for incremental compaction summaries."""
+import database
+from compaction import CompactionSummaryStore
+
+
+def _history(n: int) -> list[dict]:
+    messages = [{"role": "system", "content": "You are helpful."}]
+    for i in range(n):
+        role = "user" if i % 2 == 0 else "assistant"
+        messages.append({"role": role, "content": f"turn {i}"})
+    return messages
+
+
+def test_first_compaction_summarizes_aged_out_turns():
+    store = CompactionSummaryStore(persist=False)
+    plan = store.plan("conv-1", _history(10), keep_recent=4)
+
+    assert not plan.cache_hit
+    assert [m["content"] for m in plan.messages_to_compact] == [f"turn {i}" for i in range(6)]
+    assert plan.previous_summary is None
+    assert plan.watermark == 6
+
+
+def test_rollover_only_summarizes_new_turns():
+    store = CompactionSummaryStore(persist=False)
+    first = store.plan("conv-1", _history(10), keep_recent=4)
+    store.commit(first, "summary-1")
+
+    plan = store.plan("conv-1", _history(14), keep_recent=4)
+
+    assert [m["content"] for m in plan.messages_to_compact] == [f"turn {i}" for i in range(6, 10)]
+    assert plan.previous_summary == "summary-1"
+    assert "summary-1" in plan.prompt
+    assert "turn 0" not in plan.prompt
+
+    messages = store.commit(plan, "summary-2")
+    assert messages[0]["content"] == "You are helpful."
+    assert messages[1]["content"] == "[Conversation Summary]\nsummary-2"
+    assert [m["content"] for m in messages[2:]] == [f"turn {i}" for i in range(10, 14)]
+
+
+def test_hit_when_no_new_turns_aged_out():
+    store = CompactionSummaryStore(persist=False)
+    store.commit(store.plan("conv-1", _history(10), keep_recent=4), "summary-1")
+
+    plan = store.plan("conv-1", _history(10), keep_recent=4)
+
+    assert plan.cache_hit
+    assert plan.prompt == ""
+    assert plan.messages[1]["content"] == "[Conversation Summary]\nsummary-1"
+    assert store.stats()["hits"] == 1
+    assert store.stats()["misses"] == 1
+
+
+def test_edited_history_invalidates_summary():
+    store = CompactionSummaryStore(persist=False)
+    store.commit(store.plan("conv-1", _history(10), keep_recent=4), "summary-1")
+
+    edited = _history(12)
+    edited[6]["content"] = "rewritten"
+    plan = store.plan("conv-1", edited, keep_recent=4)
+
+    assert plan.previous_summary is None
+    assert len(plan.messages_to_compact) == 8
+    assert store.stats()["invalidations"] == 1
+
+
+def test_summary_persists_across_store_instances(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "compaction.db"))
+    database.init_database()
+
+    store = CompactionSummaryStore()
+    store.commit(store.plan("conv-1", _history(10), keep_recent=4), "summary-1")
+
+    reloaded = CompactionSummaryStore()
+    plan = reloaded.plan("conv-1", _history(12), keep_recent=4)
+
+    assert plan.previous_summary == "summary-1"
+    assert [m["content"] for m in plan.messages_to_compact] == ["turn 6", "turn 7"]
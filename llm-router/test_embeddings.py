@@ -0,0 +1,130 @@
+"""Unit tests for embeddings micro-batching."""
+import asyncio
+import base64
+import json
+import struct
+
+import httpx
+
+from embeddings import EmbeddingBatcher
+
+
+def _batcher(calls, **kwargs):
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        calls.append(body["input"])
+        data = [
+            {"object": "embedding", "index": i, "embedding": [float(len(text)), 0.5]}
+            for i, text in enumerate(body["input"])
+        ]
+        return httpx.Response(200, json={"data": data, "usage": {"prompt_tokens": 10 * len(data)}})
+
+    batcher = EmbeddingBatcher("http://embeddings/v1/embeddings", window_ms=20, **kwargs)
+    batcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return batcher
+
+
+def test_concurrent_requests_share_one_batch():
+    calls = []
+
+    async def scenario():
+        batcher = _batcher(calls)
+        return await asyncio.gather(
+            batcher.create_embeddings({"input": "a"}),
+            batcher.create_embeddings({"input": ["bb", "ccc"]}),
+            batcher.create_embeddings({"input": ["a"]}),
+        )
+
+    first, second, third = asyncio.run(scenario())
+
+    assert calls == [["a", "bb", "ccc"]]
+    assert first["data"][0]["embedding"] == [1.0, 0.5]
+    assert [item["embedding"][0] for item in second["data"]] == [2.0, 3.0]
+    assert [item["index"] for item in second["data"]] == [0, 1]
+    assert third["data"][0]["embedding"] == [1.0, 0.5]
+    assert second["usage"]["prompt_tokens"] > 0
+
+
+def test_cache_hits_and_max_batch():
+    calls = []
+
+    async def scenario():
+        batcher = _batcher(calls, max_batch=2)
+        await batcher.create_embeddings({"input": ["x", "yy", "zzz"]})
+        return await batcher.create_embeddings({"input": ["yy"], "encoding_format": "base64"})
+
+    cached = asyncio.run(scenario())
+
+    assert calls == [["x", "yy"], ["zzz"]]
+    raw = base64.b64decode(cached["data"][0]["embedding"])
+    assert struct.unpack("<2f", raw) == (2.0, 0.5)
+
+
+def test_upstream_failure_reaches_every_caller():
+    def handler(request):
+        return httpx.Response(500)
+
+    async def scenario():
+        batcher = EmbeddingBatcher("http://embeddings/v1/embeddings", window_ms=5)
+        batcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        results = await asyncio.gather(
+            batcher.create_embeddings({"input": "a"}),
+            batcher.create_embeddings({"input": "b"}),
+            return_exceptions=True,
+        )
+        return results, batcher._inflight
+
+    results, inflight = asyncio.run(scenario())
+    assert all(isinstance(r, httpx.HTTPStatusError) for r in results)
+    assert inflight == {}
+
+
+def test_rejected_input_only_fails_its_own_request():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        inputs = json.loads(request.content)["input"]
+        calls.append(inputs)
+        if "bad" in inputs:
+            return httpx.Response(400, json={"error": "input too long"})
+        data = [{"object": "embedding", "index": i, "embedding": [float(len(t))]} for i, t in enumerate(inputs)]
+        return httpx.Response(200, json={"data": data, "usage": {"prompt_tokens": len(data)}})
+
+    async def scenario():
+        batcher = EmbeddingBatcher("http://embeddings/v1/embeddings", window_ms=20)
+        batcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return await asyncio.gather(
+            batcher.create_embeddings({"input": "a"}),
+            batcher.create_embeddings({"input": "bad"}),
+            batcher.create_embeddings({"input": ["cc", "ddd"]}),
+            return_exceptions=True,
+        )
+
+    first, rejected, third = asyncio.run(scenario())
+
+    assert calls[0] == ["a", "bad", "cc", "ddd"]
+    assert sorted(calls[1:]) == [["a"], ["bad"], ["cc"], ["ddd"]]
+    assert first["data"][0]["embedding"] == [1.0]
+    assert isinstance(rejected, httpx.HTTPStatusError)
+    assert [item["embedding"] for item in third["data"]] == [[2.0], [3.0]]
+
+
+def test_computed_vectors_keep_upstream_precision():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={
+            "data": [{"object": "embedding", "index": 0, "embedding": [0.1, 0.2]}],
+            "usage": {"prompt_tokens": 1},
+        })
+
+    async def scenario():
+        batcher = EmbeddingBatcher("http://embeddings/v1/embeddings", window_ms=0)
+        batcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        computed = await batcher.create_embeddings({"input": "a"})
+        cached = await batcher.create_embeddings({"input": "a"})
+        return computed, cached
+
+    computed, cached = asyncio.run(scenario())
+
+    assert computed["data"][0]["embedding"] == [0.1, 0.2]
+    # The cache keeps float32 copies
+    assert cached["data"][0]["embedding"] == list(struct.unpack("<2f", struct.pack("<2f", 0.1, 0.2)))
@@ -0,0 +1,78 @@
+"""Unit tests for image HTTP caching helpers."""
+import asyncio
+import os
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from http_cache import ThumbnailCache, conditional_file_response
+
+
+def _client(path):
+    app = FastAPI()
+
+    @app.get("/file")
+    async def serve(request: Request):
+        return conditional_file_response(request, path, "image/png")
+
+    return TestClient(app)
+
+
+def test_conditional_file_response_revalidates(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"\x89PNG fake")
+    client = _client(path)
+
+    first = client.get("/file")
+    assert first.status_code == 200
+    assert first.content == b"\x89PNG fake"
+    assert "immutable" in first.headers["cache-control"]
+    etag = first.headers["etag"]
+
+    assert client.get("/file", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/file", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    assert client.get("/file", headers={"If-None-Match": '"other"'}).status_code == 200
+    since = first.headers["last-modified"]
+    assert client.get("/file", headers={"If-Modified-Since": since}).status_code == 304
+
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+
+async def _drain(gen):
+    return b"".join([chunk async for chunk in gen])
+
+
+def test_thumbnail_cache_fill_and_lookup(tmp_path):
+    cache = ThumbnailCache(tmp_path, max_bytes=1024 * 1024, ttl=60)
+    key = cache.key("0b2e-asset", "thumbnail")
+    assert cache.lookup(key) is None
+
+    body = asyncio.run(_drain(cache.fill(key, "image/webp", _chunks(b"ab", b"cd"))))
+    assert body == b"abcd"
+
+    path, media_type = cache.lookup(key)
+    assert path.read_bytes() == b"abcd"
+    assert media_type == "image/webp"
+
+    assert cache.key("../etc", "thumbnail") is None
+    assert ThumbnailCache(tmp_path, max_bytes=0).key("asset", "thumbnail") is None
+
+
+def test_thumbnail_cache_expiry_and_eviction(tmp_path):
+    cache = ThumbnailCache(tmp_path, max_bytes=10, ttl=60)
+    for i in range(3):
+        asyncio.run(_drain(cache.fill(f"a{i}.thumbnail", "image/jpeg", _chunks(b"12345"))))
+        old = time.time() - 10 + i
+        os.utime(tmp_path / f"a{i}.thumbnail.jpg", (old, old))
+        cache.prune()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a2.thumbnail.jpg"]
+
+    stale = time.time() - 120
+    os.utime(tmp_path / "a2.thumbnail.jpg", (stale, stale))
+    assert cache.lookup("a2.thumbnail") is None
+    assert list(tmp_path.iterdir()) == []
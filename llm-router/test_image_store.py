@@ -0,0 +1,93 @@
+"""Unit tests for the content-addressed image store."""
+import asyncio
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from image_store import ImageStore, ImageTooLargeError
+
+
+class _Upload:
+    """Minimal stand-in for UploadFile: chunked async reads."""
+
+    def __init__(self, data: bytes):
+        self._buf = io.BytesIO(data)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._buf.read(size)
+
+
+def _png(width, height, color=(200, 30, 30)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_uploads_are_deduplicated_and_linked(tmp_path):
+    store = ImageStore(tmp_path / "images", max_edge=0)
+    data = _png(32, 16)
+
+    first = asyncio.run(store.save_upload(_Upload(data), "image/png", 1024 * 1024))
+    second = asyncio.run(store.save_upload(_Upload(data), "image/png", 1024 * 1024))
+
+    assert first.sha256 == second.sha256
+    assert (first.width, first.height, first.size) == (32, 16, len(data))
+    assert len(list((tmp_path / "images" / "blobs").rglob("*.png"))) == 1
+
+    dest = tmp_path / "images" / "conv" / "msg" / "001_a.png"
+    store.link(first, dest)
+    assert dest.read_bytes() == data
+
+
+def test_upload_size_limit_leaves_no_files(tmp_path):
+    store = ImageStore(tmp_path / "images", max_edge=0)
+
+    with pytest.raises(ImageTooLargeError):
+        asyncio.run(store.save_upload(_Upload(b"x" * 5000), "image/png", 4096))
+
+    assert list((tmp_path / "images" / "blobs").iterdir()) == []
+
+
+def test_oversized_images_get_vision_variant(tmp_path):
+    store = ImageStore(tmp_path / "images", max_edge=64)
+    stored = asyncio.run(store.save_upload(_Upload(_png(256, 128)), "image/png", 1024 * 1024))
+
+    assert (stored.width, stored.height) == (256, 128)
+    assert (stored.vision_width, stored.vision_height) == (64, 32)
+
+    url = store.data_url({"sha256": stored.sha256, "mimeType": "image/png", "path": "images/x"})
+    assert url.startswith("data:image/png;base64,")
+    with Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1]))) as img:
+        assert img.size == (64, 32)
+
+
+def test_data_urls_are_cached_and_bounded(tmp_path):
+    root = tmp_path / "images"
+    (root / "c" / "m").mkdir(parents=True)
+    for name in ("a.png", "b.png"):
+        (root / "c" / "m" / name).write_bytes(_png(8, 8))
+    store = ImageStore(root, max_edge=0, cache_bytes=200)
+
+    ref_a = {"path": "images/c/m/a.png", "mimeType": "image/png"}
+    ref_b = {"path": "images/c/m/b.png", "mimeType": "image/png"}
+    assert store.data_url(ref_a) == store.data_url(ref_a)
+    assert (store.hits, store.misses) == (1, 1)
+
+    store.data_url(ref_b)
+    assert store.stats()["cached_images"] == 1  # a evicted to stay under the byte budget
+
+    assert store.data_url({"path": "images/c/m/missing.png"}) is None
+    assert store.data_url({"path": "../secret.png"}) is None
+
+
+def test_refs_cannot_escape_the_store(tmp_path):
+    root = tmp_path / "images"
+    root.mkdir()
+    secret = tmp_path / "secret.png"
+    secret.write_bytes(_png(8, 8))
+    store = ImageStore(root, max_edge=0)
+
+    assert store.data_url({"sha256": str(tmp_path / "secret"), "mimeType": "image/png"}) is None
+    assert store.data_url({"path": "images/../secret.png", "mimeType": "image/png"}) is None
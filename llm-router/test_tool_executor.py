@@ -0,0 +1,66 @@
+"""Unit tests for non-blocking agent tool execution."""
+import asyncio
+import time
+
+from tools import ToolRunContext, execute_tool_async
+
+
+def test_slow_tool_does_not_block_event_loop(tmp_path):
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.create_task(ticker())
+        result = await execute_tool_async(
+            "run_shell", {"command": "sleep 0.5; echo done"}, str(tmp_path)
+        )
+        ticker_task.cancel()
+        return result, ticks
+
+    result, ticks = asyncio.run(scenario())
+
+    assert "done" in result
+    assert ticks >= 20
+
+
+def test_cancel_kills_tool_subprocess(tmp_path):
+    marker = tmp_path / "finished"
+
+    async def scenario():
+        run = ToolRunContext("test-run")
+        task = asyncio.create_task(execute_tool_async(
+            "run_shell", {"command": f"sleep 5 && touch {marker}"}, str(tmp_path), run=run
+        ))
+        await asyncio.sleep(0.3)
+        started = time.monotonic()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return run, time.monotonic() - started
+
+    run, elapsed = asyncio.run(scenario())
+
+    assert run.cancelled
+    assert elapsed < 1.0
+    time.sleep(0.2)
+    assert not marker.exists()
+
+
+def test_per_run_concurrency_limit(tmp_path):
+    async def scenario():
+        run = ToolRunContext("test-run", max_concurrency=1)
+        started = time.monotonic()
+        await asyncio.gather(*[
+            execute_tool_async("run_shell", {"command": "sleep 0.3"}, str(tmp_path), run=run)
+            for _ in range(2)
+        ])
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.6
@@ -0,0 +1,152 @@
+"""Unit tests for the agent workspace file index."""
+import asyncio
+import os
+
+from tools import ToolRunContext, WorkspaceIndex, execute_tool_async
+
+
+def _make_tree(root):
+    (root / "src" / "pkg").mkdir(parents=True)
+    (root / "build").mkdir()
+    (root / "src" / "main.py").write_text("import pkg\nprint('hello')\n")
+    (root / "src" / "pkg" / "util.py").write_text("def hello():\n    return 'hello hello'\n")
+    (root / "src" / "pkg" / "notes.log").write_text("hello from a log\n")
+    (root / "src" / "pkg" / "keep.log").write_text("kept\n")
+    (root / "build" / "out.py").write_text("hello = 1\n")
+    (root / "blob.bin").write_bytes(b"hello\x00\x01\x02")
+    (root / ".gitignore").write_text("# build output\nbuild/\n*.log\n!keep.log\n")
+
+
+def test_gitignore_rules(tmp_path):
+    _make_tree(tmp_path)
+    index = WorkspaceIndex(str(tmp_path)).build()
+
+    assert "src/main.py" in index.files
+    assert "src/pkg/keep.log" in index.files
+    assert "src/pkg/notes.log" not in index.files
+    assert not any(path.startswith("build/") for path in index.files)
+
+
+def test_name_search_glob_and_fragment(tmp_path):
+    _make_tree(tmp_path)
+    index = WorkspaceIndex(str(tmp_path))
+
+    py_files = index.search_names("**/*.py", str(tmp_path))
+    assert py_files == [str(tmp_path / "src" / "main.py"), str(tmp_path / "src" / "pkg" / "util.py")]
+
+    assert index.search_names("*.py", str(tmp_path)) == []
+    assert index.search_names("*.py", str(tmp_path / "src")) == [str(tmp_path / "src" / "main.py")]
+    assert index.search_names("uti", str(tmp_path)) == [str(tmp_path / "src" / "pkg" / "util.py")]
+
+
+def test_content_search_ranks_and_skips_binary(tmp_path):
+    _make_tree(tmp_path)
+    index = WorkspaceIndex(str(tmp_path))
+
+    results = index.search_content("hello", str(tmp_path))
+    paths = [path for path, _ in results]
+
+    assert paths == [str(tmp_path / "src" / "pkg" / "util.py"), str(tmp_path / "src" / "main.py")]
+    assert results[0][1] == [(1, "def hello():"), (2, "    return 'hello hello'")]
+
+    assert index.search_content("HELLO", str(tmp_path)) == []
+    assert len(index.search_content("HELLO", str(tmp_path), case_sensitive=False)) == 2
+    assert len(index.search_content(r"def \w+\(", str(tmp_path), regex=True)) == 1
+
+
+def test_trigram_index_matches_scan(tmp_path):
+    _make_tree(tmp_path)
+    scan = WorkspaceIndex(str(tmp_path), trigrams=False)
+    trigram = WorkspaceIndex(str(tmp_path), trigrams=True)
+
+    for query in ("hello", "import pkg", "missing"):
+        assert scan.search_content(query, str(tmp_path)) == trigram.search_content(query, str(tmp_path))
+
+
+def test_refresh_picks_up_external_changes(tmp_path):
+    _make_tree(tmp_path)
+    index = WorkspaceIndex(str(tmp_path), trigrams=True)
+    assert index.search_content("goodbye", str(tmp_path)) == []
+
+    (tmp_path / "src" / "main.py").write_text("print('goodbye')\n")
+    os.utime(tmp_path / "src" / "main.py", (1, 1))
+    (tmp_path / "src" / "pkg" / "util.py").unlink()
+    index.stale = True
+
+    assert [path for path, _ in index.search_content("goodbye", str(tmp_path))] == [str(tmp_path / "src" / "main.py")]
+    assert "src/pkg/util.py" not in index.files
+
+
+def test_search_tool_reuses_run_index_and_tracks_edits(tmp_path):
+    _make_tree(tmp_path)
+    root = str(tmp_path)
+
+    async def scenario():
+        run = ToolRunContext("test-run")
+        first = await execute_tool_async(
+            "search_files", {"pattern": "hello", "path": root, "content_search": True, "limit": 1}, root, run=run
+        )
+        index = next(iter(run.workspace_indexes.values()))
+
+        await execute_tool_async(
+            "write_file", {"path": "src/new.py", "content": "hello = 'new'\n"}, root, run=run
+        )
+        assert not index.stale
+        after_write = await execute_tool_async(
+            "search_files", {"pattern": "new.py", "path": root}, root, run=run
+        )
+
+        await execute_tool_async("run_shell", {"command": "echo hello > src/shell.py"}, root, run=run)
+        assert index.stale
+        after_shell = await execute_tool_async(
+            "search_files", {"pattern": "shell", "path": root}, root, run=run
+        )
+        return first, after_write, after_shell, len(run.workspace_indexes)
+
+    first, after_write, after_shell, index_count = asyncio.run(scenario())
+
+    assert first.splitlines()[0] == "Showing 1-1 of 3 matches in 2 files (use offset=1 for more)"
+    assert first.splitlines()[1] == f"{tmp_path}/src/pkg/util.py:1: def hello():"
+    assert after_write.splitlines()[1] == f"{tmp_path}/src/new.py"
+    assert after_shell.splitlines()[1] == f"{tmp_path}/src/shell.py"
+    assert index_count == 1
+
+
+def test_search_inside_skipped_directory_after_root_search(tmp_path):
+    _make_tree(tmp_path)
+    (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+    (tmp_path / "node_modules" / "pkg" / "index.js").write_text("const needle = 1;\n")
+    root = str(tmp_path)
+
+    async def scenario():
+        run = ToolRunContext("test-run")
+        await execute_tool_async("search_files", {"pattern": "hello", "path": root, "content_search": True}, root, run=run)
+        in_modules = await execute_tool_async(
+            "search_files",
+            {"pattern": "needle", "path": f"{root}/node_modules/pkg", "content_search": True},
+            root,
+            run=run,
+        )
+        in_build = await execute_tool_async("search_files", {"pattern": "out", "path": f"{root}/build"}, root, run=run)
+        return in_modules, in_build, sorted(run.workspace_indexes)
+
+    in_modules, in_build, roots = asyncio.run(scenario())
+
+    assert in_modules.splitlines()[1] == f"{tmp_path}/node_modules/pkg/index.js:1: const needle = 1;"
+    assert in_build.splitlines()[1] == f"{tmp_path}/build/out.py"
+    assert roots == sorted([os.path.realpath(p) for p in (root, f"{root}/node_modules/pkg", f"{root}/build")])
+
+
+def test_parallel_searches_share_one_index(tmp_path):
+    _make_tree(tmp_path)
+    root = str(tmp_path)
+
+    async def scenario():
+        run = ToolRunContext("test-run")
+        await asyncio.gather(*(
+            execute_tool_async("search_files", {"pattern": "hello", "path": root, "content_search": True}, root, run=run)
+            for _ in range(8)
+        ))
+        return list(run.workspace_indexes)
+
+    assert asyncio.run(scenario()) == [os.path.realpath(root)]
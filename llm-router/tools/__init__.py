@@ -4,6 +4,17 @@ This package contains all tools available to the agent loop.
 Tools are organized by domain (file, git, ssh, docker, etc.)
 """
 
-from .registry import TOOL_REGISTRY, get_tool_definitions, execute_tool
+from .registry import TOOL_REGISTRY, get_tool_definitions, execute_tool, is_read_only_tool
+from .executor import ToolRunContext, ToolCancelledError, execute_tool_async
+from .workspace_index import WorkspaceIndex
 
-__all__ = ["TOOL_REGISTRY", "get_tool_definitions", "execute_tool"]
+__all__ = [
+    "TOOL_REGISTRY",
+    "get_tool_definitions",
+    "execute_tool",
+    "is_read_only_tool",
+    "execute_tool_async",
+    "ToolRunContext",
+    "ToolCancelledError",
+    "WorkspaceIndex",
+]
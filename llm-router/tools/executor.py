@@ -0,0 +1,271 @@
+"""Non-blocking tool execution for the agent loop.
+
+Tool handlers stay synchronous (``(arguments, working_dir) -> str``), but the
+agent loop runs them through ``execute_tool_async()`` on a dedicated worker
+pool so a slow ``run_shell`` or content search never blocks the gateway event
+loop (and with it every streaming completion).
+
+Subprocesses started via ``run_subprocess()`` are tracked per agent run, so
+cancelling a run (client disconnect, timeout) kills its process groups instead
+of leaving them running in a worker thread. When the run has an output
+listener, subprocess output is also forwarded line by line as it is produced.
+"""
+
+import os
+import signal
+import asyncio
+import logging
+import threading
+import contextvars
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from .registry import execute_tool, is_read_only_tool
+
+logger = logging.getLogger(__name__)
+
+# Worker threads shared by all agent runs
+TOOL_MAX_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", "8"))
+
+# Concurrent tool executions allowed within a single agent run
+TOOL_MAX_PER_RUN = int(os.getenv("AGENT_TOOL_CONCURRENCY_PER_RUN", "4"))
+
+# Mutating tools that keep workspace indexes up to date themselves
+INDEX_AWARE_TOOLS = {"write_file", "edit_file"}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_current_run: contextvars.ContextVar[Optional["ToolRunContext"]] = contextvars.ContextVar(
+    "agent_tool_run", default=None
+)
+_current_call: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "agent_tool_call", default=None
+)
+
+
+class ToolCancelledError(RuntimeError):
+    """Raised inside a tool when its agent run has been cancelled."""
+
+
+class ToolRunContext:
+    """
+    Per-run execution state: concurrency limit and live subprocesses.
+
+    One instance is created per agent run and passed to every
+    ``execute_tool_async()`` call for that run. ``on_output`` is called from
+    worker threads with ``(tool_call_id, chunk)`` for each line of subprocess
+    output, so it must be thread-safe.
+    """
+
+    def __init__(
+        self,
+        run_id: Optional[str] = None,
+        max_concurrency: int = TOOL_MAX_PER_RUN,
+        on_output: Optional[Callable[[Optional[str], str], None]] = None,
+    ):
+        self.run_id = run_id
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.on_output = on_output
+        self.cancelled = False
+        # Workspace file indexes built by search tools, keyed by root path.
+        # Parallel tool calls look them up concurrently; guard with workspace_lock.
+        self.workspace_indexes: dict = {}
+        self.workspace_lock = threading.Lock()
+        self._processes: set[subprocess.Popen] = set()
+        self._lock = threading.Lock()
+
+    def _track(self, proc: subprocess.Popen) -> bool:
+        with self._lock:
+            if self.cancelled:
+                return False
+            self._processes.add(proc)
+            return True
+
+    def _untrack(self, proc: subprocess.Popen) -> None:
+        with self._lock:
+            self._processes.discard(proc)
+
+    def mark_workspace_stale(self) -> None:
+        """Force a rescan of this run's workspace indexes before the next search."""
+        with self.workspace_lock:
+            indexes = list(self.workspace_indexes.values())
+        for index in indexes:
+            index.stale = True
+
+    def cancel(self) -> None:
+        """Mark the run cancelled and kill every subprocess it started."""
+        with self._lock:
+            self.cancelled = True
+            processes = list(self._processes)
+
+        for proc in processes:
+            _kill_process_group(proc)
+
+        if processes:
+            logger.info(f"Killed {len(processes)} tool process(es) for cancelled run {self.run_id}")
+
+
+def current_tool_run() -> Optional[ToolRunContext]:
+    """The ToolRunContext of the tool currently executing, if any."""
+    return _current_run.get()
+
+
+def _kill_process_group(proc: subprocess.Popen) -> None:
+    """Kill a subprocess and anything it spawned (shell pipelines, ssh, etc.)."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    except Exception:
+        try:
+            proc.kill()
+        except Exception:
+            pass
+
+
+def _communicate_streaming(
+    proc: subprocess.Popen,
+    timeout: Optional[float],
+    on_chunk: Callable[[str], None],
+) -> tuple[str, str]:
+    """Like ``proc.communicate()`` but forwards each output line as it arrives."""
+    stdout: list[str] = []
+    stderr: list[str] = []
+
+    def pump(pipe, buf: list[str], prefix: str):
+        for line in iter(pipe.readline, ""):
+            buf.append(line)
+            try:
+                on_chunk(prefix + line)
+            except Exception:
+                logger.debug("Tool output listener failed", exc_info=True)
+        pipe.close()
+
+    readers = [
+        threading.Thread(target=pump, args=(proc.stdout, stdout, ""), daemon=True),
+        threading.Thread(target=pump, args=(proc.stderr, stderr, "[stderr]: "), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill_process_group(proc)
+        proc.wait()
+        raise
+    finally:
+        for reader in readers:
+            reader.join(timeout=5)
+
+    return "".join(stdout), "".join(stderr)
+
+
+def run_subprocess(
+    args,
+    cwd: Optional[str] = None,
+    timeout: Optional[float] = None,
+    shell: bool = False,
+) -> subprocess.CompletedProcess:
+    """
+    Drop-in for ``subprocess.run(..., capture_output=True, text=True)``.
+
+    The process runs in its own session and is registered with the current
+    agent run, so ``ToolRunContext.cancel()`` can kill it mid-flight. Raises
+    ``subprocess.TimeoutExpired`` on timeout like ``subprocess.run``.
+    """
+    run = _current_run.get()
+    on_output = run.on_output if run is not None else None
+
+    proc = subprocess.Popen(
+        args,
+        cwd=cwd,
+        shell=shell,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+    )
+
+    if run is not None and not run._track(proc):
+        _kill_process_group(proc)
+        proc.communicate()
+        raise ToolCancelledError("Agent run was cancelled")
+
+    try:
+        if on_output is None:
+            try:
+                stdout, stderr = proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                _kill_process_group(proc)
+                proc.communicate()
+                raise
+        else:
+            call_id = _current_call.get()
+            stdout, stderr = _communicate_streaming(
+                proc, timeout, lambda chunk: on_output(call_id, chunk)
+            )
+    finally:
+        if run is not None:
+            run._untrack(proc)
+
+    if run is not None and run.cancelled:
+        raise ToolCancelledError("Agent run was cancelled")
+
+    return subprocess.CompletedProcess(args, proc.returncode, stdout, stderr)
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    """Get the shared worker pool for tool execution."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=TOOL_MAX_WORKERS,
+            thread_name_prefix="agent-tool",
+        )
+    return _executor
+
+
+async def execute_tool_async(
+    name: str,
+    arguments: dict,
+    working_dir: str,
+    run: Optional[ToolRunContext] = None,
+    call_id: Optional[str] = None,
+) -> str:
+    """
+    Execute a tool on the worker pool without blocking the event loop.
+
+    Args:
+        name: Tool name
+        arguments: Tool arguments
+        working_dir: Working directory context
+        run: Per-run context for concurrency limits and cancellation
+        call_id: Tool call ID passed to the run's output listener
+
+    Returns:
+        Tool result string
+    """
+    loop = asyncio.get_running_loop()
+
+    async def _dispatch() -> str:
+        ctx = contextvars.copy_context()
+        ctx.run(_current_run.set, run)
+        ctx.run(_current_call.set, call_id)
+        return await loop.run_in_executor(
+            get_tool_executor(), ctx.run, execute_tool, name, arguments, working_dir
+        )
+
+    try:
+        if run is None:
+            return await _dispatch()
+        async with run.semaphore:
+            try:
+                return await _dispatch()
+            finally:
+                if not is_read_only_tool(name) and name not in INDEX_AWARE_TOOLS:
+                    run.mark_workspace_stale()
+    except asyncio.CancelledError:
+        if run is not None:
+            run.cancel()
+        raise
@@ -9,11 +9,14 @@ Tools:
 """
 
 import os
-import subprocess
-from glob import glob
+import re
 
 from .security import validate_path
 from .registry import register_tool
+from .workspace_index import get_workspace_index, notify_file_changed, read_cached_text
+
+# Default page size for search_files results
+SEARCH_PAGE_SIZE = 50
 
 # =============================================================================
 # Read File Tool
@@ -28,11 +31,16 @@ def _read_file(arguments: dict, working_dir: str) -> str:
     if not os.path.exists(path):
         return f"Error: File not found: {path}"
     
-    try:
-        with open(path, "r") as f:
-            lines = f.readlines()
-    except Exception as e:
-        return f"Error reading file: {e}"
+    # Served from the run's workspace index when one covers this file
+    text = read_cached_text(path)
+    if text is not None:
+        lines = text.splitlines(keepends=True)
+    else:
+        try:
+            with open(path, "r") as f:
+                lines = f.readlines()
+        except Exception as e:
+            return f"Error reading file: {e}"
     
     start = arguments.get("start_line", 1) - 1
     end = arguments.get("end_line", len(lines))
@@ -66,6 +74,7 @@ register_tool(
         },
         "required": ["path"]
     },
+    read_only=True,
     handler=_read_file
 )
 
@@ -85,6 +94,7 @@ def _write_file(arguments: dict, working_dir: str) -> str:
         
         with open(path, "w") as f:
             f.write(arguments["content"])
+        notify_file_changed(path)
         
         return f"Successfully wrote {len(arguments['content'])} bytes to {path}"
     except Exception as e:
@@ -144,6 +154,7 @@ def _edit_file(arguments: dict, working_dir: str) -> str:
     try:
         with open(path, "w") as f:
             f.write(new_content)
+        notify_file_changed(path)
         return f"Successfully edited {path}"
     except Exception as e:
         return f"Error writing file: {e}"
@@ -178,48 +189,75 @@ register_tool(
 # =============================================================================
 
 def _search_files(arguments: dict, working_dir: str) -> str:
-    """Search for files by pattern or content."""
+    """Search for files by name or content using the run's workspace index."""
     valid, path = validate_path(arguments["path"], working_dir)
     if not valid:
         return f"Error: {path}"
     
+    if not os.path.isdir(path):
+        return f"Error: Not a directory: {path}"
+    
     pattern = arguments["pattern"]
     content_search = arguments.get("content_search", False)
+    offset = max(int(arguments.get("offset", 0)), 0)
+    limit = max(min(int(arguments.get("limit", SEARCH_PAGE_SIZE)), 500), 1)
     
-    if content_search:
-        # Grep for content
-        try:
-            result = subprocess.run(
-                ["grep", "-rn", "--include=*", pattern, path],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            output = result.stdout
-            if len(output) > 5000:
-                output = output[:5000] + "\n... (truncated)"
-            return output if output.strip() else "No matches found"
-        except subprocess.TimeoutExpired:
-            return "Error: Search timed out"
-        except Exception as e:
-            return f"Error: {e}"
-    else:
-        # Glob for file patterns
-        matches = glob(os.path.join(path, pattern), recursive=True)
+    index = get_workspace_index(path)
+    
+    if not content_search:
+        matches = index.search_names(pattern, path)
         if not matches:
             return "No files found matching pattern"
-        return "\n".join(matches[:100])
+        page = matches[offset:offset + limit]
+        header = _page_header(offset, len(page), len(matches), "files")
+        return "\n".join([header] + page)
+    
+    try:
+        results = index.search_content(
+            pattern,
+            path,
+            regex=arguments.get("regex", False),
+            case_sensitive=arguments.get("case_sensitive", True),
+        )
+    except re.error as e:
+        return f"Error: Invalid regex: {e}"
+    
+    if not results:
+        return "No matches found"
+    
+    # Flatten to grep-style lines, keeping the per-file ranking
+    lines = [
+        f"{file_path}:{line_no}: {line.strip()[:300]}"
+        for file_path, file_lines in results
+        for line_no, line in file_lines
+    ]
+    page = lines[offset:offset + limit]
+    header = _page_header(offset, len(page), len(lines), f"matches in {len(results)} files")
+    return "\n".join([header] + page)
+
+
+def _page_header(offset: int, shown: int, total: int, noun: str) -> str:
+    """Pagination header so the model knows whether to ask for more."""
+    if shown == 0:
+        return f"No results at offset {offset} ({total} {noun} total)"
+    header = f"Showing {offset + 1}-{offset + shown} of {total} {noun}"
+    if offset + shown < total:
+        header += f" (use offset={offset + shown} for more)"
+    return header
 
 
 register_tool(
     name="search_files",
-    description="Search for files matching a pattern or content. Uses glob for file patterns, grep for content.",
+    description=(
+        "Search for files by name (glob, e.g. '**/*.py', or a name fragment) or by content. "
+        "Results are ranked and paginated; .gitignored files are skipped."
+    ),
     parameters={
         "type": "object",
         "properties": {
             "pattern": {
                 "type": "string",
-                "description": "Glob pattern (e.g., '**/*.py') or text to search for"
+                "description": "Glob pattern (e.g., '**/*.py'), file name fragment, or text to search for"
             },
             "path": {
                 "type": "string",
@@ -229,10 +267,31 @@ register_tool(
                 "type": "boolean",
                 "description": "If true, search file contents. If false (default), search file names.",
                 "default": False
+            },
+            "regex": {
+                "type": "boolean",
+                "description": "Treat pattern as a regular expression for content search (default: literal text)",
+                "default": False
+            },
+            "case_sensitive": {
+                "type": "boolean",
+                "description": "Case-sensitive content search (default: true)",
+                "default": True
+            },
+            "offset": {
+                "type": "integer",
+                "description": "Number of results to skip (for pagination)",
+                "default": 0
+            },
+            "limit": {
+                "type": "integer",
+                "description": f"Maximum results to return (default: {SEARCH_PAGE_SIZE})",
+                "default": SEARCH_PAGE_SIZE
             }
         },
         "required": ["pattern", "path"]
     },
+    read_only=True,
     handler=_search_files
 )
 
@@ -280,5 +339,6 @@ register_tool(
         },
         "required": ["path"]
     },
+    read_only=True,
     handler=_list_directory
 )
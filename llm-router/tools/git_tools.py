@@ -18,6 +18,7 @@ from typing import Optional
 
 from .security import validate_path, validate_git_repo, validate_command
 from .registry import register_tool
+from .executor import run_subprocess
 
 # =============================================================================
 # Helpers
@@ -35,11 +36,9 @@ def _run_git_command(
         (success, output_or_error)
     """
     try:
-        result = subprocess.run(
+        result = run_subprocess(
             command,
             cwd=repo_path,
-            capture_output=True,
-            text=True,
             timeout=timeout
         )
         
@@ -104,6 +103,7 @@ register_tool(
         },
         "required": []
     },
+    read_only=True,
     handler=_git_status
 )
 
@@ -172,6 +172,7 @@ register_tool(
         },
         "required": []
     },
+    read_only=True,
     handler=_git_diff
 )
 
@@ -229,6 +230,7 @@ register_tool(
         },
         "required": []
     },
+    read_only=True,
     handler=_git_log
 )
 
@@ -23,12 +23,16 @@ TOOL_REGISTRY: dict[str, Callable[[dict, str], str]] = {}
 # OpenAI function definitions for each tool
 TOOL_DEFINITIONS: list[dict] = []
 
+# Tools with no side effects; these may run concurrently within one model turn
+READ_ONLY_TOOLS: set[str] = set()
+
 
 def register_tool(
     name: str,
     description: str,
     parameters: dict,
-    handler: Callable[[dict, str], str]
+    handler: Callable[[dict, str], str],
+    read_only: bool = False
 ):
     """
     Register a tool with the registry.
@@ -38,8 +42,11 @@ def register_tool(
         description: Description for the LLM
         parameters: JSON Schema for parameters
         handler: Function to execute the tool
+        read_only: True if the tool never mutates state (safe to run in parallel)
     """
     TOOL_REGISTRY[name] = handler
+    if read_only:
+        READ_ONLY_TOOLS.add(name)
     
     TOOL_DEFINITIONS.append({
         "type": "function",
@@ -58,6 +65,11 @@ def get_tool_definitions() -> list[dict]:
     return TOOL_DEFINITIONS
 
 
+def is_read_only_tool(name: str) -> bool:
+    """Whether a tool is side-effect free and may run concurrently with others."""
+    return name in READ_ONLY_TOOLS
+
+
 def execute_tool(name: str, arguments: dict, working_dir: str) -> str:
     """
     Execute a tool by name.
@@ -4,6 +4,7 @@ import logging
 import json
 
 from .registry import register_tool
+from .executor import run_subprocess
 
 logger = logging.getLogger(__name__)
 
@@ -127,10 +128,8 @@ def _run_on_server(arguments: dict, working_dir: str) -> str:
     
     try:
         logger.info(f"Executing on server: {command[:100]}...")
-        result = subprocess.run(
+        result = run_subprocess(
             ssh_cmd,
-            capture_output=True,
-            text=True,
             timeout=SSH_TIMEOUT
         )
         
@@ -198,6 +197,7 @@ register_tool(
         },
         "required": []
     },
+    read_only=True,
     handler=_docker_ps
 )
 
@@ -257,6 +257,7 @@ register_tool(
         },
         "required": ["container"]
     },
+    read_only=True,
     handler=_docker_logs
 )
 
@@ -334,5 +335,6 @@ register_tool(
         },
         "required": ["container"]
     },
+    read_only=True,
     handler=_docker_inspect
 )
@@ -10,6 +10,7 @@ import subprocess
 
 from .security import validate_path, validate_command, SHELL_TIMEOUT
 from .registry import register_tool
+from .executor import run_subprocess
 
 # =============================================================================
 # Run Shell Tool
@@ -32,12 +33,10 @@ def _run_shell(arguments: dict, working_dir: str) -> str:
         return f"Error: {error}"
     
     try:
-        result = subprocess.run(
+        result = run_subprocess(
             command,
             shell=True,
             cwd=resolved_dir,
-            capture_output=True,
-            text=True,
             timeout=arguments.get("timeout", SHELL_TIMEOUT)
         )
         
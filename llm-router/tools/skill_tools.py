@@ -164,6 +164,7 @@ register_tool(
         },
         "required": []
     },
+    read_only=True,
     handler=_list_skills
 )
 
@@ -249,6 +250,7 @@ register_tool(
         },
         "required": ["name"]
     },
+    read_only=True,
     handler=_read_skill
 )
 
@@ -361,5 +363,6 @@ register_tool(
         },
         "required": ["query"]
     },
+    read_only=True,
     handler=_search_skills
 )
@@ -0,0 +1,507 @@
+"""Per-run workspace file index for the agent file tools.
+
+The first search in a directory walks it once (respecting .gitignore) and
+records every file with its mtime and size. Later name and content searches
+in that run are served from memory: file names come from the index, and file
+contents come from a byte-bounded cache keyed by (mtime, size).
+
+write_file/edit_file update the index in place. Other mutating tools
+(run_shell, git_checkout, ...) mark it stale, and the next search does a
+stat-only rescan that re-reads only files that changed.
+
+An optional trigram index (AGENT_INDEX_TRIGRAMS=1) narrows literal content
+searches to candidate files. It costs a few hundred ms per MB to build, so it
+only pays off on repositories too large for the content cache.
+"""
+
+import os
+import re
+import time
+import functools
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAX_FILES = int(os.getenv("AGENT_INDEX_MAX_FILES", "50000"))
+INDEX_MAX_FILE_SIZE = int(os.getenv("AGENT_INDEX_MAX_FILE_SIZE", str(512 * 1024)))
+INDEX_CACHE_BYTES = int(os.getenv("AGENT_INDEX_CACHE_BYTES", str(128 * 1024 * 1024)))
+INDEX_TRIGRAMS = os.getenv("AGENT_INDEX_TRIGRAMS", "0") == "1"
+
+# Directories never worth indexing, even without a .gitignore
+ALWAYS_SKIP_DIRS = {".git", "node_modules", "__pycache__", ".venv", ".mypy_cache", ".pytest_cache"}
+
+
+# =============================================================================
+# .gitignore matching
+# =============================================================================
+
+def _glob_to_regex(pattern: str) -> str:
+    """Translate a gitignore-style glob ('*' within a segment, '**' across) to a regex."""
+    i, out = 0, []
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            j = pattern.find("]", i)
+            if j == -1:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                out.append(pattern[i:j + 1])
+                i = j + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+@dataclass
+class _IgnoreRule:
+    regex: re.Pattern
+    negate: bool
+    dir_only: bool
+
+
+class GitIgnore:
+    """Minimal .gitignore matcher: anchoring, '**', dir-only rules and negation."""
+
+    def __init__(self):
+        # base directory (relative, "" for root) -> rules from that directory's .gitignore
+        self._rules: dict[str, list[_IgnoreRule]] = {}
+
+    def load(self, base: str, gitignore_path: str) -> None:
+        try:
+            with open(gitignore_path, "r", errors="ignore") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+
+        rules = []
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            line = line.lstrip("/")
+            body = _glob_to_regex(line)
+            regex = re.compile(f"^{body}$" if anchored else f"^(?:.*/)?{body}$")
+            rules.append(_IgnoreRule(regex=regex, negate=negate, dir_only=dir_only))
+
+        if rules:
+            self._rules[base] = rules
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        ignored = False
+        for base, rules in self._rules.items():
+            if base and not rel_path.startswith(base + "/"):
+                continue
+            sub = rel_path[len(base) + 1:] if base else rel_path
+            for rule in rules:
+                if rule.dir_only and not is_dir:
+                    continue
+                if rule.regex.match(sub):
+                    ignored = not rule.negate
+        return ignored
+
+
+# =============================================================================
+# Index
+# =============================================================================
+
+@dataclass
+class FileEntry:
+    mtime: float
+    size: int
+
+
+def _locked(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _trigrams(text: str) -> set[str]:
+    low = text.lower()
+    return {low[i:i + 3] for i in range(len(low) - 2)}
+
+
+class WorkspaceIndex:
+    """In-memory index of one directory tree."""
+
+    def __init__(
+        self,
+        root: str,
+        max_files: int = INDEX_MAX_FILES,
+        max_file_size: int = INDEX_MAX_FILE_SIZE,
+        cache_bytes: int = INDEX_CACHE_BYTES,
+        trigrams: bool = INDEX_TRIGRAMS,
+    ):
+        self.root = os.path.realpath(root)
+        self.max_files = max_files
+        self.max_file_size = max_file_size
+        self.cache_bytes = cache_bytes
+        self.use_trigrams = trigrams
+
+        self.files: dict[str, FileEntry] = {}
+        # Relative directories the walk pruned (ALWAYS_SKIP_DIRS or .gitignore)
+        self.skipped_dirs: set[str] = set()
+        self.truncated = False
+        self.stale = False
+        self.built_at = 0.0
+        self.build_ms = 0.0
+
+        # Batched read-only tool calls may search the same index concurrently
+        self._lock = threading.RLock()
+        self._content: OrderedDict[str, tuple[float, int, Optional[str]]] = OrderedDict()
+        self._content_bytes = 0
+        self._trigrams: dict[str, set[str]] = {}
+        self._file_trigrams: dict[str, set[str]] = {}
+
+    # -------------------------------------------------------------------------
+    # Building
+    # -------------------------------------------------------------------------
+
+    def _walk(self) -> dict[str, FileEntry]:
+        gitignore = GitIgnore()
+        found: dict[str, FileEntry] = {}
+        skipped: set[str] = set()
+        self.truncated = False
+        self.skipped_dirs = skipped
+
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            rel_dir = os.path.relpath(dirpath, self.root)
+            rel_dir = "" if rel_dir == "." else rel_dir
+
+            if ".gitignore" in filenames:
+                gitignore.load(rel_dir, os.path.join(dirpath, ".gitignore"))
+
+            kept = []
+            for d in sorted(dirnames):
+                rel = f"{rel_dir}/{d}" if rel_dir else d
+                if d in ALWAYS_SKIP_DIRS or gitignore.is_ignored(rel, is_dir=True):
+                    skipped.add(rel)
+                    continue
+                kept.append(d)
+            dirnames[:] = kept
+
+            for name in filenames:
+                rel = f"{rel_dir}/{name}" if rel_dir else name
+                if gitignore.is_ignored(rel, is_dir=False):
+                    continue
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                found[rel] = FileEntry(mtime=st.st_mtime, size=st.st_size)
+                if len(found) >= self.max_files:
+                    self.truncated = True
+                    logger.warning(f"Workspace index for {self.root} truncated at {self.max_files} files")
+                    return found
+
+        return found
+
+    @_locked
+    def build(self) -> "WorkspaceIndex":
+        """Walk the tree and (optionally) build the trigram index."""
+        start = time.time()
+        self.files = self._walk()
+        self._content.clear()
+        self._content_bytes = 0
+        self._trigrams.clear()
+        self._file_trigrams.clear()
+        if self.use_trigrams:
+            for rel in self.files:
+                self._index_trigrams(rel)
+        self.stale = False
+        self.built_at = time.time()
+        self.build_ms = (self.built_at - start) * 1000
+        logger.info(f"Indexed {len(self.files)} files under {self.root} in {self.build_ms:.0f}ms")
+        return self
+
+    @_locked
+    def refresh(self) -> None:
+        """Stat-only rescan after external changes; re-reads only changed files."""
+        current = self._walk()
+        for rel in set(self.files) - set(current):
+            self._forget(rel)
+        for rel, entry in current.items():
+            old = self.files.get(rel)
+            if old is None or old.mtime != entry.mtime or old.size != entry.size:
+                self.files[rel] = entry
+                self._drop_content(rel)
+                if self.use_trigrams:
+                    self._index_trigrams(rel)
+        self.stale = False
+
+    @_locked
+    def ensure_fresh(self) -> None:
+        if not self.built_at:
+            self.build()
+        elif self.stale:
+            self.refresh()
+
+    def contains(self, path: str) -> bool:
+        path = os.path.realpath(path)
+        return path == self.root or path.startswith(self.root + os.sep)
+
+    @_locked
+    def covers(self, path: str) -> bool:
+        """True if the walk reached ``path``, i.e. it is not inside a skipped directory."""
+        if not self.contains(path):
+            return False
+        scope = self._scope(path)
+        return not any(scope == d or scope.startswith(d + "/") for d in self.skipped_dirs)
+
+    @_locked
+    def update_file(self, path: str) -> None:
+        """Re-index one file after the agent wrote or edited it."""
+        rel = os.path.relpath(os.path.realpath(path), self.root)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._forget(rel)
+            return
+        self.files[rel] = FileEntry(mtime=st.st_mtime, size=st.st_size)
+        self._drop_content(rel)
+        if self.use_trigrams:
+            self._index_trigrams(rel)
+
+    def _forget(self, rel: str) -> None:
+        self.files.pop(rel, None)
+        self._drop_content(rel)
+        for gram in self._file_trigrams.pop(rel, ()):
+            postings = self._trigrams.get(gram)
+            if postings:
+                postings.discard(rel)
+
+    def _index_trigrams(self, rel: str) -> None:
+        for gram in self._file_trigrams.pop(rel, ()):
+            postings = self._trigrams.get(gram)
+            if postings:
+                postings.discard(rel)
+        text = self.read_text(rel)
+        if text is None:
+            return
+        grams = _trigrams(text)
+        self._file_trigrams[rel] = grams
+        for gram in grams:
+            self._trigrams.setdefault(gram, set()).add(rel)
+
+    # -------------------------------------------------------------------------
+    # Content cache
+    # -------------------------------------------------------------------------
+
+    def _drop_content(self, rel: str) -> None:
+        cached = self._content.pop(rel, None)
+        if cached and cached[2] is not None:
+            self._content_bytes -= len(cached[2])
+
+    @_locked
+    def read_text(self, rel: str) -> Optional[str]:
+        """
+        File text from the cache, re-read if its mtime/size changed.
+
+        Returns None for binary, oversized or unreadable files.
+        """
+        abs_path = os.path.join(self.root, rel)
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            return None
+
+        cached = self._content.get(rel)
+        if cached and cached[0] == st.st_mtime and cached[1] == st.st_size:
+            self._content.move_to_end(rel)
+            return cached[2]
+
+        self._drop_content(rel)
+        text = None
+        if st.st_size <= self.max_file_size:
+            try:
+                with open(abs_path, "rb") as f:
+                    data = f.read()
+                if b"\x00" not in data[:8192]:
+                    text = data.decode("utf-8", errors="replace")
+            except OSError:
+                return None
+
+        self._content[rel] = (st.st_mtime, st.st_size, text)
+        if text is not None:
+            self._content_bytes += len(text)
+            while self._content_bytes > self.cache_bytes and len(self._content) > 1:
+                _, (_, _, evicted) = self._content.popitem(last=False)
+                if evicted is not None:
+                    self._content_bytes -= len(evicted)
+        return text
+
+    # -------------------------------------------------------------------------
+    # Search
+    # -------------------------------------------------------------------------
+
+    def _scope(self, base: str) -> str:
+        rel = os.path.relpath(os.path.realpath(base), self.root)
+        return "" if rel == "." else rel
+
+    @staticmethod
+    def _in_scope(rel: str, scope: str) -> bool:
+        return not scope or rel.startswith(scope + "/")
+
+    @staticmethod
+    def _rank_key(rel: str) -> tuple[int, str]:
+        return (rel.count("/"), rel)
+
+    @_locked
+    def search_names(self, pattern: str, base: str) -> list[str]:
+        """
+        Files under ``base`` matching a glob pattern (relative to ``base``).
+
+        A pattern without glob characters matches as a substring of the file
+        name at any depth. Results are ranked shallowest-first.
+        """
+        self.ensure_fresh()
+        scope = self._scope(base)
+
+        if not any(c in pattern for c in "*?["):
+            needle = pattern.lower()
+            matches = [
+                rel for rel in self.files
+                if self._in_scope(rel, scope) and needle in os.path.basename(rel).lower()
+            ]
+        else:
+            regex = re.compile(f"^{_glob_to_regex(pattern)}$")
+            offset = len(scope) + 1 if scope else 0
+            matches = [
+                rel for rel in self.files
+                if self._in_scope(rel, scope) and regex.match(rel[offset:])
+            ]
+
+        return [os.path.join(self.root, rel) for rel in sorted(matches, key=self._rank_key)]
+
+    @_locked
+    def search_content(
+        self,
+        pattern: str,
+        base: str,
+        regex: bool = False,
+        case_sensitive: bool = True,
+    ) -> list[tuple[str, list[tuple[int, str]]]]:
+        """
+        Lines matching ``pattern`` in files under ``base``.
+
+        Returns (absolute_path, [(line_number, line), ...]) per file, ranked by
+        number of matches, then shallowest path first.
+        """
+        self.ensure_fresh()
+        scope = self._scope(base)
+
+        flags = 0 if case_sensitive else re.IGNORECASE
+        matcher = re.compile(pattern if regex else re.escape(pattern), flags)
+
+        candidates = [rel for rel in self.files if self._in_scope(rel, scope)]
+        if self.use_trigrams and not regex and len(pattern) >= 3:
+            postings = [self._trigrams.get(g, set()) for g in _trigrams(pattern)]
+            narrowed = set.intersection(*postings) if postings else set()
+            candidates = [rel for rel in candidates if rel in narrowed]
+
+        results = []
+        for rel in candidates:
+            text = self.read_text(rel)
+            if not text or not matcher.search(text):
+                continue
+            lines = [
+                (i, line) for i, line in enumerate(text.splitlines(), start=1)
+                if matcher.search(line)
+            ]
+            if lines:
+                results.append((rel, lines))
+
+        results.sort(key=lambda r: (-len(r[1]),) + self._rank_key(r[0]))
+        return [(os.path.join(self.root, rel), lines) for rel, lines in results]
+
+
+# =============================================================================
+# Per-run lookup
+# =============================================================================
+
+def get_workspace_index(path: str) -> WorkspaceIndex:
+    """
+    Get the index covering ``path`` for the current agent run.
+
+    Indexes live on the run's ToolRunContext, so each is built once per run
+    and dropped with it. Outside a run a throwaway index is built. A path
+    inside a directory an existing index skipped (node_modules, a gitignored
+    build/ ...) gets its own index rooted there.
+    """
+    from .executor import current_tool_run
+
+    run = current_tool_run()
+    if run is None:
+        return WorkspaceIndex(path)
+
+    for index in _run_indexes(run):
+        if index.contains(path):
+            index.ensure_fresh()
+            if index.covers(path):
+                return index
+
+    # Check-and-insert under the lock so parallel tool calls share one index per root
+    with run.workspace_lock:
+        root = os.path.realpath(path)
+        index = run.workspace_indexes.get(root)
+        if index is None:
+            index = run.workspace_indexes[root] = WorkspaceIndex(root)
+    return index
+
+
+def _run_indexes(run) -> list[WorkspaceIndex]:
+    with run.workspace_lock:
+        return list(run.workspace_indexes.values())
+
+
+def read_cached_text(path: str) -> Optional[str]:
+    """File text from a built index of the current run, or None if not covered."""
+    from .executor import current_tool_run
+
+    run = current_tool_run()
+    if run is None:
+        return None
+    for index in _run_indexes(run):
+        if index.built_at and index.covers(path):
+            return index.read_text(os.path.relpath(os.path.realpath(path), index.root))
+    return None
+
+
+def notify_file_changed(path: str) -> None:
+    """Update any of the current run's indexes that cover a written file."""
+    from .executor import current_tool_run
+
+    run = current_tool_run()
+    if run is None:
+        return
+    for index in _run_indexes(run):
+        if index.built_at and index.covers(path):
+            index.update_file(path)
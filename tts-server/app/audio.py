@@ -0,0 +1,190 @@
+"""
+Text chunking, PCM/WAV helpers and compressed encoding for synthesis.
+
+Long inputs are split into sentence-sized chunks so the first chunk can be
+played while later ones are still being generated. mp3/opus/aac/flac are
+produced by an ffmpeg process fed PCM on stdin, so encoding runs outside the
+event loop and output streams as soon as the encoder emits it.
+"""
+
+import os
+import re
+import struct
+import asyncio
+import logging
+from typing import AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+# Chunks shorter than this are merged with the next sentence (very short
+# fragments synthesize with odd prosody)
+MIN_CHUNK_CHARS = 40
+
+# Sentences longer than this are split further at clause boundaries
+MAX_CHUNK_CHARS = 300
+
+# Closing quotes/brackets stay with their sentence. Lookbehinds must be fixed
+# width, so up to two closers (e.g. `!")`) are matched as separate branches.
+_SENTENCE_END = re.compile(
+    r"(?:(?<=[.!?…])|(?<=[.!?…][\"')\]])|(?<=[.!?…][\"')\]]{2}))\s+|\n{2,}"
+)
+_CLAUSE_END = re.compile(r"(?<=[,;:—])\s+")
+
+# Sizes used in streamed WAV headers, where the length is not known up front
+_UNKNOWN_SIZE = 0xFFFFFFFF
+
+MP3_BITRATE = os.getenv("TTS_MP3_BITRATE", "64k")
+OPUS_BITRATE = os.getenv("TTS_OPUS_BITRATE", "32k")
+AAC_BITRATE = os.getenv("TTS_AAC_BITRATE", "64k")
+
+# response_format -> (ffmpeg output arguments, media type)
+ENCODERS = {
+    "mp3": (["-c:a", "libmp3lame", "-b:a", MP3_BITRATE, "-f", "mp3"], "audio/mpeg"),
+    "opus": (["-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip", "-f", "ogg"], "audio/opus"),
+    "aac": (["-c:a", "aac", "-b:a", AAC_BITRATE, "-f", "adts"], "audio/aac"),
+    "flac": (["-c:a", "flac", "-f", "flac"], "audio/flac"),
+}
+
+MEDIA_TYPES = {
+    "wav": "audio/wav",
+    "pcm": "audio/pcm",
+    **{fmt: media_type for fmt, (_, media_type) in ENCODERS.items()},
+}
+
+ENCODER_READ_SIZE = 16 * 1024
+
+
+def _split_long(sentence: str, max_chars: int) -> list[str]:
+    """Split an over-long sentence at clause boundaries, then at spaces."""
+    parts = []
+    current = ""
+    for clause in _CLAUSE_END.split(sentence):
+        while len(clause) > max_chars:
+            cut = clause.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(clause[:cut].strip())
+            clause = clause[cut:].strip()
+        if current and len(current) + len(clause) + 1 > max_chars:
+            parts.append(current)
+            current = clause
+        else:
+            current = f"{current} {clause}".strip()
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_sentences(
+    text: str,
+    min_chars: int = MIN_CHUNK_CHARS,
+    max_chars: int = MAX_CHUNK_CHARS,
+) -> list[str]:
+    """
+    Split text into synthesis chunks of roughly one sentence each.
+
+    Short sentences are merged forward and long ones are split at clause
+    boundaries, so every chunk is between min_chars and max_chars where the
+    text allows it.
+    """
+    chunks = []
+    pending = ""
+    for sentence in _SENTENCE_END.split(text.strip()):
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+        for part in _split_long(sentence, max_chars) if len(sentence) > max_chars else [sentence]:
+            pending = f"{pending} {part}".strip()
+            if len(pending) >= min_chars:
+                chunks.append(pending)
+                pending = ""
+    if pending:
+        if chunks and len(chunks[-1]) + len(pending) + 1 <= max_chars:
+            chunks[-1] = f"{chunks[-1]} {pending}"
+        else:
+            chunks.append(pending)
+    return chunks
+
+
+def tensor_to_pcm16(wav) -> bytes:
+    """Convert a (channels, samples) float tensor in [-1, 1] to 16-bit little-endian PCM."""
+    import torch
+
+    samples = (wav.detach().float().clamp(-1.0, 1.0) * 32767.0).to(torch.int16)
+    # Interleave channels: (channels, samples) -> (samples, channels)
+    return samples.t().contiguous().cpu().numpy().astype("<i2").tobytes()
+
+
+def wav_header(sample_rate: int, channels: int = 1, data_size: int = _UNKNOWN_SIZE) -> bytes:
+    """
+    RIFF/WAVE header for 16-bit PCM.
+
+    With the default data_size the header describes a stream of unknown
+    length, which browsers, ffmpeg and most players accept.
+    """
+    byte_rate = sample_rate * channels * 2
+    riff_size = _UNKNOWN_SIZE if data_size == _UNKNOWN_SIZE else 36 + data_size
+    return (
+        b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, channels * 2, 16)
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+
+async def encode_stream(
+    pcm_chunks: AsyncIterator[bytes],
+    sample_rate: int,
+    response_format: str,
+    channels: int = 1,
+) -> AsyncIterator[bytes]:
+    """
+    Encode a stream of 16-bit PCM with ffmpeg, yielding output as it is produced.
+
+    Raises:
+        RuntimeError: If ffmpeg exits with an error
+    """
+    output_args, _ = ENCODERS[response_format]
+    proc = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin",
+        "-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+        *output_args, "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+    async def feed():
+        try:
+            async for chunk in pcm_chunks:
+                proc.stdin.write(chunk)
+                await proc.stdin.drain()
+        finally:
+            proc.stdin.close()
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while True:
+            data = await proc.stdout.read(ENCODER_READ_SIZE)
+            if not data:
+                break
+            yield data
+        await feeder
+        if await proc.wait() != 0:
+            error = (await proc.stderr.read()).decode(errors="replace").strip()
+            raise RuntimeError(f"ffmpeg {response_format} encoding failed: {error}")
+    finally:
+        feeder.cancel()
+        await asyncio.gather(feeder, return_exceptions=True)
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+
+async def encode_bytes(pcm: bytes, sample_rate: int, response_format: str, channels: int = 1) -> bytes:
+    """Encode a complete PCM buffer."""
+    async def single():
+        yield pcm
+
+    return b"".join([data async for data in encode_stream(single(), sample_rate, response_format, channels)])
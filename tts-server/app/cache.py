@@ -0,0 +1,173 @@
+"""
+Caches for speech synthesis.
+
+- VoiceConditionings: speaker conditionings computed from voices/{name}.wav
+  once and reused, keyed by the clip's content hash. A clip is only re-hashed
+  when its size or mtime changes, so editing or replacing it invalidates the
+  entry.
+- AudioCache: LRU disk cache of finished responses keyed by
+  (model, text, voice hash, format, speed, stream). Repeated phrases, such as
+  Home Assistant notifications, are served from disk without touching the GPU.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+VOICE_CACHE_SIZE = int(os.getenv("TTS_VOICE_CACHE_SIZE", "16"))
+AUDIO_CACHE_DIR = Path(os.getenv("TTS_CACHE_DIR", "/app/cache/audio"))
+AUDIO_CACHE_MB = int(os.getenv("TTS_CACHE_MB", "512"))  # 0 = disabled
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class VoiceConditionings:
+    """Precomputed model conditionings per voice clip (LRU, by content hash)."""
+
+    def __init__(self, max_voices: int = VOICE_CACHE_SIZE):
+        self.max_voices = max_voices
+        self._hashes: dict[str, tuple[int, int, str]] = {}
+        self._conds: OrderedDict[str, Any] = OrderedDict()
+
+    def voice_hash(self, path: str) -> str:
+        """Content hash of a clip, recomputed only when its size or mtime changes."""
+        stat = os.stat(path)
+        known = self._hashes.get(path)
+        if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+            return known[2]
+        sha = file_sha256(path)
+        self._hashes[path] = (stat.st_mtime_ns, stat.st_size, sha)
+        return sha
+
+    def get(self, model, path: str):
+        """
+        Conditionings for a clip, computing them on first use.
+
+        Calls model.prepare_conditionals, which replaces model.conds, so it
+        must be called on the inference worker thread, like every model call.
+        """
+        sha = self.voice_hash(path)
+        conds = self._conds.get(sha)
+        if conds is not None:
+            self._conds.move_to_end(sha)
+            return conds
+
+        # Same arguments generate() uses for audio_prompt_path
+        model.prepare_conditionals(path, exaggeration=0.0)
+        conds = model.conds
+        self._conds[sha] = conds
+        while len(self._conds) > self.max_voices:
+            self._conds.popitem(last=False)
+        logger.info(f"Prepared voice conditioning for {Path(path).name} ({sha[:12]})")
+        return conds
+
+
+class AudioCache:
+    """Size-bounded LRU of synthesized audio on disk."""
+
+    def __init__(self, root: Path = AUDIO_CACHE_DIR, max_bytes: int = AUDIO_CACHE_MB * 1024 * 1024):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._total: Optional[int] = None
+        # Stores run on worker threads; serialise accounting and eviction
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(**fields) -> str:
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Cached file for a key, marked as recently used."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def store(self, key: str, data: bytes) -> None:
+        """Write an entry atomically (blocking; call from a worker thread)."""
+        if not self.enabled or not data or len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_name, path)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+        with self._lock:
+            if self._total is None:
+                self._total = sum(size for _, size, _ in self._entries())
+            else:
+                self._total += len(data)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in self.root.glob("*/*"):
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self) -> None:
+        """Remove least recently used entries down to 90% of the budget."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        self._total = total
+        logger.info(f"Evicted {evicted} cached audio files ({total // (1024 * 1024)} MB kept)")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "size_mb": round((self._total or 0) / (1024 * 1024), 1),
+        }
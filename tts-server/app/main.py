@@ -5,19 +5,33 @@ Designed to integrate with the local-ai manager system alongside
 vLLM (text) and Diffusers (image) containers.
 """
 
-import io
 import os
 import time
+import asyncio
 import logging
+from contextlib import aclosing
 from pathlib import Path
 from typing import Optional, Literal
 
 import torch
-import torchaudio as ta
 from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel, Field
 
+from app.audio import (
+    ENCODERS,
+    MEDIA_TYPES,
+    encode_bytes,
+    encode_stream,
+    split_sentences,
+    tensor_to_pcm16,
+    wav_header,
+)
+from app.cache import AudioCache, VoiceConditionings
+from app.worker import InferenceWorker, QueueFullError
+
 # Configure logging
 logging.basicConfig(
     level=os.getenv("LOG_LEVEL", "INFO"),
@@ -29,10 +43,17 @@ logger = logging.getLogger(__name__)
 model = None
 device = None
 model_loaded = False
+default_conds = None  # built-in voice conditioning, restored for "default"
 
 # Configuration
+TTS_MODEL = os.getenv("TTS_MODEL", "chatterbox-turbo")  # "standin" for CPU-only tests
 VOICES_DIR = Path(os.getenv("VOICES_DIR", "/app/voices"))
 DEFAULT_VOICE_PATH = os.getenv("DEFAULT_VOICE_PATH", None)
+# Sentence chunks generated ahead of what the client has consumed when streaming
+STREAM_LOOKAHEAD = int(os.getenv("TTS_STREAM_LOOKAHEAD", "2"))
+
+voice_conditionings = VoiceConditionings()
+audio_cache = AudioCache()
 
 
 class SpeechRequest(BaseModel):
@@ -42,9 +63,13 @@ class SpeechRequest(BaseModel):
     voice: str = Field(default="default", description="Voice reference clip name")
     response_format: Literal["wav", "mp3", "opus", "aac", "flac", "pcm"] = Field(
         default="wav", 
-        description="Audio format (currently only wav supported)"
+        description="Audio format (aac is ADTS, opus is Ogg, pcm is raw 16-bit little-endian mono)"
     )
     speed: float = Field(default=1.0, ge=0.25, le=4.0, description="Speed (not yet implemented)")
+    stream: bool = Field(
+        default=False,
+        description="Stream audio sentence by sentence as it is generated"
+    )
 
 
 def get_gpu_memory():
@@ -58,12 +83,22 @@ def get_gpu_memory():
 
 def load_model():
     """Load Chatterbox Turbo model."""
-    global model, device, model_loaded
+    global model, device, model_loaded, default_conds
     
     logger.info("Loading Chatterbox Turbo model...")
     start_time = time.time()
     
     try:
+        if TTS_MODEL == "standin":
+            from app.standin import StandInTTS
+            
+            model = StandInTTS()
+            device = "cpu"
+            default_conds = model.conds
+            model_loaded = True
+            logger.warning("Using stand-in TTS model (test tone output)")
+            return True
+        
         from chatterbox.tts_turbo import ChatterboxTurboTTS
         
         # Determine device
@@ -76,6 +111,7 @@ def load_model():
         
         # Load model
         model = ChatterboxTurboTTS.from_pretrained(device=device)
+        default_conds = model.conds
         model_loaded = True
         
         elapsed = time.time() - start_time
@@ -92,9 +128,36 @@ def load_model():
         return False
 
 
+def synthesize(text: str, voice_path: Optional[str]):
+    """Run the model on one piece of text (called on the inference worker thread)."""
+    # Conditionings are cached per clip instead of being recomputed from
+    # the reference audio on every call (generate's audio_prompt_path)
+    if voice_path:
+        model.conds = voice_conditionings.get(model, voice_path)
+    elif default_conds is not None:
+        model.conds = default_conds
+    return model.generate(text)
+
+
+def synthesize_batch(texts: list[str], voice_path: Optional[str]) -> list:
+    """Run the model on several short texts for one voice in a single call."""
+    if voice_path:
+        model.conds = voice_conditionings.get(model, voice_path)
+    elif default_conds is not None:
+        model.conds = default_conds
+    return model.generate_batch(texts)
+
+
 # Load model on import (server startup)
 load_model()
 
+# All model calls run on this worker's thread, never on the event loop
+worker = InferenceWorker(
+    synthesize,
+    synthesize_batch if hasattr(model, "generate_batch") else None,
+)
+worker.start()
+
 app = FastAPI(
     title="TTS Inference Server",
     description="OpenAI-compatible TTS API using Chatterbox Turbo",
@@ -132,9 +195,17 @@ async def health():
         "device": device or "unknown",
         "vram_used_mb": vram_used,
         "vram_total_mb": vram_total,
+        "audio_cache": audio_cache.stats(),
+        "worker": worker.stats(),
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics (queue depth, queue wait, generation time, batch size)."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/v1/models")
 async def list_models():
     """List available models (OpenAI-compatible, used by manager for health check)."""
@@ -168,6 +239,128 @@ async def list_voices():
     }
 
 
+def resolve_voice_path(voice: str) -> Optional[str]:
+    """Reference clip for a voice name, or None for the built-in voice."""
+    if voice and voice != "default":
+        voice_file = VOICES_DIR / f"{voice}.wav"
+        if voice_file.exists():
+            return str(voice_file)
+        if Path(voice).exists():
+            return voice
+        raise HTTPException(
+            status_code=400,
+            detail=f"Voice '{voice}' not found"
+        )
+    if DEFAULT_VOICE_PATH and Path(DEFAULT_VOICE_PATH).exists():
+        return DEFAULT_VOICE_PATH
+    return None
+
+
+async def submit_when_ready(text: str, voice_path: Optional[str]):
+    """
+    Submit a chunk of an already-started stream, waiting for queue space.
+
+    Once headers are sent a full queue can no longer become a 503, so later
+    chunks wait for room (up to the worker timeout) instead of ending the
+    stream early.
+    """
+    deadline = time.monotonic() + worker.timeout
+    while True:
+        try:
+            return await worker.submit(text, voice_path)
+        except QueueFullError:
+            if time.monotonic() >= deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def generate_pcm(chunks: list[str], voice_path: Optional[str]):
+    """
+    Yield 16-bit PCM for each text chunk as soon as it is generated.
+
+    Generation runs at most STREAM_LOOKAHEAD chunks ahead of the consumer, so
+    a slow or disconnected client does not keep the GPU busy. Only the first
+    chunk can raise QueueFullError; later ones wait for queue space.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(STREAM_LOOKAHEAD, 1))
+
+    async def produce():
+        try:
+            for i, text in enumerate(chunks):
+                start_time = time.time()
+                if i == 0:
+                    wav = await worker.submit(text, voice_path)
+                else:
+                    wav = await submit_when_ready(text, voice_path)
+                logger.debug(
+                    f"Chunk {i + 1}/{len(chunks)}: {wav.shape[1] / model.sr:.1f}s audio "
+                    f"in {time.time() - start_time:.2f}s"
+                )
+                await queue.put(tensor_to_pcm16(wav))
+            await queue.put(None)
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        producer.cancel()
+
+
+async def prepend_chunk(first: bytes, rest):
+    """Yield an already-generated chunk, then the rest of the stream."""
+    async with aclosing(rest):
+        yield first
+        async for chunk in rest:
+            yield chunk
+
+
+async def encode_audio_stream(pcm_chunks, response_format: str):
+    """Turn a PCM stream into the requested format, chunk by chunk."""
+    async with aclosing(pcm_chunks):
+        if response_format == "wav":
+            yield wav_header(model.sr)
+        if response_format in ENCODERS:
+            async with aclosing(encode_stream(pcm_chunks, model.sr, response_format)) as encoded:
+                async for data in encoded:
+                    yield data
+        else:
+            async for chunk in pcm_chunks:
+                yield chunk
+
+
+async def stream_speech(
+    pcm_chunks,
+    response_format: str,
+    cache_key: Optional[str] = None,
+):
+    """
+    Stream encoded audio as each PCM chunk is generated.
+
+    A stream that completes is written to the audio cache under cache_key.
+    """
+    sent = []
+    try:
+        async with aclosing(encode_audio_stream(pcm_chunks, response_format)) as audio:
+            async for data in audio:
+                sent.append(data)
+                yield data
+    except Exception as e:
+        # Headers are already sent; end the stream early
+        logger.error(f"Streaming generation failed: {e}")
+        return
+
+    if cache_key:
+        await asyncio.to_thread(audio_cache.store, cache_key, b"".join(sent))
+
+
 @app.post("/v1/audio/speech")
 async def create_speech(request: SpeechRequest):
     """
@@ -176,6 +369,10 @@ async def create_speech(request: SpeechRequest):
     Voice cloning via 'voice' parameter:
     - "default": Built-in voice
     - "name": Uses voices/{name}.wav as reference
+
+    With "stream": true the input is split into sentences and audio is sent
+    as each one is generated (WAV with an open-ended header, raw PCM, or the
+    compressed formats encoded on the fly).
     """
     if not model_loaded or model is None:
         raise HTTPException(
@@ -186,21 +383,60 @@ async def create_speech(request: SpeechRequest):
     if not request.input.strip():
         raise HTTPException(status_code=400, detail="Input text cannot be empty")
     
-    # Determine voice reference path
-    voice_path = None
-    if request.voice and request.voice != "default":
-        voice_file = VOICES_DIR / f"{request.voice}.wav"
-        if voice_file.exists():
-            voice_path = str(voice_file)
-        elif Path(request.voice).exists():
-            voice_path = request.voice
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Voice '{request.voice}' not found"
-            )
-    elif DEFAULT_VOICE_PATH and Path(DEFAULT_VOICE_PATH).exists():
-        voice_path = DEFAULT_VOICE_PATH
+    voice_path = resolve_voice_path(request.voice)
+    # Hashes the whole reference clip when it is new or changed
+    voice_hash = await asyncio.to_thread(voice_conditionings.voice_hash, voice_path) if voice_path else "default"
+    
+    cache_key = audio_cache.key(
+        model="chatterbox-turbo",
+        text=request.input,
+        voice=voice_hash,
+        format=request.response_format,
+        speed=request.speed,
+        stream=request.stream,
+    )
+    cached = audio_cache.lookup(cache_key)
+    if cached:
+        logger.info(f"Serving cached speech: {len(request.input)} chars, voice={request.voice}")
+        return FileResponse(
+            cached,
+            media_type=MEDIA_TYPES[request.response_format],
+            headers={"X-Sample-Rate": str(model.sr), "X-Cache": "hit"},
+        )
+    
+    if worker.full:
+        raise HTTPException(
+            status_code=503,
+            detail="TTS server is busy, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    
+    if request.stream:
+        chunks = split_sentences(request.input)
+        logger.info(
+            f"Streaming speech: {len(request.input)} chars in {len(chunks)} chunks, voice={request.voice}"
+        )
+        # Wait for the first chunk before sending headers, so a full queue or
+        # a failed generation is still reported with a proper status code
+        pcm = generate_pcm(chunks, voice_path)
+        try:
+            first = await anext(pcm)
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        except TimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            logger.error(f"Streaming generation failed: {e}")
+            raise HTTPException(status_code=500, detail=f"Speech generation failed: {str(e)}")
+        return StreamingResponse(
+            stream_speech(prepend_chunk(first, pcm), request.response_format, cache_key),
+            media_type=MEDIA_TYPES[request.response_format],
+            headers={
+                "X-Sample-Rate": str(model.sr),
+                "X-Audio-Chunks": str(len(chunks)),
+                "X-Cache": "miss",
+            },
+        )
     
     logger.info(f"Generating speech: {len(request.input)} chars, voice={request.voice}")
     
@@ -208,10 +444,7 @@ async def create_speech(request: SpeechRequest):
     
     try:
         # Generate audio
-        if voice_path:
-            wav = model.generate(request.input, audio_prompt_path=voice_path)
-        else:
-            wav = model.generate(request.input)
+        wav = await worker.submit(request.input, voice_path)
         
         elapsed = time.time() - start_time
         audio_duration = wav.shape[1] / model.sr
@@ -219,28 +452,32 @@ async def create_speech(request: SpeechRequest):
         
         logger.info(f"Generated {audio_duration:.1f}s audio in {elapsed:.2f}s (RTF={rtf:.3f}x)")
         
-        # Convert to WAV bytes
+        # Encode audio (WAV is the streaming header with the real data size)
+        pcm = tensor_to_pcm16(wav)
         if request.response_format == "wav":
-            buffer = io.BytesIO()
-            ta.save(buffer, wav, model.sr, format="wav")
-            buffer.seek(0)
-            media_type = "audio/wav"
+            content = wav_header(model.sr, channels=wav.shape[0], data_size=len(pcm)) + pcm
+        elif request.response_format in ENCODERS:
+            content = await encode_bytes(pcm, model.sr, request.response_format)
         else:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Format '{request.response_format}' not yet supported. Use 'wav'."
-            )
+            content = pcm
+        await asyncio.to_thread(audio_cache.store, cache_key, content)
         
         return Response(
-            content=buffer.read(),
-            media_type=media_type,
+            content=content,
+            media_type=MEDIA_TYPES[request.response_format],
             headers={
+                "X-Sample-Rate": str(model.sr),
                 "X-Audio-Duration": str(audio_duration),
                 "X-Generation-Time": str(elapsed),
                 "X-Real-Time-Factor": str(rtf),
+                "X-Cache": "miss",
             }
         )
         
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Generation failed: {e}")
         raise HTTPException(status_code=500, detail=f"Speech generation failed: {str(e)}")
@@ -0,0 +1,48 @@
+"""
+Stand-in TTS model for CPU-only testing (TTS_MODEL=standin).
+
+Implements the parts of the Chatterbox interface the server uses
+(sr, conds, prepare_conditionals, generate) plus generate_batch, and
+returns a quiet tone whose length follows the input text. Lets the queue,
+streaming, encoding and caching paths run without a GPU or model weights.
+"""
+
+import os
+import time
+import math
+
+import torch
+
+# Seconds of audio per character, roughly normal speaking rate
+SECONDS_PER_CHAR = 0.06
+
+# Simulated model time per generate call
+STANDIN_LATENCY = float(os.getenv("TTS_STANDIN_LATENCY", "0.05"))
+
+
+class StandInTTS:
+    sr = 24000
+
+    def __init__(self):
+        self.conds = "builtin"
+        self.calls = 0
+
+    def prepare_conditionals(self, wav_fpath, exaggeration=0.0, norm_loudness=True):
+        self.conds = f"voice:{os.path.basename(wav_fpath)}"
+
+    def _tone(self, text: str) -> torch.Tensor:
+        samples = max(int(len(text) * SECONDS_PER_CHAR * self.sr), self.sr // 10)
+        t = torch.arange(samples, dtype=torch.float32) / self.sr
+        return (0.1 * torch.sin(2 * math.pi * 220.0 * t)).unsqueeze(0)
+
+    def generate(self, text, audio_prompt_path=None, **kwargs) -> torch.Tensor:
+        if audio_prompt_path:
+            self.prepare_conditionals(audio_prompt_path)
+        self.calls += 1
+        time.sleep(STANDIN_LATENCY)
+        return self._tone(text)
+
+    def generate_batch(self, texts: list[str]) -> list[torch.Tensor]:
+        self.calls += 1
+        time.sleep(STANDIN_LATENCY)
+        return [self._tone(text) for text in texts]
@@ -0,0 +1,233 @@
+"""
+Dedicated inference worker for speech generation.
+
+All model calls go through one background thread fed by a bounded queue, so
+request handlers only await a future and the event loop (and /health) stays
+responsive however long a synthesis takes.
+
+- The queue holds at most TTS_MAX_QUEUE jobs; submitting beyond that raises
+  QueueFullError instead of piling up work.
+- Every job carries a deadline (TTS_REQUEST_TIMEOUT). Jobs that expire while
+  queued are skipped rather than generated for nobody.
+- Short jobs for the same voice that are waiting together are handed to the
+  model as one batch when it provides generate_batch; otherwise they run
+  back to back.
+"""
+
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+MAX_QUEUE = int(os.getenv("TTS_MAX_QUEUE", "32"))
+REQUEST_TIMEOUT = float(os.getenv("TTS_REQUEST_TIMEOUT", "120"))
+MAX_BATCH = int(os.getenv("TTS_MAX_BATCH", "4"))
+BATCH_MAX_CHARS = int(os.getenv("TTS_BATCH_MAX_CHARS", "200"))
+BATCH_WINDOW_MS = float(os.getenv("TTS_BATCH_WINDOW_MS", "10"))
+
+QUEUE_DEPTH = Gauge("tts_queue_depth", "Synthesis jobs waiting for the worker")
+QUEUE_WAIT = Histogram(
+    "tts_queue_wait_seconds",
+    "Time jobs spent queued before generation",
+    buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0],
+)
+GENERATION_TIME = Histogram(
+    "tts_generation_seconds",
+    "Model time per batch",
+    buckets=[0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0],
+)
+BATCH_SIZE = Histogram("tts_batch_size", "Jobs per model call", buckets=[1, 2, 3, 4, 6, 8, 16])
+JOBS = Counter("tts_jobs_total", "Synthesis jobs by outcome", ["outcome"])
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the synthesis queue is at capacity."""
+
+
+@dataclass(eq=False)
+class _Job:
+    text: str
+    voice_path: Optional[str]
+    future: asyncio.Future
+    loop: asyncio.AbstractEventLoop
+    deadline: float
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+    def resolve(self, result=None, error: Optional[BaseException] = None) -> None:
+        def apply():
+            if self.future.done():
+                return
+            if error is not None:
+                self.future.set_exception(error)
+            else:
+                self.future.set_result(result)
+
+        self.loop.call_soon_threadsafe(apply)
+
+
+class InferenceWorker:
+    """Runs synthesis jobs on a single background thread."""
+
+    def __init__(
+        self,
+        synthesize: Callable[[str, Optional[str]], object],
+        synthesize_batch: Optional[Callable[[list[str], Optional[str]], list]] = None,
+        max_queue: int = MAX_QUEUE,
+        timeout: float = REQUEST_TIMEOUT,
+        max_batch: int = MAX_BATCH,
+        batch_max_chars: int = BATCH_MAX_CHARS,
+        batch_window_ms: float = BATCH_WINDOW_MS,
+    ):
+        self.synthesize = synthesize
+        self.synthesize_batch = synthesize_batch
+        self.timeout = timeout
+        self.max_batch = max_batch if synthesize_batch else 1
+        self.batch_max_chars = batch_max_chars
+        self.batch_window = batch_window_ms / 1000
+
+        self._queue: queue.Queue[_Job] = queue.Queue(maxsize=max_queue)
+        self._held: list[_Job] = []  # popped while batching but not batchable
+        self._thread: Optional[threading.Thread] = None
+        self.busy = False
+        self.completed = 0
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="tts-inference", daemon=True)
+            self._thread.start()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() + len(self._held)
+
+    @property
+    def full(self) -> bool:
+        return self._queue.full()
+
+    async def submit(self, text: str, voice_path: Optional[str], timeout: Optional[float] = None):
+        """
+        Queue text for synthesis and wait for the audio tensor.
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+            TimeoutError: If the job does not finish within the timeout
+        """
+        self.start()
+        timeout = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        job = _Job(
+            text=text,
+            voice_path=voice_path,
+            future=loop.create_future(),
+            loop=loop,
+            deadline=time.monotonic() + timeout,
+        )
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            JOBS.labels(outcome="rejected").inc()
+            raise QueueFullError(f"TTS queue is full ({self._queue.maxsize} jobs waiting)")
+        QUEUE_DEPTH.set(self.depth)
+
+        try:
+            return await asyncio.wait_for(job.future, timeout)
+        except asyncio.TimeoutError:
+            JOBS.labels(outcome="timeout").inc()
+            raise TimeoutError(f"Speech generation timed out after {timeout:.0f}s")
+
+    # -------------------------------------------------------------------------
+    # Worker thread
+    # -------------------------------------------------------------------------
+
+    def _next_job(self, timeout: Optional[float] = None) -> Optional[_Job]:
+        if self._held:
+            return self._held.pop(0)
+        try:
+            return self._queue.get(timeout=timeout) if timeout is not None else self._queue.get()
+        except queue.Empty:
+            return None
+
+    def _batchable(self, job: _Job) -> bool:
+        return len(job.text) <= self.batch_max_chars
+
+    def _collect_batch(self, first: _Job) -> list[_Job]:
+        """Gather more short jobs for the same voice that arrive within the window."""
+        batch = [first]
+        if self.max_batch <= 1 or not self._batchable(first):
+            return batch
+        window_end = time.monotonic() + self.batch_window
+        skipped = []
+        while len(batch) < self.max_batch:
+            remaining = window_end - time.monotonic()
+            if remaining <= 0:
+                break
+            job = self._next_job(timeout=remaining)
+            if job is None:
+                break
+            if self._batchable(job) and job.voice_path == first.voice_path:
+                batch.append(job)
+            else:
+                skipped.append(job)
+        self._held = skipped + self._held
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            job = self._next_job()
+            batch = [j for j in self._collect_batch(job) if self._is_live(j)]
+            QUEUE_DEPTH.set(self.depth)
+            if not batch:
+                continue
+
+            now = time.monotonic()
+            for j in batch:
+                QUEUE_WAIT.observe(now - j.enqueued_at)
+            BATCH_SIZE.observe(len(batch))
+
+            self.busy = True
+            start = time.monotonic()
+            try:
+                if len(batch) == 1:
+                    results = [self.synthesize(batch[0].text, batch[0].voice_path)]
+                else:
+                    results = self.synthesize_batch([j.text for j in batch], batch[0].voice_path)
+                for j, result in zip(batch, results):
+                    j.resolve(result)
+                JOBS.labels(outcome="completed").inc(len(batch))
+                self.completed += len(batch)
+            except Exception as e:
+                logger.error(f"Synthesis of {len(batch)} job(s) failed: {e}")
+                for j in batch:
+                    j.resolve(error=e)
+                JOBS.labels(outcome="failed").inc(len(batch))
+            finally:
+                self.busy = False
+                GENERATION_TIME.observe(time.monotonic() - start)
+
+    def _is_live(self, job: _Job) -> bool:
+        """Skip jobs whose caller gave up or whose deadline passed while queued."""
+        if job.future.done():
+            # Caller timed out or disconnected
+            return False
+        if time.monotonic() > job.deadline:
+            JOBS.labels(outcome="expired").inc()
+            job.resolve(error=TimeoutError("Speech generation timed out while queued"))
+            return False
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.depth,
+            "queue_capacity": self._queue.maxsize,
+            "busy": self.busy,
+            "completed": self.completed,
+            "max_batch": self.max_batch,
+        }
@@ -0,0 +1,180 @@
+"""CPU tests for the inference worker and streaming endpoint, using the stand-in model."""
+import asyncio
+import os
+import threading
+
+import pytest
+
+os.environ["TTS_MODEL"] = "standin"
+os.environ.setdefault("TTS_STANDIN_LATENCY", "0.01")
+os.environ.setdefault("TTS_CACHE_MB", "0")
+
+pytest.importorskip("torch")
+
+from prometheus_client import REGISTRY
+
+from app.standin import StandInTTS
+from app.worker import InferenceWorker, QueueFullError
+
+
+def _metric(name, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class _Gate:
+    """synthesize() that blocks until released, to keep the worker busy."""
+
+    def __init__(self, model):
+        self.model = model
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.texts = []
+
+    def __call__(self, text, voice_path):
+        self.texts.append(text)
+        self.started.set()
+        self.release.wait(5)
+        return self.model.generate(text)
+
+
+def test_full_queue_rejects_new_jobs():
+    gate = _Gate(StandInTTS())
+    worker = InferenceWorker(gate, max_queue=1)
+    rejected = _metric("tts_jobs_total", outcome="rejected")
+
+    async def run():
+        running = asyncio.create_task(worker.submit("first", None))
+        await asyncio.to_thread(gate.started.wait, 5)
+        waiting = asyncio.create_task(worker.submit("second", None))
+        await asyncio.sleep(0)
+        assert worker.full
+        with pytest.raises(QueueFullError):
+            await worker.submit("third", None)
+        gate.release.set()
+        return await asyncio.gather(running, waiting)
+
+    first, second = asyncio.run(run())
+
+    assert gate.texts == ["first", "second"]
+    assert first.shape[1] > 0 and second.shape[1] > 0
+    assert _metric("tts_jobs_total", outcome="rejected") == rejected + 1
+    assert worker.stats()["queue_depth"] == 0
+
+
+def test_job_past_its_deadline_is_not_generated():
+    gate = _Gate(StandInTTS())
+    worker = InferenceWorker(gate)
+    timeouts = _metric("tts_jobs_total", outcome="timeout")
+
+    async def run():
+        running = asyncio.create_task(worker.submit("first", None))
+        await asyncio.to_thread(gate.started.wait, 5)
+        with pytest.raises(TimeoutError):
+            await worker.submit("late", None, timeout=0.05)
+        gate.release.set()
+        await running
+        await worker.submit("after", None)
+
+    asyncio.run(run())
+
+    assert gate.texts == ["first", "after"]
+    assert _metric("tts_jobs_total", outcome="timeout") == timeouts + 1
+
+
+def test_short_jobs_for_one_voice_share_a_batch():
+    model = StandInTTS()
+    worker = InferenceWorker(
+        lambda text, voice_path: model.generate(text),
+        lambda texts, voice_path: model.generate_batch(texts),
+        max_batch=4,
+        batch_window_ms=200,
+    )
+    batches = _metric("tts_batch_size_count")
+    batched_jobs = _metric("tts_batch_size_sum")
+    completed = _metric("tts_jobs_total", outcome="completed")
+    texts = ["One.", "Two words here.", "Three short words, then a few more."]
+
+    async def run():
+        return await asyncio.gather(*(worker.submit(text, None) for text in texts))
+
+    wavs = asyncio.run(run())
+
+    assert model.calls == 1
+    # Each caller gets the audio for its own text
+    assert [wav.shape[1] for wav in wavs] == [model._tone(text).shape[1] for text in texts]
+    assert _metric("tts_batch_size_count") == batches + 1
+    assert _metric("tts_batch_size_sum") == batched_jobs + 3
+    assert _metric("tts_jobs_total", outcome="completed") == completed + 3
+    assert worker.completed == 3
+
+
+def test_long_jobs_and_other_voices_run_alone():
+    model = StandInTTS()
+    voices = []
+
+    def synthesize(text, voice_path):
+        voices.append(voice_path)
+        return model.generate(text)
+
+    worker = InferenceWorker(
+        synthesize,
+        lambda texts, voice_path: model.generate_batch(texts),
+        max_batch=4,
+        batch_max_chars=20,
+        batch_window_ms=200,
+    )
+
+    async def run():
+        return await asyncio.gather(
+            worker.submit("Short one.", None),
+            worker.submit("A sentence that is far too long to batch.", None),
+            worker.submit("Other voice.", "voices/other.wav"),
+        )
+
+    asyncio.run(run())
+
+    assert model.calls == 3
+    assert sorted(voices, key=str) == sorted([None, None, "voices/other.wav"], key=str)
+
+
+def test_stream_gets_503_when_queue_is_full(monkeypatch):
+    pytest.importorskip("torchaudio")
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    async def queue_full(*args, **kwargs):
+        raise QueueFullError("TTS queue is full (32 jobs waiting)")
+
+    monkeypatch.setattr(main.worker, "submit", queue_full)
+    client = TestClient(main.app)
+
+    response = client.post(
+        "/v1/audio/speech",
+        json={"input": "Hello there. This is a streamed test.", "stream": True, "response_format": "pcm"},
+    )
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_stream_returns_every_chunk():
+    pytest.importorskip("torchaudio")
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    client = TestClient(main.app)
+    text = "The first sentence is long enough to stand alone. The second one is as well, more or less."
+
+    response = client.post(
+        "/v1/audio/speech",
+        json={"input": text, "stream": True, "response_format": "pcm"},
+    )
+
+    assert response.status_code == 200
+    chunks = main.split_sentences(text)
+    assert response.headers["x-audio-chunks"] == str(len(chunks))
+    # 16-bit mono PCM
+    expected_samples = sum(main.model._tone(chunk).shape[1] for chunk in chunks)
+    assert len(response.content) == expected_samples * 2
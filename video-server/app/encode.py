@@ -0,0 +1,114 @@
+"""
+MP4 encoding by piping raw frames into ffmpeg.
+
+Frames are converted to rgb24 one at a time into reused buffers and written
+to ffmpeg's stdin as they are produced, so a clip never exists in memory as
+a list of PIL images and is never written to a temp file and read back.
+"""
+
+import os
+import shutil
+import logging
+import subprocess
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VIDEO_CRF = os.getenv("VIDEO_CRF", "20")
+VIDEO_PRESET = os.getenv("VIDEO_PRESET", "medium")
+
+
+def ffmpeg_exe() -> str:
+    """System ffmpeg if present, else the binary bundled with imageio-ffmpeg."""
+    system = shutil.which("ffmpeg")
+    if system:
+        return system
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        raise RuntimeError("ffmpeg not found — install ffmpeg or imageio-ffmpeg to encode video")
+
+
+def rgb24_frames(frames) -> Iterator[np.ndarray]:
+    """
+    Yield each frame as a contiguous (H, W, 3) uint8 array.
+
+    Accepts diffusers output as a float array in [0, 1] (output_type="np"),
+    a uint8 array, or a list of PIL images. Float frames are scaled into a
+    pair of buffers reused across the whole clip.
+    """
+    scratch = out = None
+    for frame in frames:
+        if not isinstance(frame, np.ndarray):
+            # PIL image
+            frame = np.asarray(frame.convert("RGB") if frame.mode != "RGB" else frame)
+        if frame.dtype == np.uint8:
+            yield np.ascontiguousarray(frame)
+            continue
+        if scratch is None or scratch.shape != frame.shape:
+            scratch = np.empty(frame.shape, dtype=np.float32)
+            out = np.empty(frame.shape, dtype=np.uint8)
+        np.multiply(frame, 255.0, out=scratch)
+        scratch += 0.5
+        np.clip(scratch, 0, 255, out=scratch)
+        out[...] = scratch
+        yield out
+
+
+def encode_mp4(frames: Iterable, fps: int, dest: Path) -> int:
+    """
+    Encode frames to an H.264 MP4 at dest, written as ffmpeg produces it.
+
+    Returns the number of frames encoded.
+
+    Raises:
+        RuntimeError: If there are no frames or ffmpeg fails
+    """
+    frames = rgb24_frames(frames)
+    first = next(frames, None)
+    if first is None:
+        raise RuntimeError("Pipeline returned no frames")
+    height, width = first.shape[:2]
+
+    proc = subprocess.Popen(
+        [
+            ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps),
+            "-i", "pipe:0",
+            # yuv420p needs even dimensions
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v", "libx264", "-preset", VIDEO_PRESET, "-crf", VIDEO_CRF, "-pix_fmt", "yuv420p",
+            # moov atom up front so players can start and seek over Range requests
+            "-movflags", "+faststart",
+            "-f", "mp4", str(dest),
+        ],
+        stdin=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    count = 0
+    try:
+        try:
+            proc.stdin.write(first.data)
+            count = 1
+            for frame in frames:
+                proc.stdin.write(frame.data)
+                count += 1
+        except BrokenPipeError:
+            pass  # ffmpeg exited early; its stderr says why
+        finally:
+            proc.stdin.close()
+        error = proc.stderr.read().decode(errors="replace").strip()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg encoding failed: {error}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stderr.close()
+
+    logger.debug(f"Encoded {count} frames {width}x{height} @{fps}fps to {dest.name}")
+    return count
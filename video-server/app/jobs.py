@@ -0,0 +1,228 @@
+"""
+Video generation jobs: a single GPU worker fed by a bounded queue.
+
+Generations take minutes, so clients submit a job, poll its progress (updated
+per denoising step) and fetch the finished MP4 from disk, instead of holding
+an HTTP connection open and receiving the video as base64.
+
+Only one job touches the GPU at a time; the pipeline runs on a dedicated
+thread so the event loop keeps serving status polls and downloads.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_DIR = Path(os.getenv("VIDEO_OUTPUT_DIR", "/app/outputs"))
+MAX_QUEUED_JOBS = int(os.getenv("VIDEO_MAX_QUEUED_JOBS", "8"))
+RETENTION_HOURS = float(os.getenv("VIDEO_RETENTION_HOURS", "72"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = {SUCCEEDED, FAILED, CANCELLED}
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the job queue is at capacity."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's generation when it has been cancelled."""
+
+
+@dataclass(eq=False)
+class VideoJob:
+    prompt: str
+    params: dict
+    id: str = field(default_factory=lambda: f"vid_{uuid.uuid4().hex[:16]}")
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    step: int = 0
+    total_steps: int = 0
+    error: Optional[str] = None
+    size_bytes: Optional[int] = None
+    cancel_requested: bool = False
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def path(self) -> Path:
+        return OUTPUT_DIR / f"{self.id}.mp4"
+
+    @property
+    def progress(self) -> float:
+        if self.status == SUCCEEDED:
+            return 1.0
+        return round(self.step / self.total_steps, 3) if self.total_steps else 0.0
+
+    def to_dict(self, queue_position: Optional[int] = None) -> dict:
+        data = {
+            "id": self.id,
+            "object": "video.job",
+            "status": self.status,
+            "prompt": self.prompt,
+            "progress": self.progress,
+            "step": self.step,
+            "total_steps": self.total_steps,
+            "created_at": int(self.created_at),
+            "started_at": int(self.started_at) if self.started_at else None,
+            "finished_at": int(self.finished_at) if self.finished_at else None,
+            "error": self.error,
+            **self.params,
+        }
+        if queue_position is not None:
+            data["queue_position"] = queue_position
+        if self.status == SUCCEEDED:
+            data["url"] = f"/v1/videos/jobs/{self.id}/content"
+            data["size_bytes"] = self.size_bytes
+            data["generation_time_s"] = round(self.finished_at - self.started_at, 1)
+        return data
+
+
+class VideoJobQueue:
+    """FIFO of video jobs processed one at a time on a GPU worker thread."""
+
+    def __init__(
+        self,
+        run_job: Callable[[VideoJob], None],
+        max_queued: int = MAX_QUEUED_JOBS,
+        retention_hours: float = RETENTION_HOURS,
+    ):
+        self.run_job = run_job
+        self.max_queued = max_queued
+        self.retention_s = retention_hours * 3600
+
+        self._jobs: dict[str, VideoJob] = {}
+        self._pending: list[VideoJob] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpu-worker")
+        self.current: Optional[VideoJob] = None
+
+    def start(self) -> None:
+        if self._worker is None:
+            OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    # -------------------------------------------------------------------------
+    # Client API
+    # -------------------------------------------------------------------------
+
+    def submit(self, job: VideoJob) -> VideoJob:
+        """
+        Queue a job.
+
+        Raises:
+            QueueFullError: If max_queued jobs are already waiting
+        """
+        self.start()
+        if len(self._pending) >= self.max_queued:
+            raise QueueFullError(f"Video queue is full ({self.max_queued} jobs waiting)")
+        self._prune()
+        self._jobs[job.id] = job
+        self._pending.append(job)
+        self._wakeup.set()
+        logger.info(f"Queued {job.id} (position {len(self._pending)})")
+        return job
+
+    def get(self, job_id: str) -> Optional[VideoJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> list[VideoJob]:
+        return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def position(self, job: VideoJob) -> Optional[int]:
+        """1-based position among waiting jobs, None if not waiting."""
+        return self._pending.index(job) + 1 if job in self._pending else None
+
+    def cancel(self, job: VideoJob) -> None:
+        """Cancel a waiting job now, or a running one at its next denoising step."""
+        if job.status in FINISHED:
+            return
+        job.cancel_requested = True
+        if job in self._pending:
+            self._pending.remove(job)
+            self._finish(job, CANCELLED)
+
+    def delete(self, job: VideoJob) -> None:
+        self.cancel(job)
+        self._jobs.pop(job.id, None)
+        job.path.unlink(missing_ok=True)
+
+    # -------------------------------------------------------------------------
+    # Worker
+    # -------------------------------------------------------------------------
+
+    def _finish(self, job: VideoJob, status: str, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job.done.set()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            job = self._pending.pop(0)
+            job.status = RUNNING
+            job.started_at = time.time()
+            self.current = job
+            try:
+                await loop.run_in_executor(self._executor, self.run_job, job)
+                # A cancel or delete during encoding lands after the last step check
+                if job.cancel_requested:
+                    raise JobCancelled()
+                job.size_bytes = job.path.stat().st_size
+                self._finish(job, SUCCEEDED)
+                logger.info(
+                    f"{job.id} done in {job.finished_at - job.started_at:.1f}s "
+                    f"({job.size_bytes // 1024}KB)"
+                )
+            except JobCancelled:
+                job.path.unlink(missing_ok=True)
+                self._finish(job, CANCELLED)
+                logger.info(f"{job.id} cancelled at step {job.step}/{job.total_steps}")
+            except Exception as e:
+                job.path.unlink(missing_ok=True)
+                self._finish(job, FAILED, str(e))
+                logger.error(f"{job.id} failed: {e}", exc_info=True)
+            finally:
+                self.current = None
+
+    def _prune(self) -> None:
+        """Forget finished jobs and delete their files after the retention period."""
+        cutoff = time.time() - self.retention_s
+        for job in list(self._jobs.values()):
+            if job.status in FINISHED and job.finished_at < cutoff:
+                self._jobs.pop(job.id, None)
+                job.path.unlink(missing_ok=True)
+        for path in OUTPUT_DIR.glob("*.mp4"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._pending),
+            "max_queued": self.max_queued,
+            "running": self.current.id if self.current else None,
+        }
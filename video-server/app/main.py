@@ -7,30 +7,53 @@ Supports:
   - Wan-AI/Wan2.1-T2V-14B      (24GB BF16, dual 3090 with FSDP+xDiT)
 
 API:
-  GET  /health
-  GET  /v1/models
-  POST /v1/videos/generations
-  GET  /
+  GET    /health
+  GET    /v1/models
+  POST   /v1/videos/jobs                 submit a generation, returns a job id (202)
+  GET    /v1/videos/jobs                 list jobs
+  GET    /v1/videos/jobs/{id}            status and per-step progress
+  GET    /v1/videos/jobs/{id}/content    finished MP4 (supports Range requests)
+  DELETE /v1/videos/jobs/{id}            cancel and delete
+  POST   /v1/videos/generations          submit and wait (b64_json or url result)
+  GET    /
 
 Env vars:
-  MODEL_ID  - HuggingFace model ID (default: tencent/HunyuanVideo-1.5)
-  GPU_COUNT - Number of GPUs (default: 1)
-  LOG_LEVEL - Logging level (default: INFO)
+  MODEL_ID              - HuggingFace model ID (default: tencent/HunyuanVideo-1.5)
+  GPU_COUNT             - Number of GPUs (default: 1)
+  LOG_LEVEL             - Logging level (default: INFO)
+  VIDEO_OUTPUT_DIR      - Where finished videos are stored (default: /app/outputs)
+  VIDEO_MAX_QUEUED_JOBS - Jobs allowed to wait for the GPU (default: 8)
+  VIDEO_RETENTION_HOURS - Finished jobs and files are removed after this (default: 72)
 """
 
 import os
+import re
+import json
 import time
 import base64
-import tempfile
+import asyncio
+import inspect
 import logging
-from typing import Optional, List
+from email.utils import formatdate
+from pathlib import Path
+from typing import Optional, List, Literal
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 import torch
 
+from app.encode import encode_mp4
+from app.jobs import (
+    OUTPUT_DIR,
+    SUCCEEDED,
+    JobCancelled,
+    QueueFullError,
+    VideoJob,
+    VideoJobQueue,
+)
+
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
     level=getattr(logging, LOG_LEVEL, logging.INFO),
@@ -46,14 +69,6 @@ except ImportError:
     DIFFUSERS_AVAILABLE = False
     logger.warning("diffusers not available — video generation disabled")
 
-try:
-    import imageio
-    import imageio_ffmpeg  # noqa: F401 — validates ffmpeg plugin is present
-    IMAGEIO_AVAILABLE = True
-except ImportError:
-    IMAGEIO_AVAILABLE = False
-    logger.warning("imageio/imageio-ffmpeg not available — MP4 export disabled")
-
 app = FastAPI(title="Video Inference Server", version="0.1.0")
 
 app.add_middleware(
@@ -162,6 +177,10 @@ class VideoGenerationRequest(BaseModel):
     )
     num_inference_steps: Optional[int] = Field(default=30)
     fps: Optional[int] = Field(default=15, description="Frames per second for output MP4")
+    response_format: Literal["b64_json", "url"] = Field(
+        default="b64_json",
+        description="/v1/videos/generations only: inline base64 MP4, or a URL to download it from",
+    )
 
 
 class VideoGenerationResponse(BaseModel):
@@ -175,8 +194,6 @@ class VideoGenerationResponse(BaseModel):
 
 @app.on_event("startup")
 async def startup_event():
-    import asyncio
-
     async def _load():
         try:
             loop = asyncio.get_event_loop()
@@ -185,6 +202,7 @@ async def startup_event():
             logger.warning(f"Startup load failed — will retry on first request: {e}")
 
     asyncio.create_task(_load())
+    video_jobs.start()
 
 
 # ---------------------------------------------------------------------------
@@ -211,6 +229,7 @@ async def health():
         "device": device,
         "gpu_count": GPU_COUNT,
         "gpus": gpu_info,
+        "jobs": video_jobs.stats(),
     }
 
 
@@ -231,14 +250,8 @@ async def list_models():
     }
 
 
-@app.post("/v1/videos/generations", response_model=VideoGenerationResponse)
-async def generate_video(request: VideoGenerationRequest):
-    try:
-        pipeline = load_model()
-    except Exception as e:
-        raise HTTPException(status_code=503, detail=f"Model not available: {e}")
-
-    # Per-model defaults
+def resolve_params(request: VideoGenerationRequest) -> dict:
+    """Apply per-model defaults to a request."""
     if MODEL_TYPE == "hunyuanvideo":
         height = request.height or 544
         width = request.width or 960
@@ -252,70 +265,254 @@ async def generate_video(request: VideoGenerationRequest):
         width = request.width or 832
         num_frames = request.num_frames or 16
 
-    fps = request.fps or 15
-    steps = request.num_inference_steps or 30
+    return {
+        "negative_prompt": request.negative_prompt,
+        "width": width,
+        "height": height,
+        "num_frames": num_frames,
+        "fps": request.fps or 15,
+        "num_inference_steps": request.num_inference_steps or 30,
+    }
+
+
+def run_generation(job: VideoJob) -> None:
+    """Generate and encode one video (runs on the GPU worker thread)."""
+    pipeline = load_model()
+    params = job.params
+    steps = params["num_inference_steps"]
+    job.total_steps = steps
 
     logger.info(
-        f"Generating: '{request.prompt[:60]}' {width}x{height} "
-        f"{num_frames}f {steps}steps @{fps}fps"
+        f"Generating {job.id}: '{job.prompt[:60]}' {params['width']}x{params['height']} "
+        f"{params['num_frames']}f {steps}steps @{params['fps']}fps"
     )
-    t0 = time.time()
 
+    kwargs = dict(
+        prompt=job.prompt,
+        height=params["height"],
+        width=params["width"],
+        num_frames=params["num_frames"],
+        num_inference_steps=steps,
+    )
+    if params["negative_prompt"]:
+        kwargs["negative_prompt"] = params["negative_prompt"]
+
+    call_params = inspect.signature(pipeline.__call__).parameters
+    # Raw float frames instead of a list of PIL images
+    if "output_type" in call_params:
+        kwargs["output_type"] = "np"
+
+    # Progress per denoising step; cancellation stops the loop at the next step
+    if "callback_on_step_end" in call_params:
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            job.step = step + 1
+            if job.cancel_requested:
+                pipe._interrupt = True
+            return callback_kwargs
+
+        kwargs["callback_on_step_end"] = on_step_end
+
+    with torch.no_grad():
+        result = pipeline(**kwargs)
+
+    if job.cancel_requested:
+        raise JobCancelled()
+    job.step = steps
+
+    # result.frames[0]: (frames, H, W, 3) array, or PIL images on older pipelines
+    if hasattr(result, "frames"):
+        frames = result.frames[0]
+    else:
+        frames = result[0]
+    del result
+
+    # Pipe frames into ffmpeg, writing into the artifact store; rename once complete
+    partial = job.path.with_name(f"{job.id}.partial.mp4")
     try:
-        kwargs = dict(
-            prompt=request.prompt,
-            height=height,
-            width=width,
-            num_frames=num_frames,
-            num_inference_steps=steps,
-        )
-        if request.negative_prompt:
-            kwargs["negative_prompt"] = request.negative_prompt
-
-        with torch.no_grad():
-            result = pipeline(**kwargs)
-
-        # Diffusers video pipelines return result.frames[0] as list of PIL Images
-        if hasattr(result, "frames"):
-            frames = result.frames[0]
-        else:
-            frames = result[0]
-
-        if not IMAGEIO_AVAILABLE:
-            raise RuntimeError("imageio-ffmpeg not installed — cannot encode video")
-
-        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as f:
-            tmp_path = f.name
-
-        imageio.mimwrite(tmp_path, frames, fps=fps, quality=8)
-
-        with open(tmp_path, "rb") as f:
-            video_bytes = f.read()
-        os.unlink(tmp_path)
-
-        elapsed = time.time() - t0
-        logger.info(f"Done in {elapsed:.1f}s — {len(video_bytes) // 1024}KB")
-
-        return VideoGenerationResponse(
-            created=int(time.time()),
-            data=[
-                {
-                    "b64_mp4": base64.b64encode(video_bytes).decode(),
-                    "revised_prompt": request.prompt,
-                    "width": width,
-                    "height": height,
-                    "num_frames": num_frames,
-                    "fps": fps,
-                    "generation_time_s": round(elapsed, 1),
-                }
-            ],
+        encode_mp4(frames, params["fps"], partial)
+        os.replace(partial, job.path)
+    finally:
+        partial.unlink(missing_ok=True)
+
+
+video_jobs = VideoJobQueue(run_generation)
+
+_JOB_ID = re.compile(r"^vid_[0-9a-f]{16}$")
+
+
+def _submit(request: VideoGenerationRequest) -> VideoJob:
+    if not DIFFUSERS_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Model not available: diffusers library not installed")
+    try:
+        return video_jobs.submit(VideoJob(prompt=request.prompt, params=resolve_params(request)))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+
+def _get_job(job_id: str) -> VideoJob:
+    job = video_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+
+@app.post("/v1/videos/jobs", status_code=202)
+async def create_video_job(request: VideoGenerationRequest):
+    """Queue a generation; poll GET /v1/videos/jobs/{id} for progress."""
+    job = _submit(request)
+    return job.to_dict(queue_position=video_jobs.position(job))
+
+
+@app.get("/v1/videos/jobs")
+async def list_video_jobs():
+    return {
+        "object": "list",
+        "data": [job.to_dict(queue_position=video_jobs.position(job)) for job in video_jobs.list()],
+    }
+
+
+@app.get("/v1/videos/jobs/{job_id}")
+async def get_video_job(job_id: str):
+    job = _get_job(job_id)
+    return job.to_dict(queue_position=video_jobs.position(job))
+
+
+@app.delete("/v1/videos/jobs/{job_id}")
+async def delete_video_job(job_id: str):
+    """Cancel a queued or running job and delete its video."""
+    job = _get_job(job_id)
+    video_jobs.delete(job)
+    return {"id": job_id, "object": "video.job", "deleted": True}
+
+
+def _iter_file(path: Path, start: int, length: int, chunk_size: int = 3 * 64 * 1024):
+    # Sync generator: Starlette iterates it in a worker thread
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def _parse_range(range_header: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    Parse a single "bytes=" range into (start, end) inclusive.
+
+    Returns None when the header should be ignored (malformed or multi-range),
+    (-1, -1) when the range cannot be satisfied.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if not match or not (match[1] or match[2]):
+        return None
+    if match[1]:
+        start = int(match[1])
+        end = min(int(match[2]), size - 1) if match[2] else size - 1
+    else:
+        start = max(size - int(match[2]), 0)
+        end = size - 1
+    if start >= size or start > end:
+        return -1, -1
+    return start, end
+
+
+@app.get("/v1/videos/jobs/{job_id}/content")
+async def get_video_content(job_id: str, request: Request):
+    """Stream a finished video from disk, honouring Range requests for seeking."""
+    job = video_jobs.get(job_id)
+    if job is not None and job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    if not _JOB_ID.match(job_id):
+        raise HTTPException(status_code=404, detail=f"Video not found: {job_id}")
+
+    path = OUTPUT_DIR / f"{job_id}.mp4"
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Video not found: {job_id}")
+
+    size = stat.st_size
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{stat.st_mtime_ns:x}-{size:x}"',
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": "private, max-age=86400",
+    }
+
+    byte_range = _parse_range(request.headers["range"], size) if "range" in request.headers else None
+    if byte_range == (-1, -1):
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return StreamingResponse(
+            _iter_file(path, 0, size),
+            media_type="video/mp4",
+            headers={**headers, "Content-Length": str(size)},
         )
 
-    except HTTPException:
+    start, end = byte_range
+    return StreamingResponse(
+        _iter_file(path, start, end - start + 1),
+        status_code=206,
+        media_type="video/mp4",
+        headers={
+            **headers,
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Content-Length": str(end - start + 1),
+        },
+    )
+
+
+@app.post("/v1/videos/generations", response_model=VideoGenerationResponse)
+async def generate_video(request: VideoGenerationRequest):
+    """
+    Generate and wait for the result.
+
+    Runs through the same GPU queue as /v1/videos/jobs. With
+    response_format="url" the response links to the stored MP4 instead of
+    inlining it as base64.
+    """
+    job = _submit(request)
+    try:
+        await job.done.wait()
+    except asyncio.CancelledError:
+        # Client went away; don't keep the GPU busy for nobody
+        video_jobs.cancel(job)
         raise
-    except Exception as e:
-        logger.error(f"Generation failed: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Video generation failed: {e}")
+
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=500, detail=f"Video generation failed: {job.error or job.status}")
+
+    params = job.params
+    data = {
+        "id": job.id,
+        "revised_prompt": request.prompt,
+        "width": params["width"],
+        "height": params["height"],
+        "num_frames": params["num_frames"],
+        "fps": params["fps"],
+        "generation_time_s": round(job.finished_at - job.started_at, 1),
+    }
+    if request.response_format == "url":
+        data["url"] = f"/v1/videos/jobs/{job.id}/content"
+        return VideoGenerationResponse(created=int(time.time()), data=[data])
+
+    # Stream the file as base64 inside the JSON body instead of building it in
+    # memory. b64_mp4 is written by hand as the last key, so no user text
+    # (the prompt) can be mistaken for the splice point.
+    item = json.dumps(data)
+    head = f'{{"created": {int(time.time())}, "data": [{item[:-1]}, "b64_mp4": "'
+    tail = '"}]}'
+    return StreamingResponse(_iter_b64_json(job.path, head, tail), media_type="application/json")
+
+
+def _iter_b64_json(path: Path, head: str, tail: str):
+    yield head.encode()
+    # Chunks are a multiple of 3 bytes, so per-chunk base64 concatenates cleanly
+    for chunk in _iter_file(path, 0, path.stat().st_size):
+        yield base64.b64encode(chunk)
+    yield tail.encode()
 
 
 @app.get("/")